@@ -0,0 +1,117 @@
+"""
+Micro‑benchmark: per‑move overhead, makedirs + shutil.move (before) vs. the
+app's MoveEngine (after).
+
+    python Benchmarks/move_bench.py [--files 5000] [--kib 64] [--other /dev/shm]
+
+Writes N files into a scratch folder and moves them into a handful of class
+folders, once the old way and once through the `MoveEngine` read straight
+out of each app's main.py, then reports µs per move and MiB/s.  With
+`--other` pointing at another filesystem the class folders go there, which
+times the cross‑device copy path as well as the rename one; `--workers`
+runs the engine's moves on that many threads, like the app's move queue.
+"""
+
+import argparse
+import ast
+import errno
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os.path import basename, dirname, exists, join
+
+ROOT = dirname(dirname(__file__))
+APPS = {
+    "categorizer": join(ROOT, "Categorizer", "Python", "main.py"),
+    "reviewer": join(ROOT, "Semantic Annotations Reviewer", "Python", "main.py"),
+}
+
+
+class _Metrics:
+    def observe(self, name, seconds):
+        pass
+
+
+def shipped_engine(app):
+    """`MoveEngine` from `app`, without importing Kivy / Tk."""
+    with open(APPS[app], encoding="utf-8") as fh:
+        tree = ast.parse(fh.read())
+    body = [node for node in tree.body if getattr(node, "name", None) == "MoveEngine"]
+    env = {"os": os, "errno": errno, "shutil": shutil, "threading": threading,
+           "time": time, "basename": basename, "dirname": dirname, "exists": exists,
+           "metrics": _Metrics(), "log": lambda *parts: None}
+    exec(compile(ast.Module(body=body, type_ignores=[]), APPS[app], "exec"), env)
+    return env["MoveEngine"]()
+
+
+def legacy_move(src, dst):
+    """What `move_file` used to do for every move."""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    shutil.move(src, dst)
+
+
+def make_files(folder, n, size):
+    os.makedirs(folder, exist_ok=True)
+    blob = os.urandom(size)
+    for i in range(n):
+        with open(join(folder, f"img_{i}.png"), "wb") as fh:
+            fh.write(blob)
+    return sorted(os.listdir(folder))
+
+
+def measure(label, move, names, src, classes, workers=1):
+    moves = [(join(src, n), join(classes[i % len(classes)], n)) for i, n in enumerate(names)]
+    t0 = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(lambda m: move(*m), moves))
+    else:
+        for s, d in moves:
+            move(s, d)
+    seconds = time.perf_counter() - t0
+    size = sum(os.path.getsize(d) for _, d in moves)
+    print(f"{label:<38} {1e6 * seconds / len(moves):8.1f} µs/move   "
+          f"{size / 2**20 / seconds:8.1f} MiB/s")
+    for s, d in moves:  # put everything back for the next round
+        shutil.move(d, s)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--files", type=int, default=5000)
+    ap.add_argument("--kib", type=int, default=64, help="size of each file")
+    ap.add_argument("--classes", type=int, default=4)
+    ap.add_argument("--other", metavar="DIR", help="a folder on another filesystem")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--app", choices=sorted(APPS), action="append",
+                    help="engine(s) to time (default: both apps')")
+    args = ap.parse_args()
+    apps = args.app or sorted(APPS)
+
+    scratch = tempfile.mkdtemp(prefix="move_bench_")
+    targets = [("same device", scratch)]
+    if args.other:
+        targets.append(("cross device", tempfile.mkdtemp(prefix="move_bench_", dir=args.other)))
+    try:
+        src = join(scratch, "source")
+        names = make_files(src, args.files, args.kib * 1024)
+        print(f"{len(names):,} files of {args.kib} KiB")
+        for where, base in targets:
+            classes = [join(base, "classes", str(k)) for k in range(args.classes)]
+            measure(f"{where}: before", legacy_move, names, src, classes)
+            for app in apps:
+                measure(f"{where}: after ({app})", shipped_engine(app).move,
+                        names, src, classes)
+                if where == "cross device" and args.workers > 1:
+                    measure(f"{where}: after ({app}) ×{args.workers}",
+                            shipped_engine(app).move, names, src, classes, args.workers)
+    finally:
+        for _, base in targets:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
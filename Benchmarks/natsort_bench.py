@@ -0,0 +1,107 @@
+"""
+Micro‑benchmark: natural‑sort keys, list‑based (before) vs. bytes (after).
+
+    python Benchmarks/natsort_bench.py [--names 1000000] [--app Categorizer]
+
+Builds N shuffled file names shaped like camera / tile exports and reports,
+for both key functions: the time to compute every key, the time to sort,
+the time for 1000 bisect look‑ups (what a keystroke costs) and the memory
+held by the keys (traced on a 100k sample and scaled up).  The "after" key
+is read straight out of the app's main.py, so the numbers always describe
+the code that ships.
+"""
+
+import argparse
+import ast
+import random
+import re
+import time
+import tracemalloc
+from bisect import bisect_left
+from os.path import dirname, join
+
+ROOT = dirname(dirname(__file__))
+APPS = {
+    "Categorizer": join(ROOT, "Categorizer", "Python", "main.py"),
+    "Reviewer": join(ROOT, "Semantic Annotations Reviewer", "Python", "main.py"),
+}
+
+
+def legacy_key(name: str):
+    """The key `_lex_files` used to build for every name on every sort."""
+    return [int(t) if t.isdigit() else t.lower() for t in re.split(r"(\d+)", name)]
+
+
+def shipped_key(app: str):
+    """`FolderIndex._key` from the app, without importing Kivy / Tk."""
+    with open(APPS[app], encoding="utf-8") as fh:
+        tree = ast.parse(fh.read())
+    wanted = {"_DIGIT_RUNS", "natkey", "FolderIndex"}
+    body = [
+        node for node in tree.body
+        if getattr(node, "name", None) in wanted
+        or isinstance(node, ast.Assign)
+        and any(getattr(t, "id", None) in wanted for t in node.targets)
+    ]
+    env = {"re": re, "bisect_left": bisect_left, "bisect_right": None, "basename": None}
+    exec(compile(ast.Module(body=body, type_ignores=[]), APPS[app], "exec"), env)
+    return env["FolderIndex"]._key
+
+
+def make_names(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    shapes = ("IMG_{}.jpg", "tile_{}_{}.png", "Scan {} - page {}.tif", "crack{}.PNG")
+    names = [
+        shapes[i % 4].format(rnd.randrange(10**6), rnd.randrange(10**3))
+        + ("" if i % 7 else f".{i}")
+        for i in range(n)
+    ]
+    rnd.shuffle(names)
+    return names
+
+
+def bytes_per_key(key, names):
+    """Memory held per key, traced on a sample (tracing slows everything)."""
+    sample = names[:100_000]
+    tracemalloc.start()
+    keys = [key(n) for n in sample]
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keys
+    return held / max(1, len(sample))
+
+
+def measure(label, key, names, probes):
+    t0 = time.perf_counter()
+    keys = [key(n) for n in names]
+    t1 = time.perf_counter()
+    held = bytes_per_key(key, names) * len(names)
+
+    t2 = time.perf_counter()
+    keys.sort()
+    t3 = time.perf_counter()
+    for p in probes:
+        bisect_left(keys, key(p))
+    t4 = time.perf_counter()
+
+    print(
+        f"{label:<8} keys {t1 - t0:6.2f} s   sort {t3 - t2:6.2f} s   "
+        f"1000 look‑ups {1e3 * (t4 - t3):6.2f} ms   keys held {held / 2**20:7.1f} MiB"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--names", type=int, default=1_000_000)
+    ap.add_argument("--app", choices=sorted(APPS), default="Categorizer")
+    args = ap.parse_args()
+
+    names = make_names(args.names)
+    probes = random.Random(1).sample(names, min(1000, len(names)))
+    print(f"{len(names):,} names")
+    measure("before", lambda n: (legacy_key(n), n), names, probes)
+    measure("after", shipped_key(args.app), names, probes)
+
+
+if __name__ == "__main__":
+    main()
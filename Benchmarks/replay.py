@@ -0,0 +1,344 @@
+"""
+Headless replay benchmark for the Categorizer and the Semantic reviewer.
+
+    python Benchmarks/replay.py --app categorizer --files 10000 --keys 2000
+    python Benchmarks/replay.py --app reviewer --files 100000 --size 1024x768 \
+        --format bmp --mix move=0.6,enter=0.3,undo=0.05,redo=0.05
+
+Builds a synthetic dataset (PNG / BMP written with the standard library,
+JPEG through Pillow if it is installed), points the app at it through the
+IMAGE_ANNOTATOR_CONFIG environment variable, builds its `PicturesFrame`
+without a window (Kivy's mock GL backend plus a stand‑in window object)
+and replays a keystroke script through the same keyboard binding the real
+window would dispatch to.  Reports startup, per‑keystroke latency
+percentiles (p50 / p95 / p99, per operation and overall), files/s (images
+moved or skipped per second of wall time, background moves included) and
+peak RSS.
+
+Datasets are kept under --root and reused: before each run every file the
+previous run moved into a class folder is moved back, and the session state
+(journal, manifest, listing estimate) is wiped so the run starts cold.
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from os.path import dirname, exists, isdir, join
+
+ROOT = dirname(dirname(os.path.abspath(__file__)))
+APPS = {
+    "categorizer": join(ROOT, "Categorizer", "Python", "main.py"),
+    "reviewer": join(ROOT, "Semantic Annotations Reviewer", "Python", "main.py"),
+}
+CLASS_KEYS = "asdfg"
+
+
+# ─────────────────────────────── synthetic images ────────────────────────────
+def _pixels(w: int, h: int, rnd: random.Random) -> bytes:
+    """RGB rows of shifted noise – compresses about as well as real photos."""
+    base = rnd.randbytes(w * 3 + 3 * h)
+    return b"".join(base[3 * y : 3 * y + w * 3] for y in range(h))
+
+
+def png_bytes(w: int, h: int, rgb: bytes) -> bytes:
+    def chunk(tag, data):
+        crc = zlib.crc32(tag + data) & 0xFFFFFFFF
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", crc)
+
+    stride = w * 3
+    raw = b"".join(b"\0" + rgb[y * stride : (y + 1) * stride] for y in range(h))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def bmp_bytes(w: int, h: int, rgb: bytes) -> bytes:
+    stride, pad = w * 3, b"\0" * (-w * 3 % 4)
+    rows = []
+    for y in range(h - 1, -1, -1):  # bottom‑up, BGR
+        row = bytearray(rgb[y * stride : (y + 1) * stride])
+        row[0::3], row[2::3] = row[2::3], row[0::3]
+        rows.append(bytes(row) + pad)
+    pixels = b"".join(rows)
+    return (
+        b"BM"
+        + struct.pack("<IHHI", 54 + len(pixels), 0, 0, 54)
+        + struct.pack("<IiiHHIIiiII", 40, w, h, 1, 24, 0, len(pixels), 2835, 2835, 0, 0)
+        + pixels
+    )
+
+
+def jpg_bytes(w: int, h: int, rgb: bytes) -> bytes:
+    import io
+
+    from PIL import Image  # optional – only for --format jpg
+
+    buf = io.BytesIO()
+    Image.frombytes("RGB", (w, h), rgb).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+ENCODERS = {"png": png_bytes, "bmp": bmp_bytes, "jpg": jpg_bytes}
+
+
+def make_dataset(root: str, app: str, files: int, size, fmt: str, variants: int = 16):
+    """Create (or reset and reuse) a dataset; returns the path of its config."""
+    w, h = size
+    data = join(root, f"{app}-{files}-{w}x{h}-{fmt}")
+    src = join(data, "source")
+    classes = {k: join(data, "classes", k) for k in CLASS_KEYS}
+    cfg = {
+        "sourceImageFolder": src,
+        "key_dict": classes,
+        "settings": {"state_dir": join(data, "state")},
+    }
+    if app == "reviewer":
+        cfg["originalImageFolder"] = join(data, "original")
+
+    # put back whatever an earlier run labelled, and forget its session
+    for folder in classes.values():
+        if isdir(folder):
+            for entry in os.scandir(folder):
+                os.replace(entry.path, join(src, entry.name))
+    shutil.rmtree(cfg["settings"]["state_dir"], ignore_errors=True)
+
+    marker = join(data, "complete.json")
+    if not exists(marker):
+        rnd = random.Random(0)
+        encode = ENCODERS[fmt]
+        blobs = [encode(w, h, _pixels(w, h, rnd)) for _ in range(variants)]
+        folders = [src] + ([cfg["originalImageFolder"]] if app == "reviewer" else [])
+        for folder in folders + list(classes.values()):
+            os.makedirs(folder, exist_ok=True)
+        t0 = time.perf_counter()
+        for i in range(files):
+            name = f"img_{i}.{fmt}"
+            for folder in folders:
+                with open(join(folder, name), "wb") as fh:
+                    fh.write(blobs[i % variants])
+            if i and i % 100_000 == 0:
+                print(f"  wrote {i:,} files…")
+        with open(marker, "w", encoding="utf-8") as fh:
+            json.dump({"files": files}, fh)
+        print(f"dataset: {files:,} files written in {time.perf_counter() - t0:.1f} s")
+
+    path = join(data, "config.json")
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(cfg, fh, indent=2)
+    return path
+
+
+# ─────────────────────────────── keystroke script ────────────────────────────
+def make_script(keys: int, mix: str, seed: int = 0):
+    """Weighted random ops, e.g. "move=0.7,enter=0.2,undo=0.05,redo=0.05"."""
+    weights = {k: float(v) for k, v in (p.split("=") for p in mix.split(","))}
+    rnd = random.Random(seed)
+    ops = rnd.choices(list(weights), list(weights.values()), k=keys)
+    return [rnd.choice(CLASS_KEYS) if op == "move" else op for op in ops]
+
+
+def read_script(path: str):
+    """Whitespace‑separated tokens: a class key, "enter", "undo" or "redo"."""
+    with open(path, encoding="utf-8") as fh:
+        return fh.read().split()
+
+
+# ─────────────────────────────── headless Kivy ───────────────────────────────
+def headless_kivy():
+    """Kivy without a window provider: mock GL and a stand‑in window."""
+    os.environ["KIVY_WINDOW"] = ""
+    os.environ["KIVY_GL_BACKEND"] = "mock"
+    os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+    os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+    from kivy.config import Config
+
+    Config.set("graphics", "maxfps", "0")  # Clock.tick() must not sleep
+
+    import kivy.core.window as core_window
+    from kivy.base import EventLoop
+    from kivy.core.window import Keyboard
+    from kivy.graphics.cgl import cgl_init
+
+    cgl_init()
+
+    class HeadlessWindow:
+        dpi = 96
+        size = system_size = (1200, 800)
+        width, height = size
+        clearcolor = (0, 0, 0, 1)
+        keyboard = None
+
+        def request_keyboard(self, callback, target, *_args, **_kwargs):
+            self.keyboard = Keyboard(window=None, callback=callback, target=target)
+            return self.keyboard
+
+    window = HeadlessWindow()
+    EventLoop.window = window
+    core_window.Window = window
+    return window
+
+
+def load_app(path: str):
+    spec = importlib.util.spec_from_file_location("bench_app", path)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules["bench_app"] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+# ─────────────────────────────── measurement ─────────────────────────────────
+def percentile(sorted_ms, q):
+    if not sorted_ms:
+        return float("nan")
+    return sorted_ms[min(len(sorted_ms) - 1, int(q / 100 * len(sorted_ms)))]
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except (ImportError, AttributeError):
+            return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+KEYCODES = {"enter": 13}
+
+
+def press(keyboard, token):
+    """Dispatch one token the way the window's keyboard would."""
+    from kivy.core.window import Keyboard
+
+    if token in ("undo", "redo"):
+        key, text, mods = ("z" if token == "undo" else "y"), None, ["ctrl"]
+    elif token == "enter":
+        key, text, mods = "enter", None, []
+    else:
+        key, text, mods = token, token, []
+    code = Keyboard.keycodes.get(key, KEYCODES.get(key, -1))
+    keyboard.dispatch("on_key_down", (code, key), text, mods)
+
+
+def run(args):
+    config = make_dataset(
+        args.root, args.app, args.files, args.size, args.format
+    )
+    os.environ["IMAGE_ANNOTATOR_CONFIG"] = config
+    script = read_script(args.script) if args.script else make_script(args.keys, args.mix)
+    window = headless_kivy()
+
+    log = open(join(args.root, f"{args.app}-app.log"), "w", encoding="utf-8")
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else log):
+        t0 = time.perf_counter()
+        mod = load_app(APPS[args.app])
+        ti = time.perf_counter()
+        mod.configure()  # reads IMAGE_ANNOTATOR_CONFIG
+        t1 = time.perf_counter()
+        from kivy.clock import Clock
+
+        app = mod.PicturesApp()
+        app.load_kv()
+        frame = app.build()
+        t2 = time.perf_counter()
+        while not frame.scanner.done:
+            Clock.tick()
+        Clock.tick()
+        t3 = time.perf_counter()
+
+        latency = {}
+        start = time.perf_counter()
+        for token in script:
+            k0 = time.perf_counter()
+            press(window.keyboard, token)
+            latency.setdefault(
+                token if token in ("enter", "undo", "redo") else "move", []
+            ).append(1e3 * (time.perf_counter() - k0))
+            Clock.tick()
+        replay = time.perf_counter() - start
+        app.on_stop()  # drains the move queue, closes the journal
+        wall = time.perf_counter() - start
+    log.close()
+
+    advanced = len(latency.get("move", ())) + len(latency.get("enter", ()))
+    latency["all"] = [v for vs in latency.values() for v in vs]
+    return {
+        "app": args.app,
+        "files": args.files,
+        "size": "x".join(map(str, args.size)),
+        "format": args.format,
+        "keys": len(script),
+        "import_s": ti - t0,
+        "configure_s": t1 - ti,
+        "first_frame_s": t2 - t1,
+        "full_listing_s": t3 - t1,
+        "replay_s": replay,
+        "wall_s": wall,
+        "files_per_s": advanced / wall if wall else float("nan"),
+        "peak_rss_mb": peak_rss_mb(),
+        "latency_ms": {
+            op: {f"p{q}": percentile(sorted(vs), q) for q in (50, 95, 99)}
+            | {"n": len(vs)}
+            for op, vs in latency.items()
+        },
+    }
+
+
+def report(r):
+    print(
+        f"{r['app']}: {r['files']:,} × {r['size']} {r['format']}, {r['keys']:,} keys\n"
+        f"  startup   import {r['import_s']:.2f} s, configure {r['configure_s']:.2f} s, "
+        f"first frame {r['first_frame_s']:.2f} s, "
+        f"full listing {r['full_listing_s']:.2f} s\n"
+        f"  replay    {r['replay_s']:.2f} s (+ drain → {r['wall_s']:.2f} s), "
+        f"{r['files_per_s']:.1f} files/s, peak RSS {r['peak_rss_mb']:.0f} MiB"
+    )
+    print(f"  {'op':<6} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for op, st in r["latency_ms"].items():
+        print(f"  {op:<6} {st['n']:>6} {st['p50']:>8.2f} {st['p95']:>8.2f} {st['p99']:>8.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--app", choices=sorted(APPS), default="categorizer")
+    ap.add_argument("--files", type=int, default=10_000)
+    ap.add_argument("--size", type=lambda v: tuple(map(int, v.split("x"))),
+                    default=(640, 480), help="WxH of the synthetic images")
+    ap.add_argument("--format", choices=sorted(ENCODERS), default="png")
+    ap.add_argument("--keys", type=int, default=2000, help="length of a generated script")
+    ap.add_argument("--mix", default="move=0.7,enter=0.2,undo=0.05,redo=0.05",
+                    help="op weights of a generated script")
+    ap.add_argument("--script", help="replay this token file instead")
+    ap.add_argument("--root", default=join(tempfile.gettempdir(), "image_annotator_bench"),
+                    help="where datasets are kept between runs")
+    ap.add_argument("--json", help="also write the results to this file")
+    ap.add_argument("--verbose", action="store_true", help="show the app's own output")
+    args = ap.parse_args()
+    os.makedirs(args.root, exist_ok=True)
+
+    result = run(args)
+    report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -28,125 +28,3160 @@ Python >= 2.7
 Kivy >= 1.0.6
 '''
 # ── std libs ────────────────────────────────────────────────────────────────
-import os, sys, json, ntpath, shutil
-from collections import deque
-from glob import glob
-from os.path import basename, exists, join
-from tkinter import Tk, filedialog
+import time
+_startup = [("", time.perf_counter())]  # (phase, when it ended) – startup_report()
+
+import os, sys, json, ntpath, shutil, hashlib, threading, argparse, queue
+import errno, functools, logging, socket, zlib
+from bisect import bisect_left, bisect_right
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from io import BytesIO
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain, islice
+from os.path import basename, dirname, exists, join
+# tkinter (config dialog), sqlite3 (manifest mode), PIL (previews) and
+# http.server (metrics endpoint) are imported only where they are used
+_startup.append(("stdlib", time.perf_counter()))
 
 # ── 3rd‑party libs ───────────────────────────────────────────────────────────
 import re
+os.environ.setdefault("KIVY_NO_ARGS", "1")   # our own CLI flags, not Kivy's
 import kivy
 from kivy.app import App
-from kivy.core.window import Window
-from kivy.properties import ListProperty, StringProperty
+from kivy.clock import Clock
+from kivy.core.image import Image as CoreImage
+from kivy.core.image import ImageLoader
+from kivy.graphics import Color, Rectangle
+from kivy.properties import BooleanProperty, ListProperty, NumericProperty, StringProperty
+from kivy.uix.gridlayout import GridLayout  # noqa: F401 – used by pictures.kv
 from kivy.uix.scatter import Scatter
+from kivy.uix.stencilview import StencilView
 from kivy.uix.widget import Widget
 
-kivy.require("1.10.1")
+kivy.require("1.10.1")
+_startup.append(("kivy", time.perf_counter()))
+
+# Load configuration from JSON file
+# This function will open a file dialog to select the JSON file
+# and return the source image folder and key dictionary
+# The JSON file should contain the following structure:
+# {
+#     "sourceImageFolder": "path/to/source/folder",
+#     "key_dict": {
+#         "key1": "path/to/destination/folder1",
+#         "key2": "path/to/destination/folder2",
+#         ...
+#     },
+#     "settings": {                   # optional – performance tuning
+#         "prefetch_window": 3,       # images decoded ahead of the Next pane
+#         "prefetch_workers": 2,      # decoder threads
+#         "texture_cache_mb": 512,    # LRU budget for decoded textures
+#         "preview_dir": "path/to/preview/cache",   # enables renditions
+#         "preview_sides": [1024, 384],             # rendition long edges
+#         "journal": "path/to/journal.jsonl",       # default: ~/.image_annotator/…
+#         "journal_compact_at": 10000,              # stale records before compaction
+#         "label_mode": "move",                     # or "manifest" (record only)
+#         "manifest": "path/to/labels.sqlite",      # default: next to the journal
+#         "quarantine_dir": "path/to/quarantine",   # bad files found by --validate
+#         "dedup_distance": 4,                      # dHash bits for near duplicates
+#         "metrics_log": "path/to/metrics.jsonl",   # periodic timing snapshots
+#         "metrics_port": 9100,                     # Prometheus text endpoint
+#         "overlay_key": "f12",                     # toggles the on‑screen overlay
+#         "grid_key": "tab",                        # toggles the thumbnail grid
+#         "grid_size": 4,                           # grid mode shows K×K images
+#         "tile_above": 8192,                       # px; larger images are tiled
+#         "tile_cache_mb": 256                      # decoded tiles kept on the GPU
+#     }
+# }
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Load configuration (asks user for the JSON file at startup, unless --config
+# or the IMAGE_ANNOTATOR_CONFIG environment variable names it)
+# ─────────────────────────────────────────────────────────────────────────────
+def ask_config_path():
+    from tkinter import Tk, filedialog  # only when no config path was given
+
+    root = Tk()
+    root.withdraw()
+
+    try:                                                    # set nice icon (optional)
+        if os.name == "nt":                                 # Windows
+            icon_path = "app.ico"
+            root.iconbitmap(icon_path)
+            root.tk.call("wm", "iconbitmap", root._w, "-default", icon_path)
+        elif sys.platform == "darwin":                      # macOS
+            from PIL import Image, ImageTk                  # noqa: import‑only‑when‑needed
+            icon = Image.open("icon.png")
+            root.iconphoto(True, ImageTk.PhotoImage(icon))
+    except Exception as e:
+        print(f"[warn] could not set dialog icon: {e}")
+
+    return filedialog.askopenfilename(
+        title="Select JSON file",
+        filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+    )
+
+
+def load_config(cfg_path=None):
+    cfg_path = cfg_path or os.environ.get("IMAGE_ANNOTATOR_CONFIG") or ask_config_path()
+    if not cfg_path:
+        print("No config file selected – exiting.")
+        sys.exit(1)
+
+    try:
+        with open(cfg_path, "r") as fh:
+            cfg = json.load(fh)
+        return cfg["sourceImageFolder"], cfg["key_dict"], cfg.get("settings", {})
+    except Exception as e:
+        print(f"[err] bad config file: {e}")
+        sys.exit(1)
+
+
+# ─── configuration on disk – filled in by configure() ───────────────────────
+sourceImageFolder, key_dict, settings = "", {}, {}
+
+# ═════════════════════════════════════════════════════════════════════════════
+# Telemetry
+# ═════════════════════════════════════════════════════════════════════════════
+class Metrics:
+    """
+    Timing spans and gauges for the hot paths.
+
+    `span(name)` (or the `timed(name)` decorator) records the count, total,
+    worst and latest duration of a step – listing, decode, texture upload,
+    moves, pane refresh – so a stall can be split into I/O and decode.
+    Gauges are callables, read only when a snapshot is taken.  Snapshots
+    feed the JSON‑lines log, the Prometheus text endpoint and the overlay.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}   # name -> [count, total s, max s, last s]
+        self._gauges = {}  # name -> callable returning a number
+
+    @contextmanager
+    def span(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def timed(self, name: str):
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            s = self._spans.get(name)
+            if s is None:
+                self._spans[name] = [1, seconds, seconds, seconds]
+            else:
+                s[0] += 1
+                s[1] += seconds
+                s[2] = max(s[2], seconds)
+                s[3] = seconds
+
+    def last(self, name: str) -> float:
+        """Duration of the latest `name` span in seconds (0 if none yet)."""
+        s = self._spans.get(name)
+        return s[3] if s else 0.0
+
+    def gauge(self, name: str, fn):
+        self._gauges[name] = fn
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            spans = {n: {"count": c, "total_s": t, "max_s": m, "last_s": l}
+                     for n, (c, t, m, l) in self._spans.items()}
+        gauges = {}
+        for name, fn in list(self._gauges.items()):
+            try:
+                gauges[name] = fn()
+            except Exception:
+                continue  # a gauge must never break an export
+        return {"ts": time.time(), "spans": spans, "gauges": gauges}
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        snap = self.snapshot()
+        spans = sorted(snap["spans"].items())
+        out = ["# TYPE image_annotator_span_seconds summary"]
+        for n, s in spans:
+            out.append(f'image_annotator_span_seconds_count{{span="{n}"}} {s["count"]}')
+            out.append(f'image_annotator_span_seconds_sum{{span="{n}"}} {s["total_s"]:.6f}')
+        for field in ("max", "last"):
+            out.append(f"# TYPE image_annotator_span_{field}_seconds gauge")
+            out += [f'image_annotator_span_{field}_seconds{{span="{n}"}} {s[field + "_s"]:.6f}'
+                    for n, s in spans]
+        for name, value in sorted(snap["gauges"].items()):
+            out += [f"# TYPE image_annotator_{name} gauge", f"image_annotator_{name} {value}"]
+        return "\n".join(out) + "\n"
+
+
+metrics = Metrics()
+metrics.gauge("frame_ms", lambda: Clock.frametime * 1000)
+
+
+def start_metrics_export():
+    """Start the exporters named in the settings (both are optional)."""
+    path = settings.get("metrics_log")
+    if path:
+        interval = float(settings.get("metrics_interval", 10))
+
+        def dump():
+            while True:
+                time.sleep(interval)
+                write_metrics_log()
+
+        threading.Thread(target=dump, name="metrics-log", daemon=True).start()
+
+    port = settings.get("metrics_port")
+    if port:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_args):
+                pass  # no console line per scrape
+
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", int(port)), Handler)
+        except OSError as e:
+            print(f"[warn] could not serve metrics on port {port}: {e}")
+            return
+        threading.Thread(target=server.serve_forever, name="metrics-http",
+                         daemon=True).start()
+        print(f"[info] metrics at http://127.0.0.1:{port}/metrics")
+
+
+def write_metrics_log():
+    """Append one snapshot to the JSON‑lines metrics log, if configured."""
+    path = settings.get("metrics_log")
+    if not path:
+        return
+    try:
+        with open(path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(metrics.snapshot()) + "\n")
+    except OSError as e:
+        print(f"[warn] could not write metrics log: {e}")
+
+
+_console = queue.Queue()
+
+
+def log(*parts):
+    """print() on a background thread – a slow console never stalls a keypress."""
+    _console.put(parts)
+
+
+def flush_log():
+    _console.join()
+
+
+def _print_console():
+    while True:
+        parts = _console.get()
+        print(*parts)
+        _console.task_done()
+
+
+threading.Thread(target=_print_console, name="console", daemon=True).start()
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# Helpers
+# ═════════════════════════════════════════════════════════════════════════════
+class MoveEngine:
+    """
+    File moves with as little work per move as the filesystems allow.
+
+    Destination folders are created once and remembered.  Whether a source
+    and a destination folder share a filesystem is looked up once per pair
+    (st_dev); such a move is a single os.rename.  Across devices the bytes
+    are copied in the kernel (copy_file_range, else sendfile, else a plain
+    read / write loop) into a new file, then the source is unlinked.
+
+    A name that is already taken is never overwritten: the file lands as
+    "<stem>~<n><ext>" with the lowest free n.  The engine remembers where a
+    requested destination really landed, so moving it back (an undo) finds
+    the file; `landed` is called with both paths so the journal can keep
+    that across sessions.
+    """
+
+    # a copy method this kernel / filesystem pair does not support
+    FALLBACK = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF,
+                errno.ENOTSOCK)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._made = set()    # destination folders known to exist
+        self._same = {}       # (src dir, dst dir) -> on one filesystem?
+        self._taken = set()   # collision names handed out, not yet on disk
+        self._alias = {}      # requested destination -> where the file landed
+        self._kernel = ["copy_file_range", "sendfile"]  # copy methods that still work
+        self._stats = {"rename": [0, 0.0], "copy": [0, 0.0]}  # count, seconds
+        self.copied = 0       # bytes copied across devices
+        self.collisions = 0
+        self.landed = None    # callable(dst, path) – see configure()
+
+    def alias(self, dst, path):
+        """Record that the file moved to `dst` is at `path` (journal replay)."""
+        self._alias[dst] = path
+
+    def where(self, dst) -> str:
+        """Where the file moved to `dst` really is."""
+        return self._alias.get(dst, dst)
+
+    def move(self, src, dst) -> str:
+        """Move `src` to `dst` (or a free name beside it); returns the final path."""
+        with self._lock:
+            src = self._alias.pop(src, src)
+        folder = dirname(dst)
+        if folder not in self._made:
+            os.makedirs(folder, exist_ok=True)
+            self._made.add(folder)
+        target = self._free(dst)
+        t0 = time.perf_counter()
+        try:
+            kind = self._move(src, target, folder)
+        except FileNotFoundError:
+            if not exists(src):
+                raise
+            self._made.discard(folder)  # the folder went away under the cache
+            os.makedirs(folder, exist_ok=True)
+            self._made.add(folder)
+            kind = self._move(src, target, folder)
+        finally:
+            with self._lock:
+                self._taken.discard(target)
+        seconds = time.perf_counter() - t0
+        with self._lock:
+            stat = self._stats[kind]
+            stat[0] += 1
+            stat[1] += seconds
+            if target != dst:
+                self._alias[dst] = target
+                self.collisions += 1
+            else:
+                self._alias.pop(dst, None)  # an older collision's name is stale
+        metrics.observe(f"move_{kind}", seconds)
+        if target != dst:
+            log(f"[warn] {basename(dst)} already in {folder}, kept as {basename(target)}")
+            if self.landed is not None:
+                self.landed(dst, target)
+        return target
+
+    def _free(self, dst) -> str:
+        """`dst`, or the first "<stem>~<n><ext>" beside it that nothing uses."""
+        stem, ext = os.path.splitext(dst)
+        path, n = dst, 0
+        with self._lock:
+            while path in self._taken or os.path.lexists(path):
+                n += 1
+                path = f"{stem}~{n}{ext}"
+            self._taken.add(path)
+        return path
+
+    def _move(self, src, dst, folder) -> str:
+        pair = (dirname(src), folder)
+        same = self._same.get(pair)
+        if same is None:
+            same = self._same[pair] = os.stat(pair[0]).st_dev == os.stat(folder).st_dev
+        if same:
+            try:
+                os.rename(src, dst)
+                return "rename"
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                self._same[pair] = False  # a mount point inside the folder
+        self._copy(src, dst)
+        os.unlink(src)
+        return "copy"
+
+    def _copy(self, src, dst):
+        """Copy `src` into the new file `dst` in the kernel where possible."""
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+        with open(src, "rb") as fin:
+            fd = os.open(dst, flags, 0o666)
+            try:
+                with open(fd, "wb", closefd=True) as fout:
+                    size = os.fstat(fin.fileno()).st_size
+                    self._pump(fin, fout, size)
+            except BaseException:
+                os.unlink(dst)
+                raise
+        shutil.copystat(src, dst)
+        with self._lock:
+            self.copied += size
+
+    def _pump(self, fin, fout, size):
+        i, o, done = fin.fileno(), fout.fileno(), 0
+        while done < size:
+            method = self._kernel[0] if self._kernel else None
+            try:
+                if method == "copy_file_range":
+                    n = os.copy_file_range(i, o, size - done, done, done)
+                elif method == "sendfile":
+                    os.lseek(o, done, os.SEEK_SET)
+                    n = os.sendfile(o, i, done, size - done)
+                else:
+                    fin.seek(done)
+                    fout.seek(done)
+                    shutil.copyfileobj(fin, fout, 1 << 20)
+                    fout.flush()
+                    return
+            except (AttributeError, OSError) as e:
+                if method is None or isinstance(e, OSError) and e.errno not in self.FALLBACK:
+                    raise
+                with self._lock:  # this kernel / filesystem can't – use the next one
+                    if self._kernel and self._kernel[0] == method:
+                        self._kernel.pop(0)
+                continue
+            if n == 0:  # the source shrank under us
+                break
+            done += n
+
+    def stats(self) -> str:
+        with self._lock:
+            (renames, rename_s), (copies, copy_s) = self._stats["rename"], self._stats["copy"]
+            copied, collisions = self.copied, self.collisions
+        text = f"renames={renames}"
+        if renames:
+            text += f" ({1e6 * rename_s / renames:.0f} µs each)"
+        text += f" copies={copies}"
+        if copies:
+            rate = copied / 2**20 / copy_s if copy_s else 0.0
+            text += f" ({1e3 * copy_s / copies:.1f} ms each, {rate:.0f} MiB/s)"
+        return text + f" renamed‑on‑collision={collisions}"
+
+
+move_engine = MoveEngine()
+
+
+@metrics.timed("move")
+def move_file(src, dst):
+    """Move `src` to `dst` – or a free name beside it; returns where it landed."""
+    log("move:", src, "→", dst)
+    return move_engine.move(src, dst)
+
+
+class MoveQueue:
+    """
+    Ordered write‑behind queue for file moves.
+
+    Moves run on a background thread in submission order, so an undo queued
+    after its move always lands after it and the UI can advance as soon as
+    a move is queued.  Whatever has piled up is taken as one batch and cut
+    into runs of moves that touch no common path; a run's moves go out
+    together on `workers` threads, which overlaps slow cross‑device copies.
+    `pending` is the number of moves not yet on disk; `flush()` blocks until
+    all of them have landed.  Moves that fail are handed back to the UI
+    through `take_failures()`.
+    """
+
+    def __init__(self, batch: int = 64):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._incoming = {}  # dst path -> moves queued towards it
+        self._pool = None
+        self.batch = batch
+        self.workers = 4  # see configure()
+        self.pending = 0
+        self.failed = 0
+        self._failures = queue.SimpleQueue()  # (src, dst, error) of failed moves
+        threading.Thread(target=self._run, name="mover", daemon=True).start()
+
+    def submit(self, src, dst):
+        with self._lock:
+            self.pending += 1
+            self._incoming[dst] = self._incoming.get(dst, 0) + 1
+        self._queue.put((src, dst))
+
+    def incoming(self, path) -> bool:
+        """True while a queued move is about to create `path`."""
+        return path in self._incoming
+
+    def flush(self):
+        self._queue.join()
+
+    def take_failures(self) -> list:
+        """(src, dst, error) of every move that failed since the last call."""
+        failures = []
+        while not self._failures.empty():
+            failures.append(self._failures.get())
+        return failures
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for run in self._runs(batch):
+                if len(run) == 1 or self.workers <= 1:
+                    for move in run:
+                        self._move(move)
+                else:
+                    if self._pool is None:
+                        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="mover")
+                    list(self._pool.map(self._move, run))
+
+    @staticmethod
+    def _runs(batch):
+        """Split `batch` where a move touches a path an earlier one in the run did."""
+        run, touched = [], set()
+        for src, dst in batch:
+            if src in touched or dst in touched:
+                yield run
+                run, touched = [], set()
+            run.append((src, dst))
+            touched.update((src, dst))
+        yield run
+
+    def _move(self, move):
+        src, dst = move
+        try:
+            move_file(src, dst)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            self._failures.put((src, dst, str(e)))
+            print(f"[err] move failed {src} → {dst}: {e}")
+        finally:
+            with self._lock:
+                self.pending -= 1
+                if self._incoming[dst] == 1:
+                    del self._incoming[dst]
+                else:
+                    self._incoming[dst] -= 1
+            self._queue.task_done()
+
+
+move_queue = MoveQueue()
+metrics.gauge("moves_pending", lambda: move_queue.pending)
+
+
+def state_dir() -> str:
+    """Per‑source folder for session state (journal, indexes) outside the data."""
+    root = settings.get("state_dir") or join(os.path.expanduser("~"), ".image_annotator")
+    src = os.path.abspath(sourceImageFolder)
+    tag = hashlib.blake2b(src.encode("utf-8"), digest_size=6).hexdigest()
+    path = join(root, "categorizer", f"{basename(src.rstrip(os.sep)) or 'root'}-{tag}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class Journal:
+    """
+    Crash‑safe, append‑only JSON‑lines log of every move / undo / redo.
+
+    `append()` only queues the record; a background thread writes whatever
+    has accumulated as one group commit (a single write + fsync at most
+    every `interval` seconds), so journaling adds no I/O to a keypress.
+    `read()` replays the file at startup and `compact()` atomically
+    rewrites it with only the records that are still in effect.
+    """
+
+    def __init__(self, path, interval: float = 0.25):
+        self.path = path
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start = threading.Lock()  # the mover appends too
+
+    def append(self, op, **fields):
+        if self._thread is None:
+            with self._start:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="journal",
+                                                    daemon=True)
+                    self._thread.start()
+        self._queue.put(dict(op=op, ts=round(time.time(), 3), **fields))
+
+    def _run(self):
+        torn = False
+        try:
+            with open(self.path, "rb") as fh:
+                if fh.seek(0, os.SEEK_END):
+                    fh.seek(-1, os.SEEK_END)
+                    torn = fh.read(1) != b"\n"
+        except FileNotFoundError:
+            pass
+        with open(self.path, "a", encoding="utf-8") as fh:
+            if torn:  # start on a fresh line after a crash mid‑write
+                fh.write("\n")
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.interval
+                while batch[-1] is not None:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=left))
+                    except queue.Empty:
+                        break
+                fh.writelines(json.dumps(r, ensure_ascii=False) + "\n"
+                              for r in batch if r is not None)
+                fh.flush()
+                os.fsync(fh.fileno())
+                if batch[-1] is None:
+                    return
+
+    def close(self):
+        """Commit everything queued so far and stop the writer."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    @staticmethod
+    def read(path):
+        records = []
+        try:
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue  # torn line after a crash
+        except FileNotFoundError:
+            pass
+        return records
+
+    def compact(self, records):
+        """Replace the journal with `records` (write‑to‑temp + rename)."""
+        self.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.path)
+
+
+journal = None  # Journal of this source folder – see configure()
+
+
+class MoveHistory:
+    """
+    Unbounded undo / redo history of file moves, kept in flat arrays.
+
+    A path is an interned folder id plus its basename, stored as UTF‑8 in a
+    shared bytearray – once for a move's source and destination and for
+    the neighbours that come up again in the next few entries.
+    An entry – one move or a whole batch – is a slice of the per‑move
+    columns, with a few values of its own if `extra` asks for them ("i" an
+    int, "p" a path).  Entries before `top` are done, the rest can be
+    redone; push, undo and redo are O(1), a push after undos just truncates
+    the redo tail, and 100k moves take a few MB.
+    """
+
+    NONE = -1  # stands for an empty path
+
+    def __init__(self, extra: str = ""):
+        self.extra = extra
+        self.top = 0
+        self._dirs, self._dir_ids = [], {}
+        self._blob = bytearray()       # basenames, back to back
+        self._ends = array("I")        # end of every basename in _blob
+        self._moves = array("i")       # per move: src dir, src name, dst dir, dst name
+        self._values = array("q")      # per entry: its extra values, a path as dir, name
+        self._first = array("I", [0])  # entry i = moves _first[i] … _first[i + 1]
+        self._names_at = array("I")    # basenames stored before entry i
+        self._width = sum(2 if kind == "p" else 1 for kind in extra)
+        self._recent = {}              # basename → name id, for the last few names
+
+    def __len__(self):
+        return len(self._first) - 1
+
+    def push(self, moves, *values):
+        """Record [(src, dst), …] as a new entry, dropping what could be redone."""
+        if self.top < len(self):
+            self._truncate(self.top)
+        self._names_at.append(len(self._ends))
+        for src, dst in moves:
+            self._moves.extend((*self._put(src), *self._put(dst)))
+        self._first.append(len(self._moves) // 4)
+        for kind, value in zip(self.extra, values):
+            self._values.extend(self._put(value) if kind == "p" else (value,))
+        self.top += 1
+
+    def undo(self):
+        """(moves, values) of the last done entry, now undone – or None."""
+        if not self.top:
+            return None
+        self.top -= 1
+        return self.entry(self.top)
+
+    def redo(self):
+        """(moves, values) of the next undone entry, now done again – or None."""
+        if self.top == len(self):
+            return None
+        self.top += 1
+        return self.entry(self.top - 1)
+
+    def entry(self, i: int):
+        m = self._moves
+        moves = [(self._get(m[j], m[j + 1]), self._get(m[j + 2], m[j + 3]))
+                 for j in range(4 * self._first[i], 4 * self._first[i + 1], 4)]
+        values, j = [], i * self._width
+        for kind in self.extra:
+            if kind == "p":
+                values.append(self._get(self._values[j], self._values[j + 1]))
+                j += 2
+            else:
+                values.append(self._values[j])
+                j += 1
+        return moves, tuple(values)
+
+    def nbytes(self) -> int:
+        """Memory held by the columns and the interned folders (approximate)."""
+        columns = (self._blob, self._ends, self._moves, self._values, self._first, self._names_at)
+        return (sum(len(c) * getattr(c, "itemsize", 1) for c in columns)
+                + sum(sys.getsizeof(d) for d in self._dirs))
+
+    def _put(self, path):
+        """(dir id, name id) of `path`."""
+        if not path:
+            return self.NONE, self.NONE
+        name = basename(path)
+        folder = path[:len(path) - len(name)]  # kept verbatim, separator and all
+        d = self._dir_ids.get(folder)
+        if d is None:
+            d = self._dir_ids[folder] = len(self._dirs)
+            self._dirs.append(folder)
+        n = self._recent.get(name)
+        if n is None:
+            if len(self._recent) >= 16:
+                self._recent.clear()
+            self._blob += name.encode("utf-8", "surrogateescape")
+            self._ends.append(len(self._blob))
+            n = self._recent[name] = len(self._ends) - 1
+        return d, n
+
+    def _get(self, d: int, n: int) -> str:
+        if d == self.NONE:
+            return ""
+        start = self._ends[n - 1] if n else 0
+        return self._dirs[d] + self._blob[start:self._ends[n]].decode("utf-8", "surrogateescape")
+
+    def _truncate(self, n: int):
+        """Forget entries n and up."""
+        del self._moves[4 * self._first[n]:]
+        del self._first[n + 1:]
+        del self._values[n * self._width:]
+        del self._ends[self._names_at[n]:]
+        del self._names_at[n:]
+        del self._blob[self._ends[-1] if self._ends else 0:]
+        self._recent.clear()
+
+
+# ─── label manifest ("label_mode": "manifest") ───────────────────────────────
+class LabelManifest:
+    """
+    Labelling decisions recorded in SQLite instead of moving files.
+
+    Used when "label_mode" is "manifest": a keypress becomes one local
+    INSERT, so labelling speed no longer depends on the dataset's
+    filesystem.  `materialize()` later applies all pending decisions in a
+    single batched pass.
+    """
+
+    def __init__(self, path):
+        import sqlite3  # manifest mode only
+
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS labels ("
+            " src TEXT PRIMARY KEY, dst TEXT NOT NULL, key TEXT,"
+            " ts REAL NOT NULL, done TEXT NOT NULL DEFAULT '')"
+        )
+        self._keys = {os.path.normcase(os.path.normpath(d)): k for k, d in key_dict.items() if d}
+
+    def record(self, src, dst):
+        """Record a decision; one already materialized is left as it is."""
+        key = self._keys.get(os.path.normcase(os.path.normpath(dirname(dst))))
+        self._db.execute("INSERT INTO labels VALUES (?, ?, ?, ?, '') ON CONFLICT (src) DO UPDATE"
+                         " SET dst = excluded.dst, key = excluded.key, ts = excluded.ts"
+                         " WHERE done = ''", (src, dst, key, time.time()))
+
+    def forget(self, src) -> str:
+        """Drop the decision for `src`; returns how it was materialized ('' = not yet)."""
+        row = self._db.execute("SELECT done FROM labels WHERE src = ?", (src,)).fetchone()
+        self._db.execute("DELETE FROM labels WHERE src = ?", (src,))
+        return row[0] if row else ""
+
+    def labelled(self):
+        return [r[0] for r in self._db.execute("SELECT src FROM labels")]
+
+    def pending(self):
+        return self._db.execute("SELECT src, dst FROM labels WHERE done = ''").fetchall()
+
+    def mark_done(self, pairs, how):
+        """Mark `pairs` materialized; a dst differs from the recorded one on a collision."""
+        self._db.execute("BEGIN")
+        self._db.executemany("UPDATE labels SET done = ?, dst = ? WHERE src = ?",
+                             [(how, dst, src) for src, dst in pairs])
+        self._db.execute("COMMIT")
+
+
+manifest = None  # LabelManifest in "manifest" label mode – see configure()
+
+
+def label_file(src, dst):
+    """Apply one labelling decision; returns where the image lives afterwards."""
+    if manifest is not None:
+        manifest.record(src, dst)
+        return src
+    move_queue.submit(src, dst)
+    return dst
+
+
+def unlabel_file(src, dst):
+    """Revert `label_file(src, dst)` (undo); lands after any queued move."""
+    if manifest is None or manifest.forget(src) == "move":
+        move_queue.submit(dst, src)
+
+
+def materialize(how="move", batch: int = 256):
+    """
+    Apply every pending manifest decision in one pass: destination folders
+    are created once, then files are moved / hard‑linked / symlinked in
+    per‑folder batches on a thread pool.  Archive members are extracted.
+    """
+    db = LabelManifest(settings.get("manifest") or join(state_dir(), "labels.sqlite"))
+    if archives is not None:
+        for _ in archives.names():  # load the member indexes
+            pass
+    op = {"move": move_file, "hardlink": os.link,
+          "symlink": lambda s, d: os.symlink(os.path.abspath(s), d)}[how]
+    groups = {}
+    for src, dst in db.pending():
+        groups.setdefault(dirname(dst), []).append((src, dst))
+    for folder in groups:
+        os.makedirs(folder, exist_ok=True)
+    chunks = [pairs[i:i + batch] for pairs in groups.values()
+              for i in range(0, len(pairs), batch)]
+
+    def run(chunk):
+        done, extracted = [], []
+        for src, dst in chunk:
+            try:
+                if archives is not None and archives.has(src):
+                    archives.extract(src, dst)
+                    extracted.append((src, dst))
+                else:
+                    done.append((src, op(src, dst) or dst))  # move_file may rename
+            except OSError as e:
+                print(f"[warn] {how} failed {src} → {dst}: {e}")
+        return done, extracted
+
+    total = 0
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 4) * 4)) as pool:
+        for done, extracted in pool.map(run, chunks):
+            db.mark_done(done, how)
+            db.mark_done(extracted, "extract")
+            total += len(done) + len(extracted)
+    print(f"[info] materialized {total} labels into {len(groups)} folders ({how})")
+
+
+def normal_key(name: str) -> str:
+    """
+    Convert keypad digits / Enter to plain equivalents using *symbolic* names
+    so ordinary letters never get remapped.
+    """
+    lname = name.lower()
+    # keypad digits come as 'numpad7', 'kp3', …
+    if lname.startswith(("numpad", "kp")) and lname[-1].isdigit():
+        return lname[-1]
+    # translate keypad Enter
+    if lname in ("numpadenter", "kpenter"):
+        return "enter"
+    return lname
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# Folder index
+# ═════════════════════════════════════════════════════════════════════════════
+_DIGIT_RUNS = re.compile(r"(\d+)")
+
+
+def natkey(name: str) -> bytes:
+    """
+    Natural‑sort key (…1, …2, …10) – case‑insensitive – as one bytes object.
+
+    Text runs are stored as UTF‑8 plus a NUL terminator, digit runs as their
+    length (≥ 1) followed by the digits without leading zeros, so keys
+    compare with a plain `<` (a memcmp) exactly as [text, int, text, …]
+    lists would, and take a fraction of the memory.
+    """
+    out = bytearray()
+    for i, t in enumerate(_DIGIT_RUNS.split(name)):
+        if i % 2 == 0:  # text (the split alternates text, digits, text …)
+            out += t.lower().encode("utf-8", "surrogatepass") + b"\0"
+            continue
+        if not t.isascii():  # other scripts' digits, e.g. "٣"
+            t = "".join(str(int(c)) for c in t)
+        t = t.lstrip("0") or "0"
+        n = len(t)
+        out += bytes([n]) if n < 255 else b"\xff" + n.to_bytes(4, "big")
+        out += t.encode("ascii")
+    return bytes(out)
+
+
+class FolderIndex:
+    """
+    Sorted, in‑memory list of the basenames in the source folder.
+
+    Built once from a directory listing and then patched in place on
+    move / undo / redo, so positioning by basename is a bisect (O(log n))
+    instead of a fresh glob + sort + list.index on every keystroke.
+    """
+
+    rank = None  # name → bytes sorted before the name, e.g. LeaseBoard.prefix
+
+    def __init__(self, paths=()):
+        self._names = []  # basenames in natural order
+        self._keys = []   # natkey‑based bytes key of every entry in `_names`
+        self._edits = None  # name → added?  while a listing is streaming in
+        self.rebuild(paths)
+
+    @classmethod
+    def _key(cls, name: str) -> bytes:
+        # the raw name breaks ties between e.g. "a01.png" and "A1.png"; the
+        # NUL sorts below any digit‑run length byte, so ties stay last
+        key = natkey(name) + b"\0" + name.encode("utf-8", "surrogatepass")
+        return key if cls.rank is None else cls.rank(name) + key
+
+    def rebuild(self, paths):
+        pairs = sorted((self._key(basename(p)), basename(p)) for p in paths)
+        self._keys = [k for k, _ in pairs]
+        self._names = [n for _, n in pairs]
+
+    def track_edits(self, on: bool = True):
+        """Remember add / discard calls so `install()` can re‑apply them."""
+        self._edits = {} if on else None
+
+    def install(self, pairs):
+        """
+        Swap in a sorted [(key, name), …] listing (see FolderScanner) and
+        re‑apply the edits made since `track_edits()`, which a listing taken
+        mid‑session may or may not already reflect.
+        """
+        self._keys = [k for k, _ in pairs]
+        self._names = [n for _, n in pairs]
+        edits, self._edits = self._edits, None
+        for name, added in (edits or {}).items():
+            self.add(name) if added else self.discard(name)
+        self._edits = edits
+
+    def __len__(self):
+        return len(self._names)
+
+    def __getitem__(self, i):
+        return self._names[i]
+
+    def names(self) -> list:
+        """A copy of the basenames, in order (safe to take from another thread)."""
+        return list(self._names)
+
+    def __contains__(self, name):
+        key = self._key(name)
+        i = bisect_left(self._keys, key)
+        return i < len(self._keys) and self._keys[i] == key
+
+    def position(self, name: str) -> int:
+        """Index of `name`, or where it would be inserted."""
+        return bisect_left(self._keys, self._key(name))
+
+    def add(self, name: str) -> int:
+        """Insert `name` at its sorted position (no‑op if present); returns it."""
+        if self._edits is not None:
+            self._edits[name] = True
+        key = self._key(name)
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return i
+        self._keys.insert(i, key)
+        self._names.insert(i, name)
+        return i
+
+    def discard(self, name: str):
+        """Remove `name` if present."""
+        if self._edits is not None:
+            self._edits[name] = False
+        key = self._key(name)
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+            del self._names[i]
+
+    def update(self, added=(), removed=()) -> int:
+        """
+        Apply a batch of listing changes – `added` as sorted [(key, name), …]
+        (see FolderWatcher), `removed` as names – and return how many names
+        actually went in or out.  A large batch rebuilds both lists by
+        slicing around the changed positions, one O(n + k) pass instead of
+        k inserts / deletes that each shift the whole tail.
+        """
+        if len(added) + len(removed) <= 16:
+            changed = 0
+            for name in removed:
+                changed += name in self
+                self.discard(name)
+            for _, name in added:
+                changed += name not in self
+                self.add(name)
+            return changed
+        if self._edits is not None:
+            self._edits.update((name, False) for name in removed)
+            self._edits.update((name, True) for _, name in added)
+        changed = 0
+        if removed:
+            drop = set()
+            for name in removed:
+                key = self._key(name)
+                i = bisect_left(self._keys, key)
+                if i < len(self._keys) and self._keys[i] == key:
+                    drop.add(i)
+            self._keys, self._names = self._splice(sorted(drop), ())
+            changed += len(drop)
+        if added:
+            cuts, fresh = [], []
+            for key, name in added:
+                i = bisect_left(self._keys, key)
+                if i == len(self._keys) or self._keys[i] != key:
+                    cuts.append(i)
+                    fresh.append((key, name))
+            self._keys, self._names = self._splice(cuts, fresh)
+            changed += len(cuts)
+        return changed
+
+    def _splice(self, cuts, fresh):
+        """New key / name lists: without the rows at `cuts`, or with `fresh` inserted there."""
+        keys, names, start = [], [], 0
+        for n, i in enumerate(cuts):
+            keys += self._keys[start:i]
+            names += self._names[start:i]
+            if fresh:
+                keys.append(fresh[n][0])
+                names.append(fresh[n][1])
+                start = i
+            else:
+                start = i + 1
+        keys += self._keys[start:]
+        names += self._names[start:]
+        return keys, names
+
+    def iter_after(self, name):
+        """
+        Yield the basenames sorted strictly after `name` (all of them when
+        `name` is None).  `name` itself need not be in the index.
+        """
+        i = 0 if name is None else bisect_right(self._keys, self._key(name))
+        return self.iter_from(i)
+
+    def iter_from(self, i: int):
+        """Yield the basenames from position `i` onwards."""
+        while i < len(self._names):
+            yield self._names[i]
+            i += 1
+
+
+class FolderScanner:
+    """
+    Streams the source folder listing in on a background thread.
+
+    `os.scandir` reports the entry type from the directory read itself, so
+    no file is stat'ed.  A sorted snapshot is published as soon as `first`
+    files are known and again each time the count doubles, so the first
+    images show up at once while the rest of a multi‑million‑file folder
+    is still being read; later entries slot in around them.  The final
+    count is remembered per source folder as the estimate for next time.
+    With `keep`, only the names it accepts are listed (and nothing is
+    remembered).
+    """
+
+    def __init__(self, folder: str, first: int = 2000, keep=None):
+        self.folder = folder
+        self.keep = keep
+        self.count = 0        # files seen so far
+        self.done = False
+        self._first = max(1, first)
+        self._ready = threading.Event()
+        self._snapshots = queue.Queue()
+        self._memo = join(state_dir(), "listing.json")
+        try:
+            with open(self._memo, encoding="utf-8") as fh:
+                self.estimate = int(json.load(fh)["count"])
+        except (OSError, ValueError, KeyError, TypeError):
+            self.estimate = 0
+        if keep is not None:  # only a share of the folder is listed
+            self.estimate = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def wait_first(self, timeout=None):
+        """Block until the first snapshot (or the whole listing) is ready."""
+        self._ready.wait(timeout)
+
+    def latest(self):
+        """Newest snapshot not yet taken, or None."""
+        snap = None
+        while True:
+            try:
+                snap = self._snapshots.get_nowait()
+            except queue.Empty:
+                return snap
+
+    @metrics.timed("listing_sort")
+    def _publish(self, pairs):
+        pairs.sort()  # mostly sorted already – the earlier prefix is kept
+        self._snapshots.put(list(pairs))
+        self._ready.set()
+
+    def _names(self):
+        """The folder's file names – or the members of its archive shards."""
+        if archives is not None:
+            yield from archives.names()
+            return
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                # hidden files were never listed (glob "*" skips them)
+                if not entry.name.startswith(".") and entry.is_file():
+                    yield entry.name
+
+    def _run(self):
+        t0 = time.perf_counter()
+        pairs, publish_at = [], self._first
+        try:
+            for name in self._names():
+                if self.keep is not None and not self.keep(name):
+                    continue
+                pairs.append((FolderIndex._key(name), name))
+                self.count = len(pairs)
+                if len(pairs) >= publish_at:
+                    self._publish(pairs)
+                    publish_at *= 2
+        except OSError as e:
+            print(f"[err] could not list {self.folder}: {e}")
+        self._publish(pairs)
+        self.done = True
+        metrics.observe("listing", time.perf_counter() - t0)
+        if self.keep is not None:
+            return
+        try:
+            with open(self._memo, "w", encoding="utf-8") as fh:
+                json.dump({"count": len(pairs)}, fh)
+        except OSError as e:
+            print(f"[warn] could not save listing size: {e}")
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# Live folder watch – files dropped in / taken out mid‑session ("watch")
+# ═════════════════════════════════════════════════════════════════════════════
+IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_DELETE = 0x8, 0x40, 0x80, 0x200
+IN_DELETE_SELF, IN_MOVE_SELF, IN_Q_OVERFLOW, IN_IGNORED = 0x400, 0x800, 0x4000, 0x8000
+IN_ISDIR = 0x40000000
+
+
+class FolderWatcher:
+    """
+    Reports the files that appear in / leave the source folder while the
+    app runs, so the list follows a capture pipeline without rescans.
+
+    On Linux an inotify watch (through ctypes – no extra package) sees a
+    file once it has been written and closed or renamed into the folder,
+    and its deletion or rename away.  Elsewhere, or with `poll`, the folder
+    is listed again every `interval` seconds when its mtime has changed and
+    diffed against the previous listing; a new file counts once its size
+    held still between two listings.  An inotify queue overflow switches
+    to polling too, after one listing that is diffed against the list
+    itself (`resync`).
+
+    Events are coalesced per name on the watcher thread, which also works
+    out the sort keys.  `drain()` hands over at most `batch` changes once
+    the folder has been quiet for `debounce` seconds, or when the oldest
+    pending change is `latency` seconds old, so a burst of 50k files is
+    merged in a few large steps rather than 50k small ones.
+    """
+
+    def __init__(self, folder: str, keep=None, listed=None, poll=False, interval=2.0,
+                 debounce=0.25, latency=1.0, batch=5000):
+        self.folder = folder
+        self.keep = keep          # name → listed here?  (shared‑folder buckets)
+        self.listed = listed      # callable: the names in the list now (resync)
+        self.interval = interval
+        self.debounce = debounce
+        self.latency = latency
+        self.batch = max(1, batch)
+        self.mode = "poll"        # or "inotify" once the watch is set up
+        self._lock = threading.Lock()
+        self._pending = {}        # name → key if it arrived, None if it left
+        self._first = self._last = 0.0
+        self._resync = False      # pending changes come from a diff with the list
+        self._stop = threading.Event()
+        fd = None if poll else self._inotify()
+        if fd is not None:
+            self.mode = "inotify"
+        threading.Thread(target=self._run, args=(fd,), name="watcher", daemon=True).start()
+
+    def _inotify(self):
+        """An inotify descriptor watching the folder, or None where there is none."""
+        if not sys.platform.startswith("linux"):
+            return None
+        import ctypes
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        mask = (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+                | IN_DELETE_SELF | IN_MOVE_SELF)
+        if libc.inotify_add_watch(fd, os.fsencode(self.folder), mask) < 0:
+            print(f"[warn] could not watch {self.folder}: "
+                  f"{os.strerror(ctypes.get_errno())} – polling instead")
+            os.close(fd)
+            return None
+        return fd
+
+    def stop(self):
+        self._stop.set()
+
+    def _note(self, name: str, arrived: bool):
+        if name.startswith(".") or self.keep is not None and not self.keep(name):
+            return  # hidden files were never listed
+        key = FolderIndex._key(name) if arrived else None
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending:
+                self._first = now
+            self._pending.pop(name, None)  # the latest change goes last
+            self._pending[name] = key
+            self._last = now
+
+    def drain(self):
+        """([(key, name), …] sorted, [name, …], resync?) once the changes settle."""
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending or (now - self._last < self.debounce
+                                     and now - self._first < self.latency):
+                return [], [], False
+            items = list(islice(self._pending.items(), self.batch))
+            for name, _ in items:
+                del self._pending[name]
+            resync = self._resync
+            if not self._pending:
+                self._resync = False
+        added = sorted((key, name) for name, key in items if key is not None)
+        return added, [name for name, key in items if key is None], resync
+
+    def _run(self, fd):
+        if fd is not None:
+            try:
+                self._read(fd)
+            finally:
+                os.close(fd)
+            if self._stop.is_set():
+                return
+            self.mode = "poll"
+        self._poll()
+
+    def _read(self, fd):
+        import select, struct
+        event = struct.Struct("iIII")  # wd, mask, cookie, name length
+        while not self._stop.is_set():
+            if not select.select([fd], [], [], 1.0)[0]:
+                continue
+            try:
+                data = os.read(fd, 1 << 20)
+            except BlockingIOError:
+                continue
+            off = 0
+            while off < len(data):
+                _, mask, _, n = event.unpack_from(data, off)
+                name = data[off + event.size:off + event.size + n].split(b"\0", 1)[0]
+                off += event.size + n
+                if mask & IN_Q_OVERFLOW:
+                    print("[warn] too many folder changes at once – polling from now on")
+                    with self._lock:
+                        self._resync = True
+                    return
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    print(f"[warn] {self.folder} went away – polling for it")
+                    return
+                if name and not mask & IN_ISDIR:
+                    self._note(os.fsdecode(name), bool(mask & (IN_CLOSE_WRITE | IN_MOVED_TO)))
+
+    def _list(self):
+        with os.scandir(self.folder) as it:
+            return {e.name for e in it if e.is_file()}
+
+    def _size(self, name: str):
+        try:
+            return os.stat(join(self.folder, name)).st_size
+        except OSError:
+            return None
+
+    def _poll(self):
+        known, fresh, stamp = None, {}, None  # fresh: new name → size last seen
+        settle = True
+        if self._resync and self.listed is not None:
+            known = set(self.listed())  # diff the first listing with the list itself
+            settle = False              # and take what it finds as it is
+        while True:
+            try:
+                mtime = os.stat(self.folder).st_mtime_ns
+                if known is None or mtime != stamp or fresh:
+                    stamp = mtime
+                    now = self._list()
+                    if known is None:
+                        known = now
+                    else:
+                        for name in known - now:
+                            self._note(name, False)
+                        sizes = {n: self._size(n) for n in now - known}
+                        settled = {n for n, size in sizes.items()
+                                   if not settle or size is not None and fresh.get(n) == size}
+                        for name in settled:
+                            self._note(name, True)
+                        known = (known & now) | settled
+                        fresh = {n: size for n, size in sizes.items() if n not in settled}
+                        settle = True
+            except OSError as e:
+                log(f"[warn] could not list {self.folder}: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# Archive shards – tar / zip members served as files ("source_archives")
+# ═════════════════════════════════════════════════════════════════════════════
+ARCHIVE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+
+class ArchiveSource:
+    """
+    Serves the members of the tar / zip shards in the source folder as if
+    they were files in it, so nothing is extracted.
+
+    Each shard is indexed once – member name, data offset, size and
+    compression – into <index_dir>/<shard>.idx, which stays valid while the
+    shard's size and mtime do.  Reads slice a read‑only mmap of the shard
+    (deflated zip members are inflated on the way).  A member is listed
+    under its basename, so its path is join(folder, name) like any file; a
+    basename already taken by an earlier shard gets "<shard stem>~" in
+    front.  Tars must be uncompressed – a .tar.gz has no fixed offsets.
+    """
+
+    def __init__(self, folder: str, index_dir: str, extensions=ARCHIVE_EXTENSIONS):
+        self.folder = os.path.abspath(folder)
+        self.index_dir = index_dir
+        self.extensions = tuple(e.lower() for e in extensions)
+        self._prefix = join(self.folder, "")
+        self._row = {}                # listed name → row in the columns below
+        self._shard = array("H")      # shard number
+        self._offset = array("Q")     # first data byte in the shard
+        self._size = array("Q")       # stored bytes
+        self._deflated = bytearray()  # 1 = zip deflate, 0 = stored
+        self._shards = []             # shard paths
+        self._maps = {}               # shard number → mmap
+        self._lock = threading.Lock()
+        os.makedirs(index_dir, exist_ok=True)
+
+    def shards(self):
+        with os.scandir(self.folder) as it:
+            return sorted(e.path for e in it if e.is_file() and not e.name.startswith(".")
+                          and e.name.lower().endswith((".tar", ".zip")))
+
+    def names(self):
+        """Yield every member's listed name, shard by shard, indexing shards on first use."""
+        for path in self.shards():
+            try:
+                members = self._load(path) or self._build(path)
+            except Exception as e:
+                print(f"[err] could not index {path}: {e}")
+                continue
+            shard = len(self._shards)
+            self._shards.append(path)
+            stem = os.path.splitext(basename(path))[0]
+            names = []
+            for name, offset, size, deflated in members:
+                base = ntpath.basename(name)  # members use "/", some zips "\\"
+                if base in self._row:
+                    base = f"{stem}~{base}"
+                self._row[base] = len(self._offset)
+                self._shard.append(shard)
+                self._offset.append(offset)
+                self._size.append(size)
+                self._deflated.append(deflated)
+                names.append(base)
+            yield from names
+
+    def _index_path(self, path: str) -> str:
+        tag = hashlib.blake2b(path.encode("utf-8", "surrogateescape"), digest_size=6).hexdigest()
+        return join(self.index_dir, f"{basename(path)}-{tag}.idx")
+
+    def _load(self, path: str):
+        """Members from the shard's index, or None when it is missing or stale."""
+        st = os.stat(path)
+        try:
+            with open(self._index_path(path), "rb") as fh:
+                head = json.loads(fh.readline())
+                if (head["size"], head["mtime_ns"]) != (st.st_size, st.st_mtime_ns):
+                    return None
+                n = head["count"]
+                names = fh.read(head["names"]).decode("utf-8", "surrogateescape").split("\0")
+                offsets, sizes = array("Q"), array("Q")
+                offsets.frombytes(fh.read(8 * n))
+                sizes.frombytes(fh.read(8 * n))
+                deflated = fh.read(n)
+        except (OSError, ValueError, KeyError):
+            return None
+        if len(deflated) != n or len(names) != n:
+            return None  # torn write
+        return list(zip(names, offsets, sizes, deflated)) if n else []
+
+    def _build(self, path: str):
+        """Read the shard's member table once and save it as its index."""
+        t0 = time.perf_counter()
+        members = []
+        if path.lower().endswith(".zip"):
+            import struct, zipfile
+
+            with zipfile.ZipFile(path) as zf:
+                for info in zf.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith(self.extensions):
+                        continue
+                    if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                        print(f"[warn] skipping {info.filename} in {path}: unsupported compression")
+                        continue
+                    zf.fp.seek(info.header_offset + 26)  # local header: name / extra lengths
+                    n, extra = struct.unpack("<HH", zf.fp.read(4))
+                    members.append((info.filename, info.header_offset + 30 + n + extra,
+                                    info.compress_size,
+                                    int(info.compress_type == zipfile.ZIP_DEFLATED)))
+        else:
+            import tarfile
+
+            with tarfile.open(path, "r:") as tf:  # raw bytes only – offsets must be real
+                for m in iter(tf.next, None):
+                    if m.isfile() and m.name.lower().endswith(self.extensions):
+                        members.append((m.name, m.offset_data, m.size, 0))
+                    tf.members.clear()  # a shard may hold millions of headers
+        self._save(path, members)
+        print(f"[info] indexed {len(members)} images in {basename(path)} "
+              f"in {time.perf_counter() - t0:.1f} s")
+        return members
+
+    def _save(self, path: str, members):
+        st = os.stat(path)
+        blob = "\0".join(m[0] for m in members).encode("utf-8", "surrogateescape")
+        head = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "count": len(members),
+                "names": len(blob)}
+        target = self._index_path(path)
+        try:
+            with open(target + ".tmp", "wb") as fh:
+                fh.write(json.dumps(head).encode() + b"\n")
+                fh.write(blob)
+                fh.write(array("Q", [m[1] for m in members]).tobytes())
+                fh.write(array("Q", [m[2] for m in members]).tobytes())
+                fh.write(bytes(m[3] for m in members))
+            os.replace(target + ".tmp", target)
+        except OSError as e:
+            print(f"[warn] could not save the index of {path}: {e}")
+
+    def has(self, path: str) -> bool:
+        return path.startswith(self._prefix) and path[len(self._prefix):] in self._row
+
+    def read(self, path: str) -> bytes:
+        """The bytes of the member listed as `path`."""
+        i = self._row[path[len(self._prefix):]]
+        shard = self._shard[i]
+        mm = self._maps.get(shard)
+        if mm is None:
+            import mmap
+
+            with self._lock:
+                mm = self._maps.get(shard)
+                if mm is None:
+                    with open(self._shards[shard], "rb") as fh:
+                        mm = self._maps[shard] = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        data = mm[self._offset[i]:self._offset[i] + self._size[i]]
+        return zlib.decompress(data, -15) if self._deflated[i] else data
+
+    def extract(self, path: str, dst: str):
+        """Write the member listed as `path` to the file `dst`."""
+        os.makedirs(dirname(dst), exist_ok=True)
+        with open(dst, "xb") as fh:  # never overwrite a labelled file
+            fh.write(self.read(path))
+
+    def close(self):
+        for mm in self._maps.values():
+            mm.close()
+        self._maps.clear()
+
+
+def make_archive_source():
+    """ArchiveSource for the source folder when "source_archives" is on, else None."""
+    if not settings.get("source_archives"):
+        return None
+    return ArchiveSource(sourceImageFolder, join(state_dir(), "archives"),
+                         settings.get("archive_extensions", ARCHIVE_EXTENSIONS))
+
+
+archives = None  # ArchiveSource when "source_archives" is on – see configure()
+
+
+def source_exists(path: str) -> bool:
+    """`exists()` that also sees archive members (see ArchiveSource)."""
+    return (archives is not None and archives.has(path)) or exists(path)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# Work claims – several labelers sharing one source folder
+# ═════════════════════════════════════════════════════════════════════════════
+class LeaseBoard:
+    """
+    Splits the source folder into buckets (crc32 of the basename, so a file
+    keeps its bucket wherever it is listed) that running instances claim
+    through lease files in a folder on the share.
+
+    A lease is <bucket>.lease, created with O_CREAT | O_EXCL so exactly one
+    instance wins it, holding its owner and expiry; the owner renews it
+    every `ttl` / 4 seconds.  The lease of a crashed instance is taken over
+    once it has expired – renamed aside first, which only one taker can do.
+    Buckets left with no unlabelled file get a <bucket>.done marker, and
+    every instance publishes progress/<worker>.json for `--progress`.  The
+    workstations' clocks must agree to well within `ttl`.
+    """
+
+    def __init__(self, folder, buckets: int = 256, ttl: float = 120.0, worker=None, low: int = 50):
+        self.folder = folder
+        self.ttl = ttl
+        self.low = max(1, low)  # claim more once fewer images than this are left
+        self.worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+        self.held = set()
+        self.order = {}  # bucket → claim number; later claims sort after earlier ones
+        self._arrivals = queue.Queue()
+        self._claiming = False
+        os.makedirs(join(folder, "progress"), exist_ok=True)
+        self.buckets = self._layout(buckets)
+
+    def _layout(self, buckets: int) -> int:
+        """The bucket count – fixed by whichever instance came first."""
+        path = join(self.folder, "layout.json")
+        try:
+            self._write(path, {"buckets": buckets}, exclusive=True)
+            return buckets
+        except FileExistsError:
+            for _ in range(50):  # may still be being written
+                layout = self._read(path)
+                if layout is not None:
+                    return int(layout["buckets"])
+                time.sleep(0.1)
+            raise
+
+    def bucket(self, name: str) -> int:
+        return zlib.crc32(name.encode("utf-8", "surrogateescape")) % self.buckets
+
+    def holds(self, name: str) -> bool:
+        return self.bucket(name) in self.held
+
+    def prefix(self, name: str) -> bytes:
+        """Sort prefix (`FolderIndex.rank`): a bucket's images follow the ones claimed before."""
+        return self.order.get(self.bucket(name), 2**32 - 1).to_bytes(4, "big")
+
+    def _lease(self, b: int) -> str:
+        return join(self.folder, f"{b}.lease")
+
+    def _write(self, path, data, exclusive=False):
+        if exclusive:
+            with os.fdopen(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY), "w") as fh:
+                json.dump(data, fh)
+            return
+        tmp = f"{path}.{self.worker}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(data, fh)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _stamp(self):
+        return {"worker": self.worker, "expires": time.time() + self.ttl}
+
+    def claim(self):
+        """Claim one more bucket; returns it, or None when all are taken or done."""
+        start = zlib.crc32(self.worker.encode()) % self.buckets  # spread the search
+        for i in range(self.buckets):
+            b = (start + i) % self.buckets
+            if b in self.held or exists(join(self.folder, f"{b}.done")):
+                continue
+            path = self._lease(b)
+            try:
+                self._write(path, self._stamp(), exclusive=True)
+            except FileExistsError:
+                if not self._take_over(path):
+                    continue
+            except OSError as e:
+                print(f"[warn] could not claim bucket {b}: {e}")
+                continue
+            self.order.setdefault(b, len(self.order))
+            self.held.add(b)
+            return b
+        return None
+
+    def _take_over(self, path) -> bool:
+        lease = self._read(path)
+        if lease is None or lease.get("expires", 0) > time.time():
+            return False  # alive, or being written right now
+        aside = f"{path}.{self.worker}.stale"
+        try:
+            os.rename(path, aside)  # only one instance can move a given file
+        except OSError:
+            return False
+        moved = self._read(aside)
+        try:
+            if moved is not None and moved.get("expires", 0) > time.time():
+                os.rename(aside, path)  # a fresh lease slipped in – hand it back
+                return False
+            os.remove(aside)
+            self._write(path, self._stamp(), exclusive=True)
+        except OSError:
+            return False
+        print(f"[info] took over bucket {basename(path)} from {lease.get('worker')}")
+        return True
+
+    def renew(self, labelled: int = 0):
+        """Extend every held lease and publish progress; returns buckets lost meanwhile."""
+        lost = set()
+        for b in list(self.held):
+            lease = self._read(self._lease(b))
+            if lease is not None and lease.get("worker") != self.worker:
+                lost.add(b)  # expired while we were stalled, and taken over
+                continue
+            try:
+                self._write(self._lease(b), self._stamp())
+            except OSError as e:
+                print(f"[warn] could not renew bucket {b}: {e}")
+        self.held -= lost
+        try:
+            self._write(join(self.folder, "progress", f"{self.worker}.json"),
+                        {"worker": self.worker, "labelled": labelled, "held": sorted(self.held),
+                         "ts": time.time()})
+        except OSError as e:
+            print(f"[warn] could not publish progress: {e}")
+        return lost
+
+    def top_up(self, source):
+        """Claim a bucket and list its files on a background thread – see `arrivals()`."""
+        if self._claiming:
+            return
+        self._claiming = True
+        threading.Thread(target=self._claim_and_list, args=(source,), daemon=True).start()
+
+    def _claim_and_list(self, source):
+        try:
+            self._arrivals.put(self.take(source))
+        finally:
+            self._claiming = False
+
+    def take(self, source):
+        """Claim a bucket and list its files: (bucket, names), or (None, [])."""
+        b, names = self.claim(), []
+        if b is not None:
+            with os.scandir(source) as it:
+                names = [e.name for e in it if not e.name.startswith(".")
+                         and self.bucket(e.name) == b and e.is_file()]
+        return b, names
+
+    def arrivals(self):
+        """[(bucket, names), …] claimed since the last call; bucket None = nothing left."""
+        out = []
+        while True:
+            try:
+                out.append(self._arrivals.get_nowait())
+            except queue.Empty:
+                return out
+
+    def close(self, source, labelled=()):
+        """Release every lease; held buckets with no unlabelled file left are done."""
+        left = set()
+        try:
+            with os.scandir(source) as it:
+                left = {self.bucket(e.name) for e in it
+                        if not e.name.startswith(".") and e.name not in labelled}
+        except OSError as e:
+            print(f"[warn] could not list {source}: {e}")
+        for b in self.held:
+            try:
+                if b not in left:
+                    open(join(self.folder, f"{b}.done"), "w").close()
+                os.remove(self._lease(b))
+            except OSError:
+                pass
+        self.held.clear()
+
+    def progress(self) -> str:
+        """Done / leased / free buckets and every worker's count, as text."""
+        names = os.listdir(self.folder)
+        done = sum(n.endswith(".done") for n in names)
+        now, leased = time.time(), 0
+        for n in names:
+            if n.endswith(".lease"):
+                lease = self._read(join(self.folder, n))
+                leased += lease is not None and lease.get("expires", 0) > now
+        lines = [f"{done}/{self.buckets} buckets done, {leased} leased, "
+                 f"{self.buckets - done - leased} free"]
+        for n in sorted(os.listdir(join(self.folder, "progress"))):
+            p = self._read(join(self.folder, "progress", n))
+            if p is not None:
+                ago = now - p.get("ts", 0)
+                lines.append(f"  {p['worker']:<28} {p.get('labelled', 0):>7} labelled, "
+                             f"{len(p.get('held', ())):>3} buckets, seen {ago:.0f} s ago")
+        return "\n".join(lines)
+
+
+def make_lease_board():
+    """LeaseBoard for the source folder when "shard" is on, else None."""
+    if not settings.get("shard"):
+        return None
+    return LeaseBoard(settings.get("lease_dir") or join(sourceImageFolder, ".leases"),
+                      int(settings.get("shard_buckets", 256)),
+                      float(settings.get("lease_ttl", 120)),
+                      settings.get("worker"),
+                      int(settings.get("shard_low", 50)))
+
+
+leases = None  # LeaseBoard when "shard" is on – see configure()
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# Pre‑flight validation
+# ═════════════════════════════════════════════════════════════════════════════
+IMAGE_MAGIC = (
+    (b"\x89PNG\r\n\x1a\n", "PNG"), (b"\xff\xd8\xff", "JPEG"), (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"), (b"BM", "BMP"), (b"II*\x00", "TIFF"), (b"MM\x00*", "TIFF"),
+)
+
+
+def sniff_format(head: bytes):
+    """Image format from the first bytes of a file, or None."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for magic, fmt in IMAGE_MAGIC:
+        if head.startswith(magic):
+            return fmt
+    return None
+
+
+def check_image(job, full: bool = True):
+    """
+    Validate one file – runs in a worker process.  `job` is (path, size,
+    mtime_ns); returns the catalog row (path, size, mtime_ns, ok, format,
+    width, height, error).  Header and trailer are always checked; with
+    Pillow the image is also opened and, when `full`, decoded completely.
+    """
+    path, size, mtime = job
+    try:
+        with open(path, "rb") as fh:
+            head = fh.read(16)
+            fh.seek(max(0, size - 64))
+            tail = fh.read()
+        fmt = sniff_format(head)
+        if fmt is None:
+            raise ValueError("not a recognised image format")
+        if (fmt == "PNG" and b"IEND" not in tail) or (fmt == "JPEG" and b"\xff\xd9" not in tail):
+            raise ValueError("truncated file")
+        try:
+            from PIL import Image as PILImage
+        except ImportError:  # header / trailer checks only
+            return path, size, mtime, 1, fmt, None, None, None
+        PILImage.MAX_IMAGE_PIXELS = None  # large scans are legitimate here
+        with PILImage.open(path) as im:
+            w, h = im.size
+            if full:
+                im.load()
+        return path, size, mtime, 1, fmt, w, h, None
+    except Exception as e:
+        return path, size, mtime, 0, None, None, None, f"{type(e).__name__}: {e}"
+
+
+class ImageCatalog:
+    """
+    Per‑file facts kept in SQLite under the state folder: validation results
+    (format, dimensions, ok / error), content hashes and model predictions.
+    Rows remember (size, mtime) so a later pass re‑checks only new or
+    changed files, and the UI can leave known bad files out of the folder
+    index.
+    """
+
+    COLUMNS = {  # what store() writes; a hash row's group is set by set_groups()
+        "files": "path, size, mtime_ns, ok, format, width, height, error",
+        "hashes": "path, size, mtime_ns, sha256, dhash",
+        "scores": "path, size, mtime_ns, model, key, prob, margin",
+    }
+
+    def __init__(self, path):
+        import sqlite3  # only when validating / a catalog exists
+
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, ok INTEGER,"
+            " format TEXT, width INTEGER, height INTEGER, error TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+            " sha256 TEXT, dhash TEXT, grp INTEGER)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, model TEXT,"
+            " key TEXT, prob REAL, margin REAL)"
+        )
+
+    @classmethod
+    def existing(cls):
+        """The catalog of this source folder, or None if never validated."""
+        path = join(state_dir(), "catalog.sqlite")
+        return cls(path) if exists(path) else None
+
+    def known(self, table: str = "files", **match) -> dict:
+        where = " AND ".join(f"{col} = ?" for col in match)
+        return {p: (s, m) for p, s, m in self._db.execute(
+            f"SELECT path, size, mtime_ns FROM {table}" + (f" WHERE {where}" if where else ""),
+            tuple(match.values()))}
+
+    def store(self, rows, table: str = "files"):
+        cols = self.COLUMNS[table]
+        marks = ", ".join("?" * len(cols.split(",")))
+        self._db.execute("BEGIN")
+        self._db.executemany(f"INSERT OR REPLACE INTO {table} ({cols}) VALUES ({marks})", rows)
+        self._db.execute("COMMIT")
+
+    def forget(self, paths):
+        self._db.execute("BEGIN")
+        for table in ("files", "hashes", "scores"):
+            self._db.executemany(f"DELETE FROM {table} WHERE path = ?", [(p,) for p in paths])
+        self._db.execute("COMMIT")
+
+    def bad(self, folder: str):
+        """(path, error) of every file in `folder` that failed validation."""
+        prefix = join(os.path.abspath(folder), "")
+        return list(self._db.execute(
+            "SELECT path, error FROM files WHERE ok = 0 AND substr(path, 1, ?) = ?",
+            (len(prefix), prefix)))
+
+    def hashes(self, folder: str, cols: str = "path, sha256, dhash"):
+        """`cols` of every hashed file in `folder`."""
+        prefix = join(os.path.abspath(folder), "")
+        return list(self._db.execute(
+            f"SELECT {cols} FROM hashes WHERE substr(path, 1, ?) = ?",
+            (len(prefix), prefix)))
+
+    def scores(self, folder: str, model: str) -> dict:
+        """basename → (key, prob, margin) of the files in `folder` scored by `model`."""
+        prefix = join(os.path.abspath(folder), "")
+        return {basename(p): (k, pr, m) for p, k, pr, m in self._db.execute(
+            "SELECT path, key, prob, margin FROM scores WHERE model = ? AND substr(path, 1, ?) = ?",
+            (model, len(prefix), prefix))}
+
+    def set_groups(self, folder: str, groups):
+        """Replace the duplicate groups of `folder` – one list of paths each."""
+        prefix = join(os.path.abspath(folder), "")
+        self._db.execute("BEGIN")
+        self._db.execute("UPDATE hashes SET grp = NULL WHERE substr(path, 1, ?) = ?",
+                         (len(prefix), prefix))
+        self._db.executemany("UPDATE hashes SET grp = ? WHERE path = ?",
+                             [(i, p) for i, paths in enumerate(groups) for p in paths])
+        self._db.execute("COMMIT")
+
+
+def changed_files(folders, known: dict):
+    """
+    (jobs, total): a (path, size, mtime_ns) job for every file in `folders`
+    whose size or mtime differs from `known`, and the number of files seen.
+    """
+    jobs, total = [], 0
+    for folder in folders:
+        for entry in os.scandir(folder):
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            total += 1
+            st = entry.stat()
+            path = os.path.abspath(entry.path)
+            if known.get(path) != (st.st_size, st.st_mtime_ns):
+                jobs.append((path, st.st_size, st.st_mtime_ns))
+    return jobs, total
+
+
+def validate(folders, quarantine=None, full: bool = True, batch: int = 500):
+    """
+    Pre‑flight pass over `folders` on a process pool (every core): checks
+    each new or changed file, records format and dimensions in the catalog
+    and, with `quarantine`, moves the bad ones there.  Interrupt it at will
+    – finished batches are committed and skipped by the next run.
+    """
+    catalog = ImageCatalog(join(state_dir(), "catalog.sqlite"))
+    jobs, total = changed_files(folders, catalog.known())
+    print(f"[info] validating {len(jobs)} of {total} files "
+          f"({total - len(jobs)} unchanged since the last pass)")
+
+    logging.getLogger("PIL").setLevel(logging.INFO)  # Kivy leaves the root at DEBUG
+    t0, rows, failed = time.perf_counter(), [], 0
+    check = functools.partial(check_image, full=full)
+    with ProcessPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        for done, row in enumerate(pool.map(check, jobs, chunksize=64), 1):
+            rows.append(row)
+            failed += not row[3]
+            if len(rows) >= batch:
+                catalog.store(rows)
+                rows.clear()
+                rate = done / (time.perf_counter() - t0)
+                print(f"[info] {done}/{len(jobs)} checked ({rate:.0f} files/s), {failed} bad")
+    catalog.store(rows)
+
+    bad = [b for folder in folders for b in catalog.bad(folder)]
+    for path, error in bad:
+        print(f"[warn] bad image {path}: {error}")
+    if quarantine and bad:
+        moved = []
+        for path, _ in bad:
+            dst = join(quarantine, basename(dirname(path)), basename(path))
+            try:
+                move_file(path, dst)
+                moved.append(path)
+            except OSError as e:
+                print(f"[err] could not quarantine {path}: {e}")
+        catalog.forget(moved)
+        print(f"[info] moved {len(moved)} bad files to {quarantine}")
+    print(f"[info] validation done in {time.perf_counter() - t0:.1f} s – "
+          f"{total - len(bad)} ok, {len(bad)} bad")
+    flush_log()
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# Duplicate groups
+# ═════════════════════════════════════════════════════════════════════════════
+def dhash(path: str, side: int = 8):
+    """64‑bit difference hash of the image at `path`, or None without Pillow."""
+    try:
+        from PIL import Image as PILImage
+    except ImportError:
+        return None
+    with PILImage.open(path) as im:
+        im.draft("L", (4 * side, 4 * side))  # JPEG: decode at a reduced scale
+        px = im.convert("L").resize((side + 1, side), PILImage.BILINEAR).tobytes()
+    bits = 0
+    for row in range(side):
+        line = px[row * (side + 1):(row + 1) * (side + 1)]
+        for left, right in zip(line, line[1:]):
+            bits = bits << 1 | (left > right)
+    return bits
+
+
+def hash_image(job):
+    """
+    Hash one file – runs in a worker process.  `job` is (path, size,
+    mtime_ns); returns the catalog row (path, size, mtime_ns, sha256, dhash)
+    with the dHash as 16 hex digits, or None for an undecodable image.
+    """
+    path, size, mtime = job
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                h.update(chunk)
+    except OSError:  # gone since the listing
+        return path, size, mtime, None, None
+    try:
+        d = dhash(path)
+    except Exception:  # not decodable – exact matches only
+        d = None
+    return path, size, mtime, h.hexdigest(), None if d is None else f"{d:016x}"
+
+
+class DuplicateGroups:
+    """
+    Exact (same SHA‑256) and near (dHash within `distance` bits) duplicates
+    among the files of one folder, as groups of basenames.
+
+    `from_hashes()` does the grouping at the end of a --dedup pass, which
+    stores the result in the catalog; the UI only `load()`s it.
+    """
+
+    def __init__(self, groups=()):
+        self._group = {}  # basename → its group, in natural order
+        for members in groups:
+            members = tuple(sorted(members, key=FolderIndex._key))
+            for name in members:
+                self._group[name] = members
+
+    @classmethod
+    def from_hashes(cls, rows, distance: int = 4):
+        """
+        Group (basename, sha256, dhash) rows.  Near matches are found by
+        cutting every dHash into distance + 1 bands: two hashes that differ
+        in at most `distance` bits agree on at least one band, so only hashes
+        sharing a band value are compared.  Matches chain, so a slow drift
+        across video frames ends up in one group.
+        """
+        parent = {}
+
+        def find(x):
+            while parent.setdefault(x, x) != x:
+                parent[x] = x = parent[parent[x]]
+            return x
+
+        def union(a, b):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[rb] = ra
+
+        by_sha, by_dhash = {}, {}
+        for name, sha, d in rows:
+            if sha is not None:
+                union(by_sha.setdefault(sha, name), name)
+            if d is not None and distance >= 0:
+                union(by_dhash.setdefault(d, name), name)
+
+        if distance > 0:  # near matches between distinct hashes
+            bands = distance + 1
+            width = -(-64 // bands)
+            mask = (1 << width) - 1
+            buckets = {}
+            for d in by_dhash:
+                for b in range(bands):
+                    buckets.setdefault((b, d >> (b * width) & mask), []).append(d)
+            for same in buckets.values():
+                for i, a in enumerate(same):
+                    for b in same[i + 1:]:
+                        if bin(a ^ b).count("1") <= distance:
+                            union(by_dhash[a], by_dhash[b])
+
+        groups = {}
+        for name in parent:
+            groups.setdefault(find(name), []).append(name)
+        return cls(m for m in groups.values() if len(m) > 1)
+
+    @classmethod
+    def load(cls, catalog, folder: str):
+        """Groups of `folder` stored by the last --dedup pass, or None."""
+        groups = {}
+        for path, grp in catalog.hashes(folder, "path, grp"):
+            if grp is not None:
+                groups.setdefault(grp, []).append(basename(path))
+        return cls(groups.values()) if groups else None
+
+    def __iter__(self):
+        return iter({id(g): g for g in self._group.values()}.values())
+
+    def members(self, name: str):
+        """Every basename in the group of `name` (empty when it has none)."""
+        return self._group.get(name, ())
+
+    def summary(self):
+        """(groups, files in a group) – labeling volume drops by the difference."""
+        return len(list(self)), len(self._group)
+
+
+def find_duplicates(folder: str, distance: int = 4, batch: int = 500):
+    """
+    Hash every new or changed file in `folder` on a process pool (every
+    core) into the catalog, then group and store the duplicates the
+    Categorizer will label with a single keypress.
+    """
+    catalog = ImageCatalog(join(state_dir(), "catalog.sqlite"))
+    jobs, total = changed_files([folder], catalog.known("hashes"))
+    print(f"[info] hashing {len(jobs)} of {total} files "
+          f"({total - len(jobs)} unchanged since the last pass)")
+
+    logging.getLogger("PIL").setLevel(logging.INFO)  # Kivy leaves the root at DEBUG
+    t0, rows = time.perf_counter(), []
+    with ProcessPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        for done, row in enumerate(pool.map(hash_image, jobs, chunksize=64), 1):
+            rows.append(row)
+            if len(rows) >= batch:
+                catalog.store(rows, "hashes")
+                rows.clear()
+                rate = done / (time.perf_counter() - t0)
+                print(f"[info] {done}/{len(jobs)} hashed ({rate:.0f} files/s)")
+    catalog.store(rows, "hashes")
+
+    t1 = time.perf_counter()
+    dups = DuplicateGroups.from_hashes(
+        [(basename(p), sha, None if d is None else int(d, 16))
+         for p, sha, d in catalog.hashes(folder)], distance)
+    base = os.path.abspath(folder)
+    catalog.set_groups(folder, [[join(base, n) for n in g] for g in dups])
+    print(f"[info] grouped in {time.perf_counter() - t1:.1f} s")
+    groups, grouped = dups.summary()
+    saved = grouped - groups
+    print(f"[info] hashing done in {time.perf_counter() - t0:.1f} s – {grouped} files "
+          f"in {groups} duplicate groups, {saved} fewer keypresses "
+          f"({100 * saved / max(1, total):.0f}% of {total})")
+    flush_log()
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# Model‑assisted pre‑labeling (optional: NumPy + Pillow, onnxruntime or scikit‑learn)
+# ═════════════════════════════════════════════════════════════════════════════
+SCORE_ORDERS = ("name", "uncertainty", "predicted")
+
+
+def image_features(path: str, side: int = 16):
+    """
+    The embedding a pickled scikit‑learn model is fed: the image shrunk to
+    side × side RGB (0‥1) followed by a 16‑bin histogram per channel, as
+    float32.  Train on the same function (`from main import image_features`).
+    """
+    import numpy as np
+    from PIL import Image as PILImage
+
+    with PILImage.open(path) as im:
+        im.draft("RGB", (4 * side, 4 * side))  # JPEG: decode at a reduced scale
+        im = im.convert("RGB")
+        small = np.asarray(im.resize((side, side), PILImage.BOX), np.float32) / 255
+        hist = np.asarray(im.histogram(), np.float32).reshape(3, 16, 16).sum(2)
+    return np.concatenate([small.ravel(), (hist / hist[0].sum()).ravel()])
+
+
+def model_stamp(path: str) -> str:
+    """Identifies one version of a model file – cached scores carry it."""
+    st = os.stat(path)
+    return f"{basename(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+class ScoreModel:
+    """
+    A user's CPU model that predicts the key of an image: an ONNX file (run
+    with onnxruntime on the image resized to `side` px square and
+    normalised by `mean` / `std`, NCHW or NHWC as the model declares) or a
+    pickled scikit‑learn pipeline over `image_features`.  Output column i is
+    the probability of `classes[i]`, a key_dict key; scikit‑learn models
+    bring their own `classes_`.
+    """
+
+    def __init__(self, path, classes=(), side=224, mean=(0.485, 0.456, 0.406),
+                 std=(0.229, 0.224, 0.225), threads=1):
+        import numpy as np
+
+        self.path = path
+        self.side = side
+        self.stamp = model_stamp(path)
+        self._mean = np.asarray(mean, np.float32)
+        self._std = np.asarray(std, np.float32)
+        self._model = self._session = None
+        if path.lower().endswith(".onnx"):
+            import onnxruntime as ort
+
+            opts = ort.SessionOptions()
+            opts.intra_op_num_threads = threads  # the pool already runs one per core
+            self._session = ort.InferenceSession(path, opts,
+                                                 providers=["CPUExecutionProvider"])
+            inp = self._session.get_inputs()[0]
+            self._input, self._nhwc = inp.name, inp.shape[-1] == 3
+        else:
+            import pickle
+
+            with open(path, "rb") as fh:
+                self._model = pickle.load(fh)
+            classes = classes or self._model.classes_
+        self.classes = [str(c) for c in classes]
+
+    def _pixels(self, path: str):
+        import numpy as np
+        from PIL import Image as PILImage
+
+        with PILImage.open(path) as im:
+            im.draft("RGB", (self.side, self.side))
+            im = im.convert("RGB").resize((self.side, self.side), PILImage.BILINEAR)
+        x = (np.asarray(im, np.float32) / 255 - self._mean) / self._std
+        return x if self._nhwc else x.transpose(2, 0, 1)
+
+    def predict(self, paths):
+        """(probabilities, paths): one row per decodable file of the batch."""
+        import numpy as np
+
+        embed = self._pixels if self._session is not None else image_features
+        rows, ok = [], []
+        for path in paths:
+            try:
+                rows.append(embed(path))
+                ok.append(path)
+            except Exception:  # gone or undecodable – left unscored
+                continue
+        if not rows:
+            return np.zeros((0, len(self.classes))), ok
+        x = np.stack(rows)
+        if self._session is not None:
+            out = np.asarray(self._session.run(None, {self._input: x})[0], np.float64)
+            if out.min() < 0 or not np.allclose(out.sum(1), 1, atol=1e-3):  # logits
+                out = np.exp(out - out.max(1, keepdims=True))
+                out /= out.sum(1, keepdims=True)
+        elif hasattr(self._model, "predict_proba"):
+            out = np.asarray(self._model.predict_proba(x), np.float64)
+        else:  # a plain classifier – all or nothing
+            out = np.asarray([[str(p) == c for c in self.classes]
+                              for p in self._model.predict(x)], np.float64)
+        return out, ok
+
+
+_score_model = None  # ScoreModel of a scoring worker process – see _init_scorer()
+
+
+def _init_scorer(config):
+    global _score_model
+    logging.getLogger("PIL").setLevel(logging.INFO)
+    _score_model = ScoreModel(**config)
+
+
+def score_batch(jobs):
+    """
+    Score a batch of files in a worker process.  `jobs` are (path, size,
+    mtime_ns); returns catalog rows (path, size, mtime_ns, model, key, prob,
+    margin) where `margin` is the lead of the likeliest class over the
+    runner‑up – small means the model is unsure.
+    """
+    model = _score_model
+    probs, ok = model.predict([path for path, _, _ in jobs])
+    by_path = {job[0]: job for job in jobs}
+    rows = []
+    for path, p in zip(ok, probs):
+        best = p.argsort()[::-1]
+        top = float(p[best[0]])
+        second = float(p[best[1]]) if len(best) > 1 else 0.0
+        rows.append(by_path[path] + (model.stamp, model.classes[best[0]], top, top - second))
+    return rows
+
+
+def model_config(threads: int = 1):
+    """ScoreModel arguments from the "model*" settings, or None when no model is set."""
+    path = settings.get("model")
+    if not path:
+        return None
+    return {"path": path, "classes": tuple(settings.get("model_classes", ())),
+            "side": int(settings.get("model_side", 224)),
+            "mean": tuple(settings.get("model_mean", (0.485, 0.456, 0.406))),
+            "std": tuple(settings.get("model_std", (0.229, 0.224, 0.225))),
+            "threads": threads}
+
+
+def score_ranks(predictions: dict, order: str) -> dict:
+    """
+    Sort prefix per basename (see `FolderIndex.rank`) from {name: (key,
+    prob, margin)}: "uncertainty" puts the closest calls first, "predicted"
+    groups by predicted key in key_dict order, surest first.
+    """
+    keys = {k: i for i, k in enumerate(key_dict)}
+    if order == "uncertainty":
+        return {n: round(margin * 1e9).to_bytes(8, "big")
+                for n, (_, _, margin) in predictions.items()}
+    return {n: keys.get(key, 0xFFFF).to_bytes(2, "big")
+            + round((1 - prob) * 1e9).to_bytes(6, "big")
+            for n, (key, prob, _) in predictions.items()}
+
+
+def score_folder(folder: str, batch: int = 64):
+    """
+    Run the configured model over every new or changed file in `folder` on
+    a process pool (every core) and cache the predictions in the catalog,
+    where the UI picks them up for the queue order and the default key.
+    """
+    config = model_config()
+    if config is None:
+        print("[err] set \"model\" in the config settings first")
+        return
+    catalog = ImageCatalog(join(state_dir(), "catalog.sqlite"))
+    stamp = model_stamp(config["path"])
+    jobs, total = changed_files([folder], catalog.known("scores", model=stamp))
+    print(f"[info] scoring {len(jobs)} of {total} files "
+          f"({total - len(jobs)} already scored by this model)")
+
+    t0, done, counts = time.perf_counter(), 0, {}
+    batches = [jobs[i:i + batch] for i in range(0, len(jobs), batch)]
+    with ProcessPoolExecutor(max_workers=os.cpu_count() or 4, initializer=_init_scorer,
+                             initargs=(config,)) as pool:
+        for rows in pool.map(score_batch, batches):
+            catalog.store(rows, "scores")
+            done += len(rows)
+            for row in rows:
+                counts[row[4]] = counts.get(row[4], 0) + 1
+            rate = done / (time.perf_counter() - t0)
+            print(f"[info] {done}/{len(jobs)} scored ({rate:.0f} files/s)")
+    unsure = sum(margin < 0.2 for _, _, margin in catalog.scores(folder, stamp).values())
+    print(f"[info] scoring done in {time.perf_counter() - t0:.1f} s – predicted "
+          + ", ".join(f"{k}: {n}" for k, n in sorted(counts.items()))
+          + f"; {unsure} close calls (margin < 0.2)")
+    flush_log()
+
+
+class ScoreRunner:
+    """
+    Keeps the model a little ahead of the labeler while the UI runs:
+    `feed()` hands batches of not yet scored names to a process pool and
+    `results()` collects the finished ones without waiting, caching them in
+    the catalog.  The pool is spawned, never forked from the UI process.
+    """
+
+    def __init__(self, config, catalog, workers: int = 1, batch: int = 16, ahead: int = 256):
+        import multiprocessing
+
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_scorer,
+                                         initargs=(config,),
+                                         mp_context=multiprocessing.get_context("spawn"))
+        self._catalog = catalog
+        self.stamp = model_stamp(config["path"])
+        self.batch = batch
+        self.ahead = ahead  # names after the current one kept scored
+        self._limit = 2 * workers  # batches in flight
+        self._futures = []
+        self._tried = set()  # names submitted this session
+
+    def feed(self, folder: str, names):
+        """Submit the untried names of `names` (queue order) while there is room."""
+        jobs = []
+        for name in names:
+            if len(self._futures) >= self._limit:
+                break
+            if name in self._tried:
+                continue
+            self._tried.add(name)
+            path = os.path.abspath(join(folder, name))
+            try:
+                st = os.stat(path)
+            except OSError:  # moved meanwhile
+                continue
+            jobs.append((path, st.st_size, st.st_mtime_ns))
+            if len(jobs) == self.batch:
+                self._futures.append(self._pool.submit(score_batch, jobs))
+                jobs = []
+        if jobs:
+            self._futures.append(self._pool.submit(score_batch, jobs))
+
+    def results(self):
+        """Catalog rows of the batches finished since the last call."""
+        rows = []
+        for fut in [f for f in self._futures if f.done()]:
+            self._futures.remove(fut)
+            try:
+                rows += fut.result()
+            except Exception as e:
+                print(f"[warn] scoring failed: {e}")
+        if rows:
+            self._catalog.store(rows, "scores")
+        return rows
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def make_score_runner():
+    """ScoreRunner for the "model" setting, or None when unset or a package is missing."""
+    config = model_config()
+    if config is None:
+        return None
+    try:
+        import numpy  # noqa: F401
+        import PIL  # noqa: F401
+        if config["path"].lower().endswith(".onnx"):
+            import onnxruntime  # noqa: F401
+    except ImportError as e:
+        print(f"[warn] \"model\" is set but {e.name} is not installed – predictions disabled")
+        return None
+    if not exists(config["path"]):
+        print(f"[warn] model {config['path']} not found – predictions disabled")
+        return None
+    return ScoreRunner(config, ImageCatalog(join(state_dir(), "catalog.sqlite")),
+                       int(settings.get("model_workers", max(1, (os.cpu_count() or 2) // 2))),
+                       ahead=int(settings.get("model_ahead", 256)))
+
+
+scorer = None  # ScoreRunner when "model" is set – see configure()
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# Background decode / prefetch
+# ═════════════════════════════════════════════════════════════════════════════
+@metrics.timed("decode")
+def decode_image(path: str):
+    """Decode `path` to CPU‑side image data – safe to call off the UI thread."""
+    path = move_engine.where(path)  # moved aside by a name clash
+    if archives is not None and archives.has(path):
+        ext = path.rsplit(".", 1)[-1].lower()
+        return CoreImage(BytesIO(archives.read(path)), ext=ext, filename=path,
+                         keep_data=True, nocache=True).image
+    if is_large(path):  # header read here, off the UI thread – shown tiled instead
+        return None
+    return ImageLoader.load(path, keep_data=True, nocache=True)
+
+
+class Prefetcher:
+    """
+    Look‑ahead window of images decoded on a small thread pool.
+
+    `schedule()` names the paths that should be ready (visible panes first,
+    then the next N); anything outside the window is cancelled or dropped.
+    `get()` hands back the decoded data, so showing an upcoming image is a
+    texture upload rather than a decode on the UI thread.
+    """
+
+    def __init__(self, window: int = 3, workers: int = 2):
+        self.window = max(0, window)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers),
+                                        thread_name_prefix="prefetch")
+        self._futures = {}                # path -> Future[image data]
+
+    def schedule(self, visible, ahead):
+        """Keep `visible` and the first `window` of `ahead`; cancel the rest."""
+        wanted = [p for p in visible if p]
+        wanted += [p for p in ahead if p][: self.window]
+        keep = set(wanted)
+        for path in [p for p in self._futures if p not in keep]:
+            self._futures.pop(path).cancel()
+        for path in wanted:
+            if path not in self._futures:
+                self._futures[path] = self._pool.submit(decode_image, path)
+
+    def cancel(self):
+        """Drop the whole window (user jumped, undid or redid)."""
+        for fut in self._futures.values():
+            fut.cancel()
+        self._futures.clear()
+
+    def get(self, path: str):
+        """Decoded data for `path`; waits if in flight, decodes inline if absent."""
+        fut = self._futures.get(path)
+        if fut is None or fut.cancelled():
+            fut = self._futures[path] = Future()
+            try:
+                fut.set_result(decode_image(path))
+            except Exception as e:
+                fut.set_exception(e)
+        return fut.result()
+
+    def ready(self, path: str):
+        """Decoded data for `path` once it has finished, else None – never waits."""
+        fut = self._futures.get(path)
+        if fut is None or not fut.done() or fut.cancelled() or fut.exception() is not None:
+            return None
+        return fut.result()
+
+    @property
+    def inflight(self) -> int:
+        return sum(not f.done() for f in list(self._futures.values()))
+
+    def shutdown(self):
+        self.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+prefetcher = None  # see configure()
+metrics.gauge("prefetch_inflight", lambda: prefetcher.inflight)
+
+
+class TextureCache:
+    """
+    Byte‑budgeted LRU of GPU textures, keyed by path and validated by mtime.
+
+    Shared by every pane, so an image that rotates Next → Current → Previous
+    (or comes back through undo / redo) is decoded and uploaded only once.
+    A path whose file has been moved away still hits until it is evicted;
+    `rename()` lets the cache follow a move.
+    """
 
-# Load configuration from JSON file
-# This function will open a file dialog to select the JSON file
-# and return the source image folder and key dictionary
-# The JSON file should contain the following structure:
-# {
-#     "sourceImageFolder": "path/to/source/folder",
-#     "key_dict": {
-#         "key1": "path/to/destination/folder1",
-#         "key2": "path/to/destination/folder2",
-#         ...
-#     }
-# }
+    def __init__(self, budget_bytes: int):
+        self.budget = budget_bytes
+        self.used = 0
+        self._entries = OrderedDict()  # path -> (mtime_ns, texture, nbytes)
+        self.hits = self.misses = self.evictions = 0
 
-# ─────────────────────────────────────────────────────────────────────────────
-# Load configuration (asks user for the JSON file at startup)
-# ─────────────────────────────────────────────────────────────────────────────
-def load_config():
-    root = Tk()
-    root.withdraw()
+    def get(self, path: str, mtime):
+        """Cached texture for `path`, or None (`mtime` None = file not on disk)."""
+        entry = self._entries.get(path)
+        if entry is not None and mtime is not None and entry[0] != mtime:
+            self._drop(path)  # file changed on disk
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(path)
+        self.hits += 1
+        return entry[1]
 
-    try:                                                    # set nice icon (optional)
-        if os.name == "nt":                                 # Windows
-            icon_path = "app.ico"
-            root.iconbitmap(icon_path)
-            root.tk.call("wm", "iconbitmap", root._w, "-default", icon_path)
-        elif sys.platform == "darwin":                      # macOS
-            from PIL import Image, ImageTk                  # noqa: import‑only‑when‑needed
-            icon = Image.open("icon.png")
-            root.iconphoto(True, ImageTk.PhotoImage(icon))
-    except Exception as e:
-        print(f"[warn] could not set dialog icon: {e}")
+    def put(self, path: str, mtime, texture):
+        if path in self._entries:
+            self._drop(path)
+        nbytes = texture.width * texture.height * 4
+        if nbytes > self.budget:
+            return
+        self._entries[path] = (mtime, texture, nbytes)
+        self.used += nbytes
+        while self.used > self.budget:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
 
-    cfg_path = filedialog.askopenfilename(
-        title="Select JSON file",
-        filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
-    )
+    def rename(self, src: str, dst: str):
+        """Re‑key the entry for `src` after the file was moved to `dst`."""
+        entry = self._entries.pop(src, None)
+        if entry is not None:
+            self._entries.pop(dst, None)
+            self._entries[dst] = entry
 
-    if not cfg_path:
-        print("No config file selected – exiting.")
-        sys.exit(1)
+    def _drop(self, path: str):
+        self.used -= self._entries.pop(path)[2]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return 100.0 * self.hits / total if total else 0.0
+
+    def stats(self) -> str:
+        rate = self.hit_rate
+        return (
+            f"hits={self.hits} misses={self.misses} evictions={self.evictions} "
+            f"hit‑rate={rate:.1f}% used={self.used / 2**20:.0f}/{self.budget / 2**20:.0f} MiB"
+        )
+
+
+texture_cache = None  # see configure()
+metrics.gauge("texture_cache_hit_rate", lambda: texture_cache.hit_rate)
+metrics.gauge("texture_cache_mb", lambda: texture_cache.used / 2**20)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# Downscaled preview pyramid (optional, needs Pillow)
+# ═════════════════════════════════════════════════════════════════════════════
+def file_digest(path: str) -> str:
+    """Content hash of `path` (BLAKE2b‑128, streamed)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class PreviewStore:
+    """
+    Optional on‑disk cache of downscaled renditions (a small preview pyramid).
+
+    Each source file is identified by a content hash and gets one rendition
+    per entry of `sides` (longest edge in px), stored as <hash>_<side>.<ext>.
+    The (basename, size, mtime) → hash memo is appended to `index.jsonl` in
+    the same folder, so finding a rendition costs one stat and no read.
+    Missing renditions are made lazily on a background thread, or in bulk
+    with `--build-previews`.  Needs Pillow.
+    """
+
+    INDEX = "index.jsonl"
+
+    def __init__(self, folder: str, sides=(1024, 384), workers: int = 1):
+        self.folder = folder
+        self.sides = sorted(int(s) for s in sides)
+        os.makedirs(folder, exist_ok=True)
+        self._memo = {}   # (basename, size, mtime_ns) -> (hash, w, h, ext)
+        self._last = {}   # path -> memo value, for files moved away since
+        self._files = set(os.listdir(folder))  # rendition names on disk
+        self._busy = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers),
+                                        thread_name_prefix="preview")
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(join(self.folder, self.INDEX), encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        r = json.loads(line)
+                        self._memo[(r["n"], r["s"], r["m"])] = (r["h"], r["w"], r["ht"], r["e"])
+                    except (ValueError, KeyError):
+                        continue  # torn last line after a crash
+        except FileNotFoundError:
+            pass
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memo[key] = value
+            with open(join(self.folder, self.INDEX), "a", encoding="utf-8") as fh:
+                fh.write(json.dumps({"n": key[0], "s": key[1], "m": key[2], "h": value[0],
+                                     "w": value[1], "ht": value[2], "e": value[3]}) + "\n")
+
+    def resolve(self, path: str, st, max_side: int) -> str:
+        """
+        File to decode for `path` shown in a pane `max_side` px across.
+
+        `st` is `os.stat(path)` (None if the file is gone).  Falls back to
+        `path` itself – and queues the rendition – when none is ready yet.
+        """
+        if st is None:
+            value = self._last.get(path)
+        else:
+            value = self._memo.get((basename(path), st.st_size, st.st_mtime_ns))
+        if value is None:
+            if st is not None:
+                self._submit(path)
+            return path
+        self._last[path] = value
+        digest, w, h, ext = value
+        side = next((s for s in self.sides if s >= max_side), None)
+        if side is None or max(w, h) <= side:
+            return path  # pane needs full resolution, or the source is small
+        name = f"{digest}_{side}.{ext}"
+        with self._lock:
+            ready = name in self._files
+        if ready:
+            return join(self.folder, name)
+        if st is not None:
+            self._submit(path)
+        return path
+
+    def _submit(self, path: str):
+        with self._lock:
+            if path in self._busy:
+                return
+            self._busy.add(path)
+        fut = self._pool.submit(self.build, path)
+        fut.add_done_callback(lambda _f, p=path: self._release(p))
+
+    def _release(self, path: str):
+        with self._lock:  # runs on the pool thread
+            self._busy.discard(path)
+
+    def build(self, path: str) -> bool:
+        """Hash `path` and write its missing renditions; False on failure."""
+        from PIL import Image as PILImage  # optional dependency
+
+        try:
+            st = os.stat(path)
+            key = (basename(path), st.st_size, st.st_mtime_ns)
+            value = self._memo.get(key)
+            digest = value[0] if value else file_digest(path)
+            with PILImage.open(path) as im:
+                w, h = im.size
+                if im.mode in ("RGB", "L", "CMYK", "YCbCr"):
+                    ext = "jpg"
+                    if im.mode != "L":
+                        im = im.convert("RGB")
+                else:
+                    ext = "png"
+                    if im.mode not in ("1", "LA", "P", "RGBA"):
+                        im = im.convert("RGBA")
+                if value is None:
+                    self._remember(key, (digest, w, h, ext))
+                # largest first: each thumbnail() shrinks the previous level
+                for side in reversed(self.sides):
+                    name = f"{digest}_{side}.{ext}"
+                    with self._lock:
+                        have = name in self._files
+                    if max(w, h) <= side or have:
+                        continue
+                    im.thumbnail((side, side))
+                    tmp = join(self.folder, name + ".tmp")
+                    im.save(tmp, format="JPEG" if ext == "jpg" else "PNG", quality=90)
+                    os.replace(tmp, join(self.folder, name))
+                    with self._lock:
+                        self._files.add(name)
+            return True
+        except Exception as e:
+            print(f"[warn] could not build preview for {path}: {e}")
+            return False
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
 
+
+def make_preview_store():
+    """PreviewStore from the "preview_dir" setting, or None when disabled."""
+    folder = settings.get("preview_dir")
+    if not folder:
+        return None
     try:
-        with open(cfg_path, "r") as fh:
-            cfg = json.load(fh)
-        return cfg["sourceImageFolder"], cfg["key_dict"]
-    except Exception as e:
-        print(f"[err] bad config file: {e}")
+        import PIL  # noqa: F401
+    except ImportError:
+        print("[warn] preview_dir is set but Pillow is not installed – previews disabled")
+        return None
+    return PreviewStore(folder, settings.get("preview_sides", (1024, 384)),
+                        int(settings.get("preview_workers", 1)))
+
+
+previews = None  # PreviewStore when "preview_dir" is set – see configure()
+
+
+def build_previews(folders):
+    """Bulk pre‑build renditions for every file in `folders` (all cores)."""
+    if previews is None:
+        print("[err] set \"preview_dir\" in the config and install Pillow first")
         sys.exit(1)
+    files = []
+    for folder in folders:
+        with os.scandir(folder) as entries:
+            files += [e.path for e in entries if e.is_file()]
+    print(f"[info] building previews for {len(files)} files → {previews.folder}")
+    failed = 0
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        # Pillow and hashlib release the GIL, so threads use every core
+        for done, ok in enumerate(pool.map(previews.build, files), 1):
+            failed += not ok
+            if done % 1000 == 0:
+                print(f"[info] {done}/{len(files)}")
+    print(f"[info] previews done – {len(files) - failed} ok, {failed} failed")
+
+
+def display_path(path: str, max_side: int = 0, probe: bool = True) -> str:
+    """
+    File actually decoded for `path` in a pane `max_side` px across, or ""
+    when that would be a large original – those are shown tiled.  With
+    `probe=False` (look‑ahead on the UI thread) an image whose header was
+    not read yet counts as small; the prefetch worker reads it instead.
+    """
+    if previews and max_side and path:
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        path = previews.resolve(path, st, max_side)
+    return "" if is_large(path, probe) else path
 
 
-# ─── configuration on disk ───────────────────────────────────────────────────
-sourceImageFolder, key_dict = load_config()
+def load_texture(path: str, max_side: int = 0):
+    """
+    GPU texture for `path` shown in a pane `max_side` px across (0 = full
+    size): texture cache first, then the prefetch window.
+    """
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        st = None
+    mtime = st.st_mtime_ns if st else None
+    if previews and max_side:
+        path = previews.resolve(path, st, max_side)
+    if is_large(path):
+        return None  # see TiledView
+    texture = texture_cache.get(path, mtime)
+    if texture is not None:
+        return texture
+    try:
+        data = prefetcher.get(path)
+        with metrics.span("upload"):
+            texture = CoreImage(data).texture
+    except Exception as e:
+        log(f"[warn] could not load {path}: {e}")
+        return None
+    texture_cache.put(path, mtime, texture)
+    return texture
 
 # ═════════════════════════════════════════════════════════════════════════════
-# Helpers
+# Tiled rendering of very large images (needs Pillow)
 # ═════════════════════════════════════════════════════════════════════════════
-def move_file(src, dst):
-    """Move with automatic destination‑directory creation."""
-    os.makedirs(os.path.dirname(dst), exist_ok=True)
-    print("move:", src, "→", dst)
-    shutil.move(src, dst)
+_headers = OrderedDict()  # path → (width, height, mode, size, mtime_ns), LRU first
+_headers_lock = threading.Lock()
+HEADERS_KEPT = 50_000
 
 
-def normal_key(name: str) -> str:
+def image_info(path: str, probe: bool = True):
     """
-    Convert keypad digits / Enter to plain equivalents using *symbolic* names
-    so ordinary letters never get remapped.
+    (width, height, mode, size, mtime_ns) of `path`, read from its header
+    without decoding, or None.  Remembered while the file's size and mtime
+    still match, and for a file moved away since, so it still resolves to
+    its tiles.  `probe=False` never touches the disk: only what is
+    remembered.
     """
-    lname = name.lower()
-    # keypad digits come as 'numpad7', 'kp3', …
-    if lname.startswith(("numpad", "kp")) and lname[-1].isdigit():
-        return lname[-1]
-    # translate keypad Enter
-    if lname in ("numpadenter", "kpenter"):
-        return "enter"
-    return lname
-        
+    if archives is not None and archives.has(path):
+        return None  # archive members are never tiled
+    with _headers_lock:
+        info = _headers.get(path)
+        if info is not None:
+            _headers.move_to_end(path)
+    if not probe:
+        return info
+    try:
+        st = os.stat(path)
+    except OSError:
+        return info  # gone – moved into a class folder, most likely
+    if info is not None and info[3:] == (st.st_size, st.st_mtime_ns):
+        return info
+    try:
+        from PIL import Image as PILImage
+        with PILImage.open(path) as im:
+            info = (*im.size, im.mode, st.st_size, st.st_mtime_ns)
+    except Exception:  # no Pillow, not an image
+        return None
+    with _headers_lock:
+        _headers[path] = info
+        if len(_headers) > HEADERS_KEPT:
+            _headers.popitem(last=False)
+    return info
+
+
+def is_large(path: str, probe: bool = True) -> bool:
+    """True if `path` is too large for one texture and is shown tiled instead."""
+    info = image_info(path, probe) if path else None
+    return (info is not None and max(info[:2]) > int(settings.get("tile_above", 8192))
+            and path not in TilePyramid.failed)
+
+
+class TilePyramid:
+    """
+    On‑disk tile pyramid of one large image.
+
+    Level 0 is full resolution and every next level halves it, down to one
+    that fits in a single tile.  Tiles live in <tile_dir>/<key>/<level>/
+    as <col>_<row>.<ext>; the key comes from (basename, size, mtime), so
+    the pyramid follows a file into its class folder.  The first view
+    queues a build on a background thread: one decode, then the coarsest
+    level is written first so an overview shows up early.  A file whose
+    build fails is shown as a plain image from then on.
+    """
+
+    _queue = None     # pyramids waiting for the builder thread
+    _queued = set()   # their folders
+    failed = set()    # paths whose build raised (corrupt, truncated, disk full)
+
+    def __init__(self, path: str, tile: int = 512):
+        w, h, mode, size, mtime = image_info(path)
+        key = hashlib.blake2b(f"{basename(path)}|{size}|{mtime}".encode(),
+                              digest_size=12).hexdigest()
+        self.path, self.tile = path, tile
+        self.folder = join(settings.get("tile_dir") or join(state_dir(), "tiles"), key)
+        self.ext = "jpg" if mode in ("RGB", "L", "CMYK", "YCbCr") else "png"
+        self.levels = [(w, h)]
+        while max(self.levels[-1]) > tile:
+            w, h = self.levels[-1]
+            self.levels.append(((w + 1) // 2, (h + 1) // 2))
+
+    def tile_path(self, level: int, col: int, row: int) -> str:
+        return join(self.folder, str(level), f"{col}_{row}.{self.ext}")
+
+    def grid(self, level: int):
+        """(columns, rows) of tiles at `level`."""
+        w, h = self.levels[level]
+        return -(-w // self.tile), -(-h // self.tile)
+
+    def ensure(self):
+        """Queue a build unless the pyramid is complete, already queued or failed."""
+        if (self.folder in self._queued or self.path in self.failed
+                or exists(join(self.folder, "done"))):
+            return
+        if TilePyramid._queue is None:
+            TilePyramid._queue = queue.Queue()
+            threading.Thread(target=self._builder, name="tiles", daemon=True).start()
+        self._queued.add(self.folder)
+        self._queue.put(self)
+
+    @classmethod
+    def _builder(cls):
+        while True:
+            pyramid = cls._queue.get()
+            try:
+                pyramid.build()
+            finally:
+                cls._queued.discard(pyramid.folder)
+
+    def pending(self) -> bool:
+        """True while tiles may still appear: the build is queued / running or done."""
+        return self.folder in self._queued or exists(join(self.folder, "done"))
+
+    def build(self):
+        """Decode the image once and write every missing tile, coarse to fine."""
+        from PIL import Image as PILImage
+
+        PILImage.MAX_IMAGE_PIXELS = None  # large is the point here
+        try:
+            with metrics.span("tile_build"), PILImage.open(self.path) as im:
+                mode = ("L" if im.mode == "L" else "RGB") if self.ext == "jpg" else "RGBA"
+                levels = [im.convert(mode) if im.mode != mode else im]
+                for size in self.levels[1:]:
+                    levels.append(levels[-1].resize(size, PILImage.BOX))
+                for level in reversed(range(len(levels))):
+                    os.makedirs(join(self.folder, str(level)), exist_ok=True)
+                    cols, rows = self.grid(level)
+                    w, h = self.levels[level]
+                    for row in range(rows):
+                        for col in range(cols):
+                            dst = self.tile_path(level, col, row)
+                            if exists(dst):  # left by an interrupted build
+                                continue
+                            x, y = col * self.tile, row * self.tile
+                            part = levels[level].crop(
+                                (x, y, min(x + self.tile, w), min(y + self.tile, h)))
+                            part.save(dst + ".tmp", format="JPEG" if self.ext == "jpg" else "PNG",
+                                      quality=90)
+                            os.replace(dst + ".tmp", dst)
+            with open(join(self.folder, "done"), "w", encoding="utf-8") as fh:
+                fh.write(self.path)
+        except Exception as e:
+            print(f"[warn] could not build tiles for {self.path}: {e}")
+            self.failed.add(self.path)
+
+
+tile_cache = None  # TextureCache of uploaded tiles – see configure()
+metrics.gauge("tile_cache_mb", lambda: tile_cache.used / 2**20)
+
+
 # ═════════════════════════════════════════════════════════════════════════════
 # GUI widgets
 # ═════════════════════════════════════════════════════════════════════════════
 class Picture(Scatter):
     source = StringProperty(None)  # bound in kv file
+    preview_side = NumericProperty(0)  # pane size → preview rendition
+
+    def on_source(self, _, src):
+        # the texture is assigned directly so decoding can happen ahead of time
+        image = self.ids.get("image")
+        if image is not None:
+            tiled = bool(src) and not display_path(src, self.preview_side)
+            self.ids.tiles.source = src if tiled else ""
+            image.opacity = 0 if tiled else 1
+            image.texture = None if tiled else load_texture(src, self.preview_side)
 
     def on_size(self, *_):
         pass  # placeholder kept to preserve original variable name
 
 
+class TiledView(StencilView):
+    """
+    Shows one large image from its TilePyramid.
+
+    Only the tiles visible at the current zoom and pan are decoded (on a
+    small pool of the view's own) and uploaded (into `tile_cache`); the
+    coarsest level is always drawn underneath, so nothing shows holes
+    while finer tiles arrive.  Wheel zooms around the pointer, drag pans,
+    double‑click fits the image again.  If the pyramid cannot be built it
+    fires `on_failed`, for the Picture to show the image untiled.
+    """
+    source = StringProperty("")
+
+    def __init__(self, **kwargs):
+        self.register_event_type("on_failed")
+        super().__init__(**kwargs)
+        self.pyramid = None
+        self.scale = 1.0          # screen px per image px
+        self.cx = self.cy = 0.0   # image point at the centre of the view
+        self._loader = Prefetcher(window=0, workers=int(settings.get("tile_workers", 2)))
+        self._retry = Clock.create_trigger(self.redraw, 0.05)
+        self.bind(pos=self.redraw, size=self.fit)
+
+    def on_source(self, _, src):
+        self._loader.cancel()
+        self.pyramid = TilePyramid(src) if is_large(src) else None
+        if self.pyramid is not None:
+            self.pyramid.ensure()
+        self.fit()
+
+    def fit(self, *_):
+        if self.pyramid is not None:
+            w, h = self.pyramid.levels[0]
+            self.scale = min(self.width / w, self.height / h) or 1.0
+            self.cx, self.cy = w / 2, h / 2
+        self.redraw()
+
+    def zoom_at(self, pos, factor: float):
+        """Zoom by `factor`, keeping the image point under `pos` in place."""
+        dx, dy = pos[0] - self.center_x, pos[1] - self.center_y
+        ix, iy = self.cx + dx / self.scale, self.cy - dy / self.scale
+        w, h = self.pyramid.levels[0]
+        fit = min(self.width / w, self.height / h)
+        self.scale = min(max(self.scale * factor, fit / 2), 4.0)
+        self.cx, self.cy = ix - dx / self.scale, iy + dy / self.scale
+        self.redraw()
+
+    @metrics.timed("tiles_draw")
+    def redraw(self, *_):
+        self.canvas.clear()
+        p = self.pyramid
+        if p is None:
+            return
+        top, level = len(p.levels) - 1, 0
+        while level < top and 2 ** (level + 1) * self.scale <= 1:
+            level += 1  # coarsest level that still has a texel per screen px
+        half_w, half_h = self.width / 2 / self.scale, self.height / 2 / self.scale
+        wanted, missing = [], False
+        with self.canvas:
+            Color(1, 1, 1, 1)
+            for lv in sorted({top, level}, reverse=True):
+                f = 2 ** lv  # image px per texel at this level
+                span = p.tile * f
+                cols, rows = p.grid(lv)
+                for row in range(max(0, int((self.cy - half_h) // span)),
+                                 min(rows, int((self.cy + half_h) // span) + 1)):
+                    for col in range(max(0, int((self.cx - half_w) // span)),
+                                     min(cols, int((self.cx + half_w) // span) + 1)):
+                        tex = self._texture(p.tile_path(lv, col, row), wanted)
+                        if tex is None:
+                            missing = True
+                            continue
+                        w, h = tex.width * f * self.scale, tex.height * f * self.scale
+                        x = self.center_x + (col * span - self.cx) * self.scale
+                        y = self.center_y - (row * span - self.cy) * self.scale - h
+                        Rectangle(texture=tex, pos=(x, y), size=(w, h))
+        self._loader.schedule([t for t in wanted if exists(t)], [])
+        if missing and p.pending():
+            self._retry()
+        elif missing and p.path in p.failed:
+            self.dispatch("on_failed")
+
+    def on_failed(self):
+        pass
+
+    def _texture(self, path: str, wanted: list):
+        texture = tile_cache.get(path, None)
+        if texture is None:
+            data = self._loader.ready(path)
+            if data is None:
+                wanted.append(path)
+                return None
+            with metrics.span("upload"):
+                texture = CoreImage(data).texture
+            tile_cache.put(path, None, texture)
+        return texture
+
+    def on_touch_down(self, touch):
+        if self.pyramid is None or not self.collide_point(*touch.pos):
+            return super().on_touch_down(touch)
+        if touch.is_mouse_scrolling:
+            self.zoom_at(touch.pos, 1.25 if touch.button == "scrolldown" else 0.8)
+        elif touch.is_double_tap:
+            self.fit()
+        else:
+            touch.grab(self)
+        return True
+
+    def on_touch_move(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_move(touch)
+        self.cx -= touch.dx / self.scale
+        self.cy += touch.dy / self.scale
+        self.redraw()
+        return True
+
+    def on_touch_up(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_up(touch)
+        touch.ungrab(self)
+        return True
+
+
+class Thumb(Widget):
+    """One cell of grid mode: a thumbnail with cursor / selection marks."""
+    source = StringProperty("")
+    preview_side = NumericProperty(256)  # cell size → preview rendition
+    selected = BooleanProperty(False)
+    cursor = BooleanProperty(False)
+
+    def on_source(self, _, src):
+        self.ids.image.texture = load_texture(src, self.preview_side)
+
+
 class PicturesFrame(Widget):
     imageList = ListProperty()  # kept for potential kv binding
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        from kivy.core.window import Window  # opened only when the UI starts
 
         # keyboard
         self._keyboard = Window.request_keyboard(self._keyboard_closed, self)
         self._keyboard.bind(on_key_down=self._on_keyboard_down)
 
-        # build sorted image list once
-        self.image_list = self._lex_files()
+        # sorted image list (basenames, patched in place later); the listing
+        # streams in – start on the first batch, merge the rest as it lands
+        self.image_list = FolderIndex()
+        self.image_list.track_edits()
+        ranks, keep = [], None  # FolderIndex.rank parts, most significant first
+        if leases is not None:  # shared folder: list only the buckets claimed here
+            for _ in range(int(settings.get("shard_claim", 2))):
+                leases.claim()
+            keep = leases.holds
+            ranks.append(leases.prefix)
+            print(f"[info] {leases.worker} claimed buckets {sorted(leases.held)} "
+                  f"of {leases.buckets}")
+        # model predictions (--score, or scored ahead while labelling): the
+        # predicted key is the default, and cached ones can order the queue
+        self.predictions = {}  # basename → (key, prob, margin)
+        self.confirm_key = str(settings.get("confirm_key", "spacebar")).lower()
+        catalog = ImageCatalog.existing()
+        if scorer is not None and catalog is not None:
+            self.predictions = catalog.scores(sourceImageFolder, scorer.stamp)
+            order = settings.get("model_order", "name")
+            if order not in SCORE_ORDERS:
+                print(f"[warn] unknown model_order {order!r} – "
+                      f"use one of {', '.join(SCORE_ORDERS)}")
+            elif order != "name" and self.predictions:
+                by_model = score_ranks(self.predictions, order)
+                ranks.append(lambda name: by_model.get(name, b"\xff" * 8))  # unscored last
+        if ranks:
+            FolderIndex.rank = lambda name: b"".join(rank(name) for rank in ranks)
+        # files dropped in / taken out while the app runs – watched from before
+        # the listing starts, so nothing slips in between the two
+        self.watcher = None
+        if settings.get("watch", True) and archives is None:
+            self.watcher = FolderWatcher(sourceImageFolder, keep, self.image_list.names,
+                                         poll=settings.get("watch") == "poll",
+                                         interval=float(settings.get("watch_interval", 2)),
+                                         batch=int(settings.get("watch_batch", 5000)))
+        self.scanner = FolderScanner(sourceImageFolder, int(settings.get("listing_first", 2000)),
+                                     keep)
+        self.scanner.wait_first()
+        self.image_list.install(self.scanner.latest())
+        if manifest is not None:  # already labelled in an earlier session
+            for src in manifest.labelled():
+                self.image_list.discard(basename(src))
+        if catalog is not None:  # failed the last --validate pass
+            for path, _ in catalog.bad(sourceImageFolder):
+                self.image_list.discard(basename(path))
+        while leases is not None and not self.image_list:  # claimed buckets are finished
+            bucket, names = leases.take(sourceImageFolder)
+            if bucket is None:
+                break
+            skip = self._unlisted()
+            for name in names:
+                if name not in skip:
+                    self.image_list.add(name)
+
+        # duplicate groups from the last --dedup pass: one keypress labels all
+        self.duplicates = None
+        if catalog is not None and settings.get("dedup", True):
+            self.duplicates = DuplicateGroups.load(catalog, sourceImageFolder)
 
         if not self.image_list:
-            print("[err] no images found in sourceImageFolder")
+            print("[err] no images found in sourceImageFolder"
+                  + (" – every bucket is claimed or done" if leases is not None else ""))
             sys.exit(1)
 
         # pointers / counters
@@ -154,37 +3189,224 @@ class PicturesFrame(Widget):
         self.total_images = len(self.image_list)
         self.processed_images = 1         # 1‑based UX counter
 
-        # undo / redo stacks
-        self.history = deque(maxlen=50)
-        self.redo_stack = deque(maxlen=50)
+        # undo / redo – unbounded and compact, rebuilt from the journal on restart
+        self.history = MoveHistory()
+        self._unapplied = set()  # (src, dst) queued from history that failed on disk
+        self._moot = set()       # moves back whose forward move had already failed
+        self.failed_moves = 0
+        self._resume()
 
         # thumbnail dimensions
         self.left_image_size = [900, 900]
         self.right_image_size = [350, 350]
 
+        # grid mode: a page of K×K thumbnails from self.idx, labelled in batches
+        self.grid_key = str(settings.get("grid_key", "tab")).lower()
+        self.grid_mode = False
+        self.page = []         # basenames shown in the grid
+        self.cursor = 0        # cell under the cursor
+        self.selected = set()  # basenames picked on this page
+        k = max(1, int(settings.get("grid_size", 4)))
+        self.thumb_grid.cols = k
+        for _ in range(k * k):
+            self.thumb_grid.add_widget(Thumb())
+        self.thumb_grid.opacity = 0
+
         # first draw
         self._update_views()
-        self.update_counter_display()    
-        
-        
-    def _lex_files(self):
-        """Natural‑sort the files (…1, …2, …10) – case‑insensitive."""
-        files = [p for p in glob(join(sourceImageFolder, "*")) if os.path.isfile(p)]
-
-        def natkey(path):
-            name = os.path.basename(path)
-            # split into digit and non‑digit chunks, turn digits into ints
-            return [int(t) if t.isdigit() else t.lower() for t in re.split(r"(\d+)", name)]
-
-        files.sort(key=natkey)
-        return files
-        
+        self.update_counter_display()
+
+        # pending‑move count follows the background mover
+        self._shown_pending = 0
+        Clock.schedule_interval(self._poll_pending, 0.25)
+        Clock.schedule_interval(self._poll_listing, 0.1)
+        if self.watcher is not None:
+            Clock.schedule_interval(self._poll_watch, 0.25)
+        if leases is not None:
+            self._renewed = self._claim_after = time.monotonic()
+            Clock.schedule_interval(self._poll_leases, 1.0)
+        if scorer is not None:
+            Clock.schedule_interval(self._poll_scores, 0.5)
+
+        # performance overlay (hidden until its hotkey is pressed)
+        self.overlay_key = str(settings.get("overlay_key", "f12")).lower()
+        self.overlay_label.opacity = 0
+
+    def _resume(self):
+        """Replay the journal: undo / redo stacks, position, unfinished moves."""
+        records = Journal.read(journal.path)
+        if not records:
+            return
+        done, undone, cur = [], [], None  # move records in effect / undone
+        landed = {}  # destination -> the free name a collision moved it to
+        for rec in records:
+            if rec["op"] == "landed":
+                landed[rec["dst"]] = rec
+            elif rec["op"] in ("move", "group"):
+                done.append(rec)
+                undone.clear()
+            elif rec["op"] == "undo" and done:
+                undone.append(done.pop())
+            elif rec["op"] == "redo" and undone:
+                done.append(undone.pop())
+            cur = rec.get("cur", cur)
+
+        # reconcile moves that were queued but never landed before the crash
+        # (in manifest mode the manifest itself is the record of truth)
+        history = [self._action(r) for r in done]
+        redo = [self._action(r) for r in undone]
+        landed = [landed[d] for _, d in chain.from_iterable(history + redo) if d in landed]
+        for rec in landed:  # undoing these must find the renamed file
+            move_engine.alias(rec["dst"], rec["path"])
+        for src, dst in chain.from_iterable(history) if manifest is None else ():
+            if exists(src) and not exists(move_engine.where(dst)):
+                move_queue.submit(src, dst)
+                self.image_list.discard(basename(src))
+        for src, dst in chain.from_iterable(redo) if manifest is None else ():
+            if exists(move_engine.where(dst)) and not exists(src):
+                move_queue.submit(dst, src)
+                self.image_list.add(basename(src))
+
+        for moves in history + redo[::-1]:  # the last undone is redone first
+            self.history.push(moves)
+        self.history.top = len(history)
+        if cur:
+            listed = leases is None or leases.holds(cur)
+            if listed and source_exists(join(sourceImageFolder, cur)):
+                self.image_list.add(cur)  # may not be in the first batch yet
+            self.idx = min(self.image_list.position(cur), len(self.image_list) - 1)
+        self.total_images = len(self.image_list)
+        self.processed_images = self.idx + 1
+        print(f"[info] resumed at {self.processed_images}/{self.total_images} "
+              f"with {self.history.top} undoable moves")
+
+        # drop undo / redo / skip noise once it dominates the file
+        live = done + undone[::-1]
+        if len(records) - len(live) > int(settings.get("journal_compact_at", 10000)):
+            journal.compact(live + landed + [{"op": "undo", "ts": time.time()}] * len(undone)
+                            + [{"op": "nav", "ts": time.time(), "cur": cur, "idx": self.idx}])
+
+    @staticmethod
+    def _action(rec):
+        """[(src, dst), …] of a journal "move" / "group" record."""
+        if rec["op"] == "group":
+            return [tuple(m) for m in rec["moves"]]
+        return [(rec["src"], rec["dst"])]
+
+    def _journal(self, op: str, **fields):
+        if self.grid_mode:
+            cur = self.page[0] if self.page else None
+        else:
+            cur = basename(self.picture_1.source) if self.picture_1.source else None
+        journal.append(op, cur=cur, idx=self.idx, **fields)
+
+    def _poll_listing(self, _dt):
+        """Merge the newest listing snapshot, keeping the current image in place."""
+        done = self.scanner.done  # read first: the final snapshot precedes it
+        snap = self.scanner.latest()
+        if snap is not None:
+            cur = self.image_list[self.idx] if self.idx < len(self.image_list) else None
+            self.image_list.install(snap)
+            if cur is not None:
+                self.idx = self.image_list.position(cur)
+            self.total_images = len(self.image_list)
+            self.processed_images = self.idx + 1
+            if self.picture_1.source:  # not past the end
+                self._update_views()
+            self.update_counter_display()
+        if done:
+            self.image_list.track_edits(False)
+            self.update_counter_display()
+            return False
+
+    def _poll_leases(self, _dt):
+        """Renew the claimed buckets, merge newly claimed ones, claim more when low."""
+        now = time.monotonic()
+        cur = self.image_list[self.idx] if self.idx < len(self.image_list) else None
+        changed = False
+        if now - self._renewed >= leases.ttl / 4:
+            self._renewed = now
+            lost = leases.renew(self.history.top)
+            if lost:  # stalled past the ttl and taken over – leave those to the new owner
+                log(f"[warn] buckets {sorted(lost)} were taken over by another instance")
+                ahead = list(self.image_list.iter_from(self.idx + 1))
+                for name in [n for n in ahead if leases.bucket(n) in lost]:
+                    self.image_list.discard(name)
+                changed = True
+        for bucket, names in leases.arrivals():
+            if bucket is None:  # all taken – look again once leases may have expired
+                self._claim_after = now + leases.ttl
+                continue
+            log(f"[info] claimed bucket {bucket}: {len(names)} images")
+            skip = self._unlisted()
+            for name in names:
+                if name not in skip:
+                    self.image_list.add(name)
+            changed = True
+        if changed:
+            self._relisted(cur)
+        if len(self.image_list) - self.idx - 1 < leases.low and now >= self._claim_after:
+            leases.top_up(sourceImageFolder)
+
+    def _poll_watch(self, _dt):
+        """Merge the files that appeared in / left the source folder (see FolderWatcher)."""
+        added, removed, resync = self.watcher.drain()
+        if not added and not removed:
+            return
+        if resync:  # a fresh listing also finds the labelled and the broken files
+            skip = self._unlisted()
+            added = [(key, name) for key, name in added if name not in skip]
+        # what is at or behind the current image stays listed – labelled images
+        # do (their moves are reported here too), and so does an image already seen
+        removed = [name for name in removed if self.image_list.position(name) > self.idx]
+        cur = self.image_list[self.idx] if self.idx < len(self.image_list) else None
+        with metrics.span("watch_merge"):
+            changed = self.image_list.update(added, removed)
+        if changed:  # most removals are this app's own moves
+            self._relisted(cur)
+
+    def _relisted(self, cur):
+        """Keep `cur` current after names were merged into / dropped from the list."""
+        if cur is not None:
+            self.idx = min(self.image_list.position(cur), max(0, len(self.image_list) - 1))
+        self.total_images = len(self.image_list)
+        self.processed_images = self.idx + 1
+        if not self.picture_1.source and self.idx + 1 < self.total_images:
+            self.idx += 1  # was past the end – go on with the new images
+            self.processed_images += 1
+            self._update_views()
+        elif self.picture_1.source:
+            self._update_views()
+        self.update_counter_display()
+
+    def _poll_scores(self, _dt):
+        """Collect finished predictions and keep the model busy just ahead of idx."""
+        cur = basename(self.picture_1.source) if self.picture_1.source else None
+        fresh = False
+        for path, _, _, _, key, prob, margin in scorer.results():
+            self.predictions[basename(path)] = (key, prob, margin)
+            fresh |= basename(path) == cur
+        if fresh:
+            self.update_counter_display()
+        scorer.feed(sourceImageFolder, islice(self.image_list.iter_from(self.idx), scorer.ahead))
+
+    def _unlisted(self) -> set:
+        """Basenames kept out of the list: labelled in the manifest or failed validation."""
+        skip = {basename(s) for s in manifest.labelled()} if manifest is not None else set()
+        catalog = ImageCatalog.existing()
+        if catalog is not None:
+            skip.update(basename(p) for p, _ in catalog.bad(sourceImageFolder))
+        return skip
+
     # ── pane refresh ────────────────────────────────────────────────────────
     def _src(self, idx: int) -> str:
         return join(sourceImageFolder, self.image_list[idx])
 
+    @metrics.timed("update_views")
     def _update_views(self):
         """Populate the three panes from self.idx and refresh labels / sizes."""
+        if self.grid_mode:
+            return self._update_grid()
         cur, nxt, prv = self.idx, self.idx + 1, self.idx - 1
 
         self.picture_1.source = self._src(cur) if cur < self.total_images else ""
@@ -200,6 +3422,135 @@ class PicturesFrame(Widget):
         for pic in (self.picture_1, self.picture_2, self.picture_past):
             self.update_image_size(pic)
 
+        self._prefetch()
+
+    def _prefetch(self):
+        """Keep the visible panes decoded and warm the next images after idx."""
+        first = self.idx + 2
+        ahead = range(first, min(first + prefetcher.window, self.total_images))
+        small = self.picture_2.preview_side  # upcoming images land in Next
+        prefetcher.schedule(
+            [display_path(p.source, p.preview_side, probe=False)
+             for p in (self.picture_past, self.picture_1, self.picture_2)],
+            [display_path(self._src(i), small, probe=False) for i in ahead],
+        )
+
+    # ── grid mode ───────────────────────────────────────────────────────────
+    def _update_grid(self):
+        """Fill the grid with the unlabelled images from self.idx onwards."""
+        cells = self.thumb_grid.children[::-1]  # Kivy keeps children last‑first
+        side = int(max(self.thumb_grid.size) / self.thumb_grid.cols)
+        self.page = []
+        for name in self.image_list.iter_from(self.idx):
+            if len(self.page) == len(cells):
+                break
+            path = join(sourceImageFolder, name)
+            if source_exists(path) or move_queue.incoming(path):  # not labelled in pane mode
+                self.page.append(name)
+        self.cursor = min(self.cursor, max(0, len(self.page) - 1))
+        for i, cell in enumerate(cells):
+            cell.preview_side = side
+            cell.source = join(sourceImageFolder, self.page[i]) if i < len(self.page) else ""
+        self._mark_cells()
+
+        # decode this page and the next one; both count as visible so the
+        # whole next page is ready when Enter is pressed
+        nxt = islice(self.image_list.iter_after(self.page[-1]), len(cells)) if self.page else ()
+        prefetcher.schedule(
+            [display_path(join(sourceImageFolder, n), side, probe=False)
+             for n in [*self.page, *nxt]], [])
+
+    def _mark_cells(self):
+        for i, cell in enumerate(self.thumb_grid.children[::-1]):
+            cell.cursor = i == self.cursor and i < len(self.page)
+            cell.selected = i < len(self.page) and self.page[i] in self.selected
+
+    def toggle_grid(self):
+        """Switch between the three panes and the thumbnail grid."""
+        if self.grid_mode and self.page:  # back on the image under the cursor
+            self.idx = self.image_list.position(self.page[self.cursor])
+            self.processed_images = self.idx + 1
+        self.grid_mode = not self.grid_mode
+        self.cursor = 0
+        self.selected.clear()
+        for pic in (self.picture_1, self.picture_2, self.picture_past):
+            pic.opacity = 0 if self.grid_mode else 1
+        self.thumb_grid.opacity = 1 if self.grid_mode else 0
+        prefetcher.cancel()
+        self._update_views()
+        self.update_counter_display()
+
+    def grid_nav(self, key_name: str):
+        """
+        Grid mode keys: arrows move the cursor, space (de)selects, Enter /
+        Page Down and Page Up flip pages.  Labels go through
+        `move_selection()`, Ctrl+A through `select_page()`.
+        """
+        k, n = self.thumb_grid.cols, len(self.page)
+        step = {"left": -1, "right": 1, "up": -k, "down": k}.get(key_name)
+        if step is not None:
+            if 0 <= self.cursor + step < n:
+                self.cursor += step
+        elif key_name == "spacebar" and n:
+            self.selected ^= {self.page[self.cursor]}
+        elif key_name in ("enter", "pagedown", "pageup"):
+            if key_name == "pageup":
+                start = max(0, self.idx - k * k)
+            elif n and self.image_list.position(self.page[-1]) + 1 < self.total_images:
+                start = self.image_list.position(self.page[-1]) + 1
+            else:
+                log("[info] reached last page – nothing to show")
+                return
+            self.idx, self.cursor = start, 0
+            self.processed_images = self.idx + 1
+            self.selected.clear()
+            self._update_views()
+            self._journal("nav")
+        else:
+            return
+        self._mark_cells()
+        self.update_counter_display()
+
+    def select_page(self):
+        """Select the whole page, or clear the selection if it already is."""
+        page = set(self.page)
+        self.selected = set() if page <= self.selected else page
+        self._mark_cells()
+        self.update_counter_display()
+
+    def move_selection(self, key_char: str):
+        """
+        Grid mode: label the selected thumbnails – or the one under the
+        cursor – plus their duplicates as one batch and one history entry.
+        The labelled images leave the grid and the page fills up again.
+        """
+        picked = [n for n in self.page if n in self.selected] or self.page[self.cursor:self.cursor + 1]
+        if not picked:
+            log("[info] no image to move")
+            return
+        srcs = [join(sourceImageFolder, n) for n in picked]
+        srcs = list(dict.fromkeys(srcs + [d for src in srcs for d in self._duplicates(src)]))
+        moves = [(src, join(key_dict[key_char], basename(src))) for src in srcs]
+
+        self.history.push(moves)
+        for src, dst in moves:
+            label_file(src, dst)
+        self._unlist(moves)
+        self.selected.clear()
+        self._update_views()
+        self.update_counter_display()
+        self._journal("group", moves=moves, key=key_char)
+
+    def _unlist(self, moves):
+        """Grid mode: drop moved images from the list, keeping the page start."""
+        start = self.page[0] if self.page else None
+        for src, _ in moves:
+            self.image_list.discard(basename(src))
+        if start is not None:
+            self.idx = self.image_list.position(start)
+        self.total_images = len(self.image_list)
+        self.processed_images = self.idx + 1
+
     # ── misc GUI helpers ────────────────────────────────────────────────────
     def update_image_size(self, picture_widget):
         if picture_widget == self.picture_1:
@@ -213,62 +3564,146 @@ class PicturesFrame(Widget):
             picture_widget.center = self.picture_past_center
 
     def update_counter_display(self):
-        self.counter_label.text = f"{self.processed_images}/{self.total_images}"
+        total = self.total_images
+        if not self.scanner.done:  # still listing – estimate the total
+            total = (f"~{self.scanner.estimate}" if self.scanner.estimate > total
+                     else f"{total}+")
+        text = f"{self.processed_images}/{total}"
+        if self.grid_mode:
+            text += f"  (grid, {len(self.selected)} selected)"
+        elif self.duplicates is not None:
+            dups = len(self._duplicates(self.picture_1.source))
+            if dups:
+                text += f"  (+{dups} duplicates)"
+        pred = self._prediction()
+        if pred is not None and not self.grid_mode:
+            text += f"  (model: {pred[0]} {pred[1]:.0%} – {self.confirm_key} confirms)"
+        if move_queue.pending:
+            text += f"  ({move_queue.pending} moves pending)"
+        if self.failed_moves:
+            text += f"  ({self.failed_moves} moves failed – see the log)"
+        self.counter_label.text = text
+
+    def _poll_pending(self, _dt):
+        failures = move_queue.take_failures()
+        if failures:
+            self._moves_failed(failures)
+        if failures or move_queue.pending != self._shown_pending:
+            self._shown_pending = move_queue.pending
+            self.update_counter_display()
+
+    def _moves_failed(self, failures):
+        """
+        Take back what the UI assumed about moves that failed on disk: a
+        labelled image is listed again, and undo / redo skip the move.
+        """
+        cur = self.image_list[self.idx] if self.idx < len(self.image_list) else None
+        failed = {(src, dst) for src, dst, _ in failures}
+        for src, dst, _ in failures:
+            if (src, dst) in self._moot:  # moved back in vain – it never left
+                self._moot.discard((src, dst))
+                continue
+            if (dst, src) in failed or move_queue.incoming(src):
+                self._moot.add((dst, src))  # already undone; the move back fails too
+                continue
+            self.failed_moves += 1
+            self._unapplied.add((src, dst))
+            if os.path.normpath(dirname(src)) == os.path.normpath(sourceImageFolder):
+                self.image_list.add(basename(src))  # still in the source folder
+        self._relisted(cur)
+
+    def toggle_overlay(self):
+        if self.overlay_label.opacity:
+            self.overlay_label.opacity = 0  # _refresh_overlay unschedules itself
+            return
+        self.overlay_label.opacity = 1
+        self._refresh_overlay(0)
+        Clock.schedule_interval(self._refresh_overlay, 0.5)
+
+    def _refresh_overlay(self, _dt):
+        if not self.overlay_label.opacity:
+            return False
+        g = metrics.snapshot()["gauges"]
+        self.overlay_label.text = (
+            f"frame {g.get('frame_ms', 0):.1f} ms · "
+            f"decode {1e3 * metrics.last('decode'):.1f} ms · "
+            f"upload {1e3 * metrics.last('upload'):.1f} ms · "
+            f"moves {g.get('moves_pending', 0)} · "
+            f"prefetch {g.get('prefetch_inflight', 0)} · "
+            f"cache hit {g.get('texture_cache_hit_rate', 0):.0f}%"
+        )
 
     # ── keyboard plumbing ───────────────────────────────────────────────────
     def _keyboard_closed(self):
         self._keyboard.unbind(on_key_down=self._on_keyboard_down)
         self._keyboard = None
 
+    @metrics.timed("key")
     def _on_keyboard_down(self, keyboard, keycode, text, modifiers):
         key_name = normal_key(keycode[1])
-        
+
         # ── ignore lock keys in the modifier list ──────────────────────────────
         lock_keys = {"numlock", "capslock", "scrolllock"}
         effective_mods = [m for m in modifiers if m not in lock_keys]
     
-        print(f"Key pressed: {key_name}, modifiers: {modifiers}")
+        log(f"Key pressed: {key_name}, modifiers: {modifiers}")
+
+        if key_name == self.overlay_key:
+            self.toggle_overlay(); return True
+        if key_name == self.grid_key and not effective_mods:
+            self.toggle_grid(); return True
 
         # undo / redo
         if key_name == "z" and {"ctrl", "meta"} & set(effective_mods):
             self.undo_action(); return True
         if key_name == "y" and {"ctrl", "meta"} & set(effective_mods):
             self.redo_action(); return True
+        if key_name == "a" and {"ctrl", "meta"} & set(effective_mods) and self.grid_mode:
+            self.select_page(); return True
 
         # ignore other real modifiers (shift, alt, ctrl, meta …)
         if effective_mods:
             return True
 
-        # move labelled
+        # move labelled (the whole selection in grid mode)
         if key_name in key_dict:
-            self.move_and_next(key_name)
+            if self.grid_mode:
+                self.move_selection(key_name)
+            else:
+                self.move_and_next(key_name)
+            return True
+        if self.grid_mode:
+            self.grid_nav(key_name)
             return True
         # skip (Enter)
         if key_name == "enter":
             self.display_next_image()
             return True
+        if key_name == self.confirm_key:
+            self.confirm_prediction()
+            return True
 
         return True  # swallow everything
 
     # ── core actions ────────────────────────────────────────────────────────
     def move_and_next(self, key_char: str):
         src_path = self.picture_1.source
-        if not src_path or not exists(src_path):
+        if not src_path or not (source_exists(src_path) or move_queue.incoming(src_path)):
             # happens if user keeps pressing after list exhausted
-            print("[info] no current image to move")
+            log("[info] no current image to move")
             return
 
         dst_path = join(key_dict[key_char], basename(src_path))
+        moves = [(src_path, dst_path)] + [
+            (src, join(key_dict[key_char], basename(src))) for src in self._duplicates(src_path)]
 
-        # history
-        self.history.append(("move", src_path, dst_path))
-        self.redo_stack.clear()
+        # history – a duplicate group is one entry, undone / redone as a whole
+        self.history.push(moves)
 
-        try:
-            move_file(src_path, dst_path)
-        except FileNotFoundError:
-            print("[warn] file already moved – skipping")
-            return
+        for src, dst in moves:
+            label_file(src, dst)
+        self.image_list.add(basename(src_path))  # stays listed once moved
+        self._drop_duplicates(moves)
 
         # advance index
         if self.idx + 1 < self.total_images:
@@ -283,66 +3718,154 @@ class PicturesFrame(Widget):
             self.picture_2.source = ""
             self.update_image_size(self.picture_1)
             self.update_counter_display()
-            print("[info] all images processed")
+            log("[info] all images processed")
+        if len(moves) == 1:
+            self._journal("move", src=src_path, dst=dst_path, key=key_char)
+        else:
+            self._journal("group", moves=moves, key=key_char)
+
+    def _prediction(self):
+        """(key, prob, margin) the model gave the current image, or None."""
+        src = self.picture_1.source
+        return self.predictions.get(basename(src)) if src and self.predictions else None
+
+    def confirm_prediction(self):
+        """Label the current image with the model's predicted key."""
+        pred = self._prediction()
+        if pred is None or pred[0] not in key_dict:
+            log("[info] no usable prediction for the current image (yet)")
+            return
+        self.move_and_next(pred[0])
+
+    def _duplicates(self, src_path: str):
+        """Source paths of the still unlabelled duplicates of `src_path`."""
+        if self.duplicates is None or not src_path:
+            return []
+        name = basename(src_path)
+        others = [join(sourceImageFolder, n) for n in self.duplicates.members(name)
+                  if n != name and n in self.image_list]
+        return [p for p in others if source_exists(p) or move_queue.incoming(p)]
+
+    def _drop_duplicates(self, moves):
+        """Unlist the other files of a group move; idx stays on the first one."""
+        if len(moves) < 2:
+            return
+        for src, _ in moves[1:]:
+            self.image_list.discard(basename(src))
+        self.idx = self.image_list.position(basename(moves[0][0]))
+        self.total_images = len(self.image_list)
+        self.processed_images = self.idx + 1
 
     def display_next_image(self):
         if self.idx + 1 >= self.total_images:
-            print("[info] reached last image – nothing to show")
+            log("[info] reached last image – nothing to show")
             return
         self.idx += 1
         self.processed_images += 1
         self._update_views()
         self.update_counter_display()
+        self._journal("nav")
 
     def undo_action(self):
-        if not self.history:
-            print("[info] nothing to undo")
+        entry = self.history.undo()
+        if entry is None:
+            log("[info] nothing to undo")
             return
 
-        action = self.history.pop()
-        self.redo_stack.append(action)
+        moves, _ = entry
+        prefetcher.cancel()
+        for src, dst in reversed(moves):
+            if (src, dst) in self._unapplied:  # never left – nothing to move back
+                self._unapplied.discard((src, dst))
+            else:
+                unlabel_file(src, dst)
+        for src, _ in moves[1:]:
+            self.image_list.add(basename(src))
 
-        if action[0] == "move":
-            src_path, dst_path = action[1], action[2]
-            try:
-                move_file(dst_path, src_path)
-            except Exception as e:
-                print(f"[err] undo failed: {e}")
-                return
+        # step back to the restored image (re‑listed if moved in a past session)
+        self.idx = self.image_list.add(basename(moves[0][0]))
+        self.total_images = len(self.image_list)
+        self.processed_images = self.idx + 1
+        self._update_views()
+        self.update_counter_display()
+        self._journal("undo")
+
+    def redo_action(self):
+        entry = self.history.redo()
+        if entry is None:
+            log("[info] nothing to redo")
+            return
 
-            if self.idx > 0:
-                self.idx -= 1
-                self.processed_images -= 1
+        moves, _ = entry
+        prefetcher.cancel()
+        for src, dst in moves:
+            if (dst, src) in self._unapplied:  # the undo never moved it back
+                self._unapplied.discard((dst, src))
+            else:
+                label_file(src, dst)
+        src_path = moves[0][0]
+        if self.grid_mode:
+            self._unlist(moves)
             self._update_views()
             self.update_counter_display()
-
-    def redo_action(self):
-        if not self.redo_stack:
-            print("[info] nothing to redo")
+            self._journal("redo")
             return
+        self._drop_duplicates(moves)
 
-        action = self.redo_stack.pop()
-        self.history.append(action)
+        if self.idx + 1 < self.total_images:
+            self.idx += 1
+            self.processed_images += 1
+            self._update_views()
+        else:  # ★ we just redid the very last image ★
+            self.picture_past.source = src_path   # 5 ➜ Previous pane
+            self.picture_1.source = ""            # clear Current
+            self.picture_2.source = ""            # clear Next
+            self.update_image_size(self.picture_1)
 
-        if action[0] == "move":
-            src_path, dst_path = action[1], action[2]
-            try:
-                move_file(src_path, dst_path)
-            except Exception as e:
-                print(f"[err] redo failed: {e}")
-                return
+        self.update_counter_display()
+        self._journal("redo")
 
-            if self.idx + 1 < self.total_images:
-                self.idx += 1
-                self.processed_images += 1
-                self._update_views()
-            else:  # ★ we just redid the very last image ★
-                self.picture_past.source = src_path   # 5 ➜ Previous pane
-                self.picture_1.source = ""            # clear Current
-                self.picture_2.source = ""            # clear Next
-                self.update_image_size(self.picture_1)
 
-            self.update_counter_display()
+# ═════════════════════════════════════════════════════════════════════════════
+# Startup
+# ═════════════════════════════════════════════════════════════════════════════
+def configure(cfg_path=None):
+    """
+    Load the config and open this session's state.  Nothing of the kind
+    happens at import time, so `--config` / IMAGE_ANNOTATOR_CONFIG skip Tk
+    altogether and tools can import this module cheaply.
+    """
+    global sourceImageFolder, key_dict, settings
+    global journal, manifest, prefetcher, texture_cache, tile_cache, previews, leases, scorer
+    global archives
+
+    sourceImageFolder, key_dict, settings = load_config(cfg_path)
+    _startup.append(("config", time.perf_counter()))
+
+    journal = Journal(settings.get("journal") or join(state_dir(), "journal.jsonl"))
+    move_engine.landed = lambda dst, path: journal.append("landed", dst=dst, path=path)
+    move_queue.workers = int(settings.get("move_workers", 4))
+    archives = make_archive_source()
+    if settings.get("label_mode") == "manifest" or archives is not None:  # shards stay as they are
+        manifest = LabelManifest(settings.get("manifest")
+                                 or join(state_dir(), "labels.sqlite"))
+    prefetcher = Prefetcher(window=int(settings.get("prefetch_window", 3)),
+                            workers=int(settings.get("prefetch_workers", 2)))
+    texture_cache = TextureCache(int(settings.get("texture_cache_mb", 512)) * 2**20)
+    tile_cache = TextureCache(int(settings.get("tile_cache_mb", 256)) * 2**20)
+    previews = make_preview_store()
+    leases = make_lease_board()
+    scorer = make_score_runner()
+    _startup.append(("session state", time.perf_counter()))
+
+
+def startup_report() -> str:
+    """Startup time per phase (also kept as "startup_*" metrics spans)."""
+    parts = []
+    for (_, t0), (phase, t1) in zip(_startup, _startup[1:]):
+        metrics.observe("startup_" + phase.replace(" ", "_"), t1 - t0)
+        parts.append(f"{phase} {t1 - t0:.2f} s")
+    return ", ".join(parts) + f" – total {_startup[-1][1] - _startup[0][1]:.2f} s"
 
 
 # ═════════════════════════════════════════════════════════════════════════════
@@ -350,9 +3873,79 @@ class PicturesFrame(Widget):
 # ═════════════════════════════════════════════════════════════════════════════
 class PicturesApp(App):
     def build(self):
+        from kivy.core.window import Window
+        _startup.append(("window + kv", time.perf_counter()))
         Window.clearcolor = (0.094, 0.094, 0.094, 1)
+        start_metrics_export()
         return PicturesFrame()
 
+    def on_start(self):
+        _startup.append(("first frame", time.perf_counter()))
+        print(f"[info] startup: {startup_report()}")
+
+    def on_stop(self):
+        if move_queue.pending:
+            print(f"[info] waiting for {move_queue.pending} pending moves…")
+        move_queue.flush()
+        if leases is not None:
+            leases.close(sourceImageFolder,
+                         {basename(s) for s in manifest.labelled()} if manifest else ())
+        watcher = getattr(self.root, "watcher", None)  # the frame's, if it is the root
+        if watcher is not None:
+            watcher.stop()
+        journal.close()
+        prefetcher.shutdown()
+        if previews:
+            previews.shutdown()
+        if scorer:
+            scorer.shutdown()
+        if archives is not None:
+            archives.close()
+        print(f"[info] texture cache: {texture_cache.stats()}")
+        print(f"[info] moves: {move_engine.stats()}")
+        write_metrics_log()
+        flush_log()
+
 
 if __name__ == "__main__":
-    PicturesApp().run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Image categorization tool")
+    parser.add_argument("--config", metavar="JSON",
+                        help="config file (default: $IMAGE_ANNOTATOR_CONFIG, "
+                             "else a file dialog)")
+    parser.add_argument("--build-previews", action="store_true",
+                        help="pre-build preview renditions for sourceImageFolder and exit")
+    parser.add_argument("--materialize", nargs="?", const="move",
+                        choices=("move", "hardlink", "symlink"),
+                        help="apply the label manifest to the class folders and exit")
+    parser.add_argument("--validate", nargs="?", const="full", choices=("full", "quick"),
+                        help="check every source image (quick: skip the full decode) and exit")
+    parser.add_argument("--dedup", action="store_true",
+                        help="hash the source images, report duplicate groups and exit")
+    parser.add_argument("--quarantine", metavar="DIR",
+                        help="with --validate: move bad files here "
+                             "(default: the \"quarantine_dir\" setting)")
+    parser.add_argument("--score", action="store_true",
+                        help="run the \"model\" over the source images, cache its predictions "
+                             "and exit")
+    parser.add_argument("--progress", action="store_true",
+                        help="show the shared progress of every labeler (\"shard\" on) and exit")
+    args = parser.parse_args()
+    configure(args.config)
+    if args.progress:
+        if leases is None:
+            print("[err] set \"shard\": true in the config settings first")
+            sys.exit(1)
+        print(leases.progress())
+    elif args.build_previews:
+        build_previews([sourceImageFolder])
+    elif args.validate:
+        validate([sourceImageFolder], args.quarantine or settings.get("quarantine_dir"),
+                 full=args.validate == "full")
+    elif args.score:
+        score_folder(sourceImageFolder)
+    elif args.dedup:
+        find_duplicates(sourceImageFolder, int(settings.get("dedup_distance", 4)))
+    elif args.materialize:
+        materialize(args.materialize)
+    else:
+        PicturesApp().run()
\ No newline at end of file
@@ -41,91 +41,3172 @@ Kivy >= 1.0.6
 ---------------------
 """
 
+import time
+
+_startup = [("", time.perf_counter())]  # (phase, when it ended) – startup_report()
+
+import argparse
+import errno
+import functools
+import hashlib
 import json
+import logging
+import ntpath
+import operator
 import os
+import queue
 import re
 import shutil
+import socket
 import sys
-from glob import glob
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from itertools import islice
 from os.path import basename, dirname, join
 from random import randint  # kept for parity; not used here
-from tkinter import Tk, filedialog
 
-import kivy
-from kivy.app import App
-from kivy.core.window import Window
-from kivy.properties import ListProperty
-from kivy.uix.floatlayout import FloatLayout
-from kivy.uix.gridlayout import GridLayout
-from kivy.uix.image import Image
-from kivy.uix.label import Label
+# tkinter (config dialog), sqlite3 (manifest mode), PIL (previews) and
+# http.server (metrics endpoint) are imported only where they are used
+_startup.append(("stdlib", time.perf_counter()))
+
+os.environ.setdefault("KIVY_NO_ARGS", "1")  # our own CLI flags, not Kivy's
+
+import kivy
+from kivy.app import App
+from kivy.clock import Clock
+from kivy.core.image import Image as CoreImage
+from kivy.core.image import ImageLoader
+from kivy.graphics import Color, Rectangle
+from kivy.graphics.texture import Texture
+from kivy.properties import ListProperty
+from kivy.uix.floatlayout import FloatLayout
+from kivy.uix.gridlayout import GridLayout
+from kivy.uix.image import Image
+from kivy.uix.label import Label
+from kivy.uix.stencilview import StencilView
+
+kivy.require("1.10.1")
+_startup.append(("kivy", time.perf_counter()))
+
+
+# ─────────────────────────────── configuration ──────────────────────────────
+def ask_config_path():
+    """Show the Tk file dialog and return the chosen JSON path ("" if none)."""
+    from tkinter import Tk, filedialog  # only when no config path was given
+
+    root = Tk()
+    root.withdraw()
+
+    # Try to set a window icon – best‑effort
+    try:
+        if os.name == "nt":
+            icon_path = "app.ico"
+            root.iconbitmap(icon_path)
+            root.tk.call("wm", "iconbitmap", root._w, "-default", icon_path)
+        elif sys.platform == "darwin":
+            from PIL import Image as PILImage
+            from PIL import ImageTk
+
+            icon_img = PILImage.open("icon.png")
+            root.iconphoto(True, ImageTk.PhotoImage(icon_img))
+    except Exception as e:  # noqa: BLE001
+        print(f"[warn] Could not set icon: {e}")
+
+    return filedialog.askopenfilename(
+        title="Select JSON file",
+        filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+    )
+
+
+def load_config(cfg_path=None):
+    """Prompt for a JSON config and return (source, original, key_dict, settings).
+
+    `settings` is the optional "settings" object of the config (performance
+    tuning such as "prefetch_window" / "texture_cache_mb" / "preview_dir" /
+    "journal" / "label_mode").  `cfg_path` (--config) or else the
+    IMAGE_ANNOTATOR_CONFIG environment variable names the config and skips
+    the dialog.
+    """
+    cfg_path = cfg_path or os.environ.get("IMAGE_ANNOTATOR_CONFIG") or ask_config_path()
+    if not cfg_path:
+        print("No config file selected – exiting.")
+        sys.exit(1)
+
+    try:
+        with open(cfg_path, "r", encoding="utf-8") as fh:
+            cfg = json.load(fh)
+        return (
+            cfg["sourceImageFolder"],
+            cfg["originalImageFolder"],
+            cfg["key_dict"],
+            cfg.get("settings", {}),
+        )
+    except Exception as e:  # noqa: BLE001
+        print(f"[err] Failed to load config: {e}")
+        sys.exit(1)
+
+
+# filled in by configure() at startup
+sourceImageFolder, originalImageFolder, key_dict, settings = "", "", {}, {}
+
+# ─────────────────────────────── telemetry ───────────────────────────────────
+class Metrics:
+    """
+    Timing spans and gauges for the hot paths.
+
+    `span(name)` (or the `timed(name)` decorator) records the count, total,
+    worst and latest duration of a step – listing, decode, texture upload,
+    moves, pane refresh – so a stall can be split into I/O and decode.
+    Gauges are callables, read only when a snapshot is taken.  Snapshots
+    feed the JSON‑lines log, the Prometheus text endpoint and the overlay.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}   # name -> [count, total s, max s, last s]
+        self._gauges = {}  # name -> callable returning a number
+
+    @contextmanager
+    def span(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def timed(self, name: str):
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            s = self._spans.get(name)
+            if s is None:
+                self._spans[name] = [1, seconds, seconds, seconds]
+            else:
+                s[0] += 1
+                s[1] += seconds
+                s[2] = max(s[2], seconds)
+                s[3] = seconds
+
+    def last(self, name: str) -> float:
+        """Duration of the latest `name` span in seconds (0 if none yet)."""
+        s = self._spans.get(name)
+        return s[3] if s else 0.0
+
+    def gauge(self, name: str, fn):
+        self._gauges[name] = fn
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            spans = {
+                n: {"count": c, "total_s": t, "max_s": m, "last_s": l}
+                for n, (c, t, m, l) in self._spans.items()
+            }
+        gauges = {}
+        for name, fn in list(self._gauges.items()):
+            try:
+                gauges[name] = fn()
+            except Exception:  # noqa: BLE001
+                continue  # a gauge must never break an export
+        return {"ts": time.time(), "spans": spans, "gauges": gauges}
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        snap = self.snapshot()
+        spans = sorted(snap["spans"].items())
+        out = ["# TYPE image_annotator_span_seconds summary"]
+        for n, s in spans:
+            out.append(f'image_annotator_span_seconds_count{{span="{n}"}} {s["count"]}')
+            out.append(f'image_annotator_span_seconds_sum{{span="{n}"}} {s["total_s"]:.6f}')
+        for field in ("max", "last"):
+            out.append(f"# TYPE image_annotator_span_{field}_seconds gauge")
+            out += [
+                f'image_annotator_span_{field}_seconds{{span="{n}"}} {s[field + "_s"]:.6f}'
+                for n, s in spans
+            ]
+        for name, value in sorted(snap["gauges"].items()):
+            out += [
+                f"# TYPE image_annotator_{name} gauge",
+                f"image_annotator_{name} {value}",
+            ]
+        return "\n".join(out) + "\n"
+
+
+metrics = Metrics()
+metrics.gauge("frame_ms", lambda: Clock.frametime * 1000)
+
+
+def start_metrics_export():
+    """Start the exporters named in the settings (both are optional)."""
+    path = settings.get("metrics_log")
+    if path:
+        interval = float(settings.get("metrics_interval", 10))
+
+        def dump():
+            while True:
+                time.sleep(interval)
+                write_metrics_log()
+
+        threading.Thread(target=dump, name="metrics-log", daemon=True).start()
+
+    port = settings.get("metrics_port")
+    if port:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_args):
+                pass  # no console line per scrape
+
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", int(port)), Handler)
+        except OSError as exc:
+            print(f"[warn] Could not serve metrics on port {port}: {exc}")
+            return
+        threading.Thread(
+            target=server.serve_forever, name="metrics-http", daemon=True
+        ).start()
+        print(f"[info] metrics at http://127.0.0.1:{port}/metrics")
+
+
+def write_metrics_log():
+    """Append one snapshot to the JSON‑lines metrics log, if configured."""
+    path = settings.get("metrics_log")
+    if not path:
+        return
+    try:
+        with open(path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(metrics.snapshot()) + "\n")
+    except OSError as exc:
+        print(f"[warn] Could not write metrics log: {exc}")
+
+
+_console = queue.Queue()
+
+
+def log(*parts):
+    """print() on a background thread – a slow console never stalls a keypress."""
+    _console.put(parts)
+
+
+def flush_log():
+    _console.join()
+
+
+def _print_console():
+    while True:
+        parts = _console.get()
+        print(*parts)
+        _console.task_done()
+
+
+threading.Thread(target=_print_console, name="console", daemon=True).start()
+
+# ─────────────────────────────── helpers ─────────────────────────────────────
+class MoveEngine:
+    """
+    File moves with as little work per move as the filesystems allow.
+
+    Destination folders are created once and remembered.  Whether a source
+    and a destination folder share a filesystem is looked up once per pair
+    (st_dev); such a move is a single os.rename.  Across devices the bytes
+    are copied in the kernel (copy_file_range, else sendfile, else a plain
+    read / write loop) into a new file, then the source is unlinked.
+
+    A name that is already taken is never overwritten: the file lands as
+    "<stem>~<n><ext>" with the lowest free n.  The engine remembers where a
+    requested destination really landed, so moving it back (an undo) finds
+    the file; `landed` is called with both paths so the journal can keep
+    that across sessions.
+    """
+
+    FALLBACK = (
+        errno.EXDEV,
+        errno.ENOSYS,
+        errno.EINVAL,
+        errno.EOPNOTSUPP,
+        errno.EBADF,
+        errno.ENOTSOCK,
+    )  # a copy method this kernel / filesystem pair does not support
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._made = set()  # destination folders known to exist
+        self._same = {}  # (src dir, dst dir) -> on one filesystem?
+        self._taken = set()  # collision names handed out, not yet on disk
+        self._alias = {}  # requested destination -> where the file landed
+        self._kernel = ["copy_file_range", "sendfile"]  # methods that still work
+        self._stats = {"rename": [0, 0.0], "copy": [0, 0.0]}  # count, seconds
+        self.copied = 0  # bytes copied across devices
+        self.collisions = 0
+        self.landed = None  # callable(dst, path) – see configure()
+
+    def alias(self, dst: str, path: str):
+        """Record that the file moved to `dst` is at `path` (journal replay)."""
+        self._alias[dst] = path
+
+    def where(self, dst: str) -> str:
+        """Where the file moved to `dst` really is."""
+        return self._alias.get(dst, dst)
+
+    def move(self, src: str, dst: str) -> str:
+        """Move `src` to `dst` (or a free name beside it); returns the final path."""
+        with self._lock:
+            src = self._alias.pop(src, src)
+        folder = dirname(dst)
+        if folder not in self._made:
+            os.makedirs(folder, exist_ok=True)
+            self._made.add(folder)
+        target = self._free(dst)
+        t0 = time.perf_counter()
+        try:
+            kind = self._move(src, target, folder)
+        except FileNotFoundError:
+            if not os.path.exists(src):
+                raise
+            self._made.discard(folder)  # the folder went away under the cache
+            os.makedirs(folder, exist_ok=True)
+            self._made.add(folder)
+            kind = self._move(src, target, folder)
+        finally:
+            with self._lock:
+                self._taken.discard(target)
+        seconds = time.perf_counter() - t0
+        with self._lock:
+            stat = self._stats[kind]
+            stat[0] += 1
+            stat[1] += seconds
+            if target != dst:
+                self._alias[dst] = target
+                self.collisions += 1
+            else:
+                self._alias.pop(dst, None)  # an older collision's name is stale
+        metrics.observe(f"move_{kind}", seconds)
+        if target != dst:
+            kept = basename(target)
+            log(f"[warn] {basename(dst)} already in {folder}, kept as {kept}")
+            if self.landed is not None:
+                self.landed(dst, target)
+        return target
+
+    def _free(self, dst: str) -> str:
+        """`dst`, or the first "<stem>~<n><ext>" beside it that nothing uses."""
+        stem, ext = os.path.splitext(dst)
+        path, n = dst, 0
+        with self._lock:
+            while path in self._taken or os.path.lexists(path):
+                n += 1
+                path = f"{stem}~{n}{ext}"
+            self._taken.add(path)
+        return path
+
+    def _move(self, src: str, dst: str, folder: str) -> str:
+        pair = (dirname(src), folder)
+        same = self._same.get(pair)
+        if same is None:
+            same = os.stat(pair[0]).st_dev == os.stat(folder).st_dev
+            self._same[pair] = same
+        if same:
+            try:
+                os.rename(src, dst)
+                return "rename"
+            except OSError as exc:
+                if exc.errno != errno.EXDEV:
+                    raise
+                self._same[pair] = False  # a mount point inside the folder
+        self._copy(src, dst)
+        os.unlink(src)
+        return "copy"
+
+    def _copy(self, src: str, dst: str):
+        """Copy `src` into the new file `dst` in the kernel where possible."""
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+        with open(src, "rb") as fin:
+            fd = os.open(dst, flags, 0o666)
+            try:
+                with open(fd, "wb", closefd=True) as fout:
+                    size = os.fstat(fin.fileno()).st_size
+                    self._pump(fin, fout, size)
+            except BaseException:
+                os.unlink(dst)
+                raise
+        shutil.copystat(src, dst)
+        with self._lock:
+            self.copied += size
+
+    def _pump(self, fin, fout, size: int):
+        i, o, done = fin.fileno(), fout.fileno(), 0
+        while done < size:
+            method = self._kernel[0] if self._kernel else None
+            try:
+                if method == "copy_file_range":
+                    n = os.copy_file_range(i, o, size - done, done, done)
+                elif method == "sendfile":
+                    os.lseek(o, done, os.SEEK_SET)
+                    n = os.sendfile(o, i, done, size - done)
+                else:
+                    fin.seek(done)
+                    fout.seek(done)
+                    shutil.copyfileobj(fin, fout, 1 << 20)
+                    fout.flush()
+                    return
+            except (AttributeError, OSError) as exc:
+                if method is None or (
+                    isinstance(exc, OSError) and exc.errno not in self.FALLBACK
+                ):
+                    raise
+                with self._lock:  # fall through to the next method
+                    if self._kernel and self._kernel[0] == method:
+                        self._kernel.pop(0)
+                continue
+            if n == 0:  # the source shrank under us
+                break
+            done += n
+
+    def stats(self) -> str:
+        with self._lock:
+            renames, rename_s = self._stats["rename"]
+            copies, copy_s = self._stats["copy"]
+            copied, collisions = self.copied, self.collisions
+        text = f"renames={renames}"
+        if renames:
+            text += f" ({1e6 * rename_s / renames:.0f} µs each)"
+        text += f" copies={copies}"
+        if copies:
+            rate = copied / 2**20 / copy_s if copy_s else 0.0
+            text += f" ({1e3 * copy_s / copies:.1f} ms each, {rate:.0f} MiB/s)"
+        return text + f" renamed‑on‑collision={collisions}"
+
+
+move_engine = MoveEngine()
+
+
+@metrics.timed("move")
+def move_file(src: str, dst: str) -> str:
+    """Move `src` to `dst` – or a free name beside it; returns where it landed."""
+    log("move:", src, "→", dst)
+    return move_engine.move(src, dst)
+
+
+class MoveQueue:
+    """
+    Ordered write‑behind queue for file moves.
+
+    Moves run on a background thread in submission order, so an undo queued
+    after its move always lands after it and the UI can advance as soon as
+    a move is queued.  Whatever has piled up is taken as one batch and cut
+    into runs of moves that touch no common path; a run's moves go out
+    together on `workers` threads, which overlaps slow cross‑device copies.
+    `pending` is the number of moves not yet on disk; `flush()` blocks until
+    all of them have landed.  Moves that fail are handed back to the UI
+    through `take_failures()`.
+    """
+
+    def __init__(self, batch: int = 64):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._incoming = {}  # dst path -> moves queued towards it
+        self._pool = None
+        self.batch = batch
+        self.workers = 4  # see configure()
+        self.pending = 0
+        self.failed = 0
+        self._failures = queue.SimpleQueue()  # (src, dst, error) of failed moves
+        threading.Thread(target=self._run, name="mover", daemon=True).start()
+
+    def submit(self, src: str, dst: str):
+        with self._lock:
+            self.pending += 1
+            self._incoming[dst] = self._incoming.get(dst, 0) + 1
+        self._queue.put((src, dst))
+
+    def incoming(self, path: str) -> bool:
+        """True while a queued move is about to create `path`."""
+        return path in self._incoming
+
+    def flush(self):
+        self._queue.join()
+
+    def take_failures(self) -> list:
+        """(src, dst, error) of every move that failed since the last call."""
+        failures = []
+        while not self._failures.empty():
+            failures.append(self._failures.get())
+        return failures
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for run in self._runs(batch):
+                if len(run) == 1 or self.workers <= 1:
+                    for move in run:
+                        self._move(move)
+                    continue
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        self.workers, thread_name_prefix="mover"
+                    )
+                list(self._pool.map(self._move, run))
+
+    @staticmethod
+    def _runs(batch):
+        """Split `batch` where a move touches a path an earlier one in the run did."""
+        run, touched = [], set()
+        for src, dst in batch:
+            if src in touched or dst in touched:
+                yield run
+                run, touched = [], set()
+            run.append((src, dst))
+            touched.update((src, dst))
+        yield run
+
+    def _move(self, move):
+        src, dst = move
+        try:
+            move_file(src, dst)
+        except Exception as e:  # noqa: BLE001
+            with self._lock:
+                self.failed += 1
+            self._failures.put((src, dst, str(e)))
+            print(f"[err] move failed {src} → {dst}: {e}")
+        finally:
+            with self._lock:
+                self.pending -= 1
+                if self._incoming[dst] == 1:
+                    del self._incoming[dst]
+                else:
+                    self._incoming[dst] -= 1
+            self._queue.task_done()
+
+
+move_queue = MoveQueue()
+metrics.gauge("moves_pending", lambda: move_queue.pending)
+
+
+def state_dir() -> str:
+    """Per‑source folder for session state (journal, indexes) outside the data."""
+    root = settings.get("state_dir") or join(os.path.expanduser("~"), ".image_annotator")
+    src = os.path.abspath(sourceImageFolder)
+    tag = hashlib.blake2b(src.encode("utf-8"), digest_size=6).hexdigest()
+    path = join(root, "reviewer", f"{basename(src.rstrip(os.sep)) or 'root'}-{tag}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class Journal:
+    """
+    Crash‑safe, append‑only JSON‑lines log of every move / undo / redo.
+
+    `append()` only queues the record; a background thread writes whatever
+    has accumulated as one group commit (a single write + fsync at most
+    every `interval` seconds), so journaling adds no I/O to a keypress.
+    `read()` replays the file at startup and `compact()` atomically
+    rewrites it with only the records that are still in effect.
+    """
+
+    def __init__(self, path: str, interval: float = 0.25):
+        self.path = path
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start = threading.Lock()  # the mover appends too
+
+    def append(self, op: str, **fields):
+        if self._thread is None:
+            with self._start:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="journal", daemon=True
+                    )
+                    self._thread.start()
+        self._queue.put(dict(op=op, ts=round(time.time(), 3), **fields))
+
+    def _run(self):
+        torn = False
+        try:
+            with open(self.path, "rb") as fh:
+                if fh.seek(0, os.SEEK_END):
+                    fh.seek(-1, os.SEEK_END)
+                    torn = fh.read(1) != b"\n"
+        except FileNotFoundError:
+            pass
+        with open(self.path, "a", encoding="utf-8") as fh:
+            if torn:  # start on a fresh line after a crash mid‑write
+                fh.write("\n")
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.interval
+                while batch[-1] is not None:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=left))
+                    except queue.Empty:
+                        break
+                fh.writelines(json.dumps(r, ensure_ascii=False) + "\n"
+                              for r in batch if r is not None)
+                fh.flush()
+                os.fsync(fh.fileno())
+                if batch[-1] is None:
+                    return
+
+    def close(self):
+        """Commit everything queued so far and stop the writer."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    @staticmethod
+    def read(path: str):
+        records = []
+        try:
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue  # torn line after a crash
+        except FileNotFoundError:
+            pass
+        return records
+
+    def compact(self, records):
+        """Replace the journal with `records` (write‑to‑temp + rename)."""
+        self.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.path)
+
+
+journal = None  # Journal of this source folder – see configure()
+
+
+class MoveHistory:
+    """
+    Unbounded undo / redo history of file moves, kept in flat arrays.
+
+    A path is an interned folder id plus its basename, stored as UTF‑8 in a
+    shared bytearray – once for a move's source and destination and for
+    the neighbours that come up again in the next few entries.
+    An entry is a slice of the per‑move columns, with a few values of its
+    own if `extra` asks for them ("i" an int, "p" a path).  Entries before
+    `top` are done, the rest can be redone; push, undo and redo are O(1), a
+    push after undos just truncates the redo tail, and 100k moves take a
+    few MB.
+    """
+
+    NONE = -1  # stands for an empty path
+
+    def __init__(self, extra: str = ""):
+        self.extra = extra
+        self.top = 0
+        self._dirs, self._dir_ids = [], {}
+        self._blob = bytearray()  # basenames, back to back
+        self._ends = array("I")  # end of every basename in _blob
+        self._moves = array("i")  # per move: src dir, src name, dst dir, dst name
+        self._values = array("q")  # per entry: extra values, a path as dir, name
+        self._first = array("I", [0])  # entry i = moves _first[i] … _first[i + 1]
+        self._names_at = array("I")  # basenames stored before entry i
+        self._width = sum(2 if kind == "p" else 1 for kind in extra)
+        self._recent = {}  # basename → name id, for the last few names
+
+    def __len__(self):
+        return len(self._first) - 1
+
+    def push(self, moves, *values):
+        """Record [(src, dst), …] as a new entry, dropping what could be redone."""
+        if self.top < len(self):
+            self._truncate(self.top)
+        self._names_at.append(len(self._ends))
+        for src, dst in moves:
+            self._moves.extend((*self._put(src), *self._put(dst)))
+        self._first.append(len(self._moves) // 4)
+        for kind, value in zip(self.extra, values):
+            self._values.extend(self._put(value) if kind == "p" else (value,))
+        self.top += 1
+
+    def undo(self):
+        """(moves, values) of the last done entry, now undone – or None."""
+        if not self.top:
+            return None
+        self.top -= 1
+        return self.entry(self.top)
+
+    def redo(self):
+        """(moves, values) of the next undone entry, now done again – or None."""
+        if self.top == len(self):
+            return None
+        self.top += 1
+        return self.entry(self.top - 1)
+
+    def entry(self, i: int):
+        m = self._moves
+        moves = [
+            (self._get(m[j], m[j + 1]), self._get(m[j + 2], m[j + 3]))
+            for j in range(4 * self._first[i], 4 * self._first[i + 1], 4)
+        ]
+        values, j = [], i * self._width
+        for kind in self.extra:
+            if kind == "p":
+                values.append(self._get(self._values[j], self._values[j + 1]))
+                j += 2
+            else:
+                values.append(self._values[j])
+                j += 1
+        return moves, tuple(values)
+
+    def nbytes(self) -> int:
+        """Memory held by the columns and the interned folders (approximate)."""
+        columns = (
+            self._blob,
+            self._ends,
+            self._moves,
+            self._values,
+            self._first,
+            self._names_at,
+        )
+        return sum(len(c) * getattr(c, "itemsize", 1) for c in columns) + sum(
+            sys.getsizeof(d) for d in self._dirs
+        )
+
+    def _put(self, path):
+        """(dir id, name id) of `path`."""
+        if not path:
+            return self.NONE, self.NONE
+        name = basename(path)
+        folder = path[: len(path) - len(name)]  # kept verbatim, separator and all
+        d = self._dir_ids.get(folder)
+        if d is None:
+            d = self._dir_ids[folder] = len(self._dirs)
+            self._dirs.append(folder)
+        n = self._recent.get(name)
+        if n is None:
+            if len(self._recent) >= 16:
+                self._recent.clear()
+            self._blob += name.encode("utf-8", "surrogateescape")
+            self._ends.append(len(self._blob))
+            n = self._recent[name] = len(self._ends) - 1
+        return d, n
+
+    def _get(self, d: int, n: int) -> str:
+        if d == self.NONE:
+            return ""
+        start = self._ends[n - 1] if n else 0
+        name = self._blob[start : self._ends[n]].decode("utf-8", "surrogateescape")
+        return self._dirs[d] + name
+
+    def _truncate(self, n: int):
+        """Forget entries n and up."""
+        del self._moves[4 * self._first[n] :]
+        del self._first[n + 1 :]
+        del self._values[n * self._width :]
+        del self._ends[self._names_at[n] :]
+        del self._names_at[n:]
+        del self._blob[self._ends[-1] if self._ends else 0 :]
+        self._recent.clear()
+
+
+# ─────────────────────────────── label manifest ──────────────────────────────
+class LabelManifest:
+    """
+    Labelling decisions recorded in SQLite instead of moving files.
+
+    Used when "label_mode" is "manifest": a keypress becomes one local
+    INSERT, so labelling speed no longer depends on the dataset's
+    filesystem.  `materialize()` later applies all pending decisions in a
+    single batched pass.
+    """
+
+    def __init__(self, path: str):
+        import sqlite3  # manifest mode only
+
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS labels ("
+            " src TEXT PRIMARY KEY, dst TEXT NOT NULL, key TEXT,"
+            " ts REAL NOT NULL, done TEXT NOT NULL DEFAULT '')"
+        )
+        self._keys = {os.path.normcase(os.path.normpath(d)): k for k, d in key_dict.items() if d}
+
+    def record(self, src: str, dst: str):
+        """Record a decision; one already materialized is left as it is."""
+        key = self._keys.get(os.path.normcase(os.path.normpath(dirname(dst))))
+        self._db.execute(
+            "INSERT INTO labels VALUES (?, ?, ?, ?, '') ON CONFLICT (src) DO UPDATE"
+            " SET dst = excluded.dst, key = excluded.key, ts = excluded.ts"
+            " WHERE done = ''",
+            (src, dst, key, time.time()),
+        )
+
+    def forget(self, src: str) -> str:
+        """Drop the decision for `src`; returns how it was materialized ('' = not yet)."""
+        row = self._db.execute("SELECT done FROM labels WHERE src = ?", (src,)).fetchone()
+        self._db.execute("DELETE FROM labels WHERE src = ?", (src,))
+        return row[0] if row else ""
+
+    def labelled(self):
+        return [r[0] for r in self._db.execute("SELECT src FROM labels")]
+
+    def pending(self):
+        return self._db.execute("SELECT src, dst FROM labels WHERE done = ''").fetchall()
+
+    def mark_done(self, pairs, how: str):
+        """Mark `pairs` materialized; a dst may differ from the recorded one."""
+        self._db.execute("BEGIN")
+        self._db.executemany("UPDATE labels SET done = ?, dst = ? WHERE src = ?",
+                             [(how, dst, src) for src, dst in pairs])
+        self._db.execute("COMMIT")
+
+
+manifest = None  # LabelManifest in "manifest" label mode – see configure()
+
+
+def label_file(src: str, dst: str) -> str:
+    """Apply one labelling decision; returns where the image lives afterwards."""
+    if manifest is not None:
+        manifest.record(src, dst)
+        return src
+    move_queue.submit(src, dst)
+    return dst
+
+
+def unlabel_file(src: str, dst: str):
+    """Revert `label_file(src, dst)` (undo); lands after any queued move."""
+    if manifest is None or manifest.forget(src) == "move":
+        move_queue.submit(dst, src)
+
+
+def materialize(how: str = "move", batch: int = 256):
+    """
+    Apply every pending manifest decision in one pass: destination folders
+    are created once, then files are moved / hard‑linked / symlinked in
+    per‑folder batches on a thread pool.  Archive members are extracted.
+    """
+    db = LabelManifest(settings.get("manifest") or join(state_dir(), "labels.sqlite"))
+    if archives is not None:
+        for _ in archives.names():  # load the member indexes
+            pass
+    op = {"move": move_file, "hardlink": os.link,
+          "symlink": lambda s, d: os.symlink(os.path.abspath(s), d)}[how]
+    groups = {}
+    for src, dst in db.pending():
+        groups.setdefault(dirname(dst), []).append((src, dst))
+    for folder in groups:
+        os.makedirs(folder, exist_ok=True)
+    chunks = [pairs[i:i + batch] for pairs in groups.values()
+              for i in range(0, len(pairs), batch)]
+
+    def run(chunk):
+        done, extracted = [], []
+        for src, dst in chunk:
+            try:
+                if is_member(src):
+                    archives.extract(src, dst)
+                    extracted.append((src, dst))
+                else:
+                    done.append((src, op(src, dst) or dst))  # move_file may rename
+            except OSError as e:
+                print(f"[warn] {how} failed {src} → {dst}: {e}")
+        return done, extracted
+
+    total = 0
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 4) * 4)) as pool:
+        for done, extracted in pool.map(run, chunks):
+            db.mark_done(done, how)
+            db.mark_done(extracted, "extract")
+            total += len(done) + len(extracted)
+    print(f"[info] materialized {total} labels into {len(groups)} folders ({how})")
+
+
+_DIGIT_RUNS = re.compile(r"(\d+)")
+
+
+def natkey(name: str) -> bytes:
+    """
+    Natural‑sort key (…1, …2, …10) – case‑insensitive – as one bytes object.
+
+    Text runs are stored as UTF‑8 plus a NUL terminator, digit runs as their
+    length (≥ 1) followed by the digits without leading zeros, so keys
+    compare with a plain `<` (a memcmp) exactly as [text, int, text, …]
+    lists would, and take a fraction of the memory.
+    """
+    out = bytearray()
+    for i, t in enumerate(_DIGIT_RUNS.split(name)):
+        if i % 2 == 0:  # text (the split alternates text, digits, text …)
+            out += t.lower().encode("utf-8", "surrogatepass") + b"\0"
+            continue
+        if not t.isascii():  # other scripts' digits, e.g. "٣"
+            t = "".join(str(int(c)) for c in t)
+        t = t.lstrip("0") or "0"
+        n = len(t)
+        out += bytes([n]) if n < 255 else b"\xff" + n.to_bytes(4, "big")
+        out += t.encode("ascii")
+    return bytes(out)
+
+
+# ─────────────────────────────── folder index ────────────────────────────────
+class FolderIndex:
+    """
+    Sorted, in‑memory list of the basenames in the source folder.
+
+    Built once from a directory listing and then patched in place on
+    move / undo / redo, so positioning by basename is a bisect (O(log n))
+    instead of a fresh glob + sort + list.index on every keystroke.
+    """
+
+    rank = None  # name → bytes sorted before the name (statistics, claimed bucket)
+
+    def __init__(self, paths=()):
+        self._names = []  # basenames in natural order
+        self._keys = []   # natkey‑based bytes key of every entry in `_names`
+        self._edits = None  # name → added?  while a listing is streaming in
+        self.rebuild(paths)
+
+    @classmethod
+    def _key(cls, name: str) -> bytes:
+        # the raw name breaks ties between e.g. "a01.png" and "A1.png"; the
+        # NUL sorts below any digit‑run length byte, so ties stay last
+        key = natkey(name) + b"\0" + name.encode("utf-8", "surrogatepass")
+        return key if cls.rank is None else cls.rank(name) + key
+
+    def rebuild(self, paths):
+        pairs = sorted((self._key(basename(p)), basename(p)) for p in paths)
+        self._keys = [k for k, _ in pairs]
+        self._names = [n for _, n in pairs]
+
+    def track_edits(self, on: bool = True):
+        """Remember add / discard calls so `install()` can re‑apply them."""
+        self._edits = {} if on else None
+
+    def install(self, pairs):
+        """
+        Swap in a sorted [(key, name), …] listing (see FolderScanner) and
+        re‑apply the edits made since `track_edits()`, which a listing taken
+        mid‑session may or may not already reflect.
+        """
+        self._keys = [k for k, _ in pairs]
+        self._names = [n for _, n in pairs]
+        edits, self._edits = self._edits, None
+        for name, added in (edits or {}).items():
+            self.add(name) if added else self.discard(name)
+        self._edits = edits
+
+    def __len__(self):
+        return len(self._names)
+
+    def __getitem__(self, i):
+        return self._names[i]
+
+    def names(self) -> list:
+        """A copy of the basenames, in order (safe to take from another thread)."""
+        return list(self._names)
+
+    def __contains__(self, name):
+        key = self._key(name)
+        i = bisect_left(self._keys, key)
+        return i < len(self._keys) and self._keys[i] == key
+
+    def position(self, name: str) -> int:
+        """Index of `name`, or where it would be inserted."""
+        return bisect_left(self._keys, self._key(name))
+
+    def add(self, name: str) -> int:
+        """Insert `name` at its sorted position (no‑op if present); returns it."""
+        if self._edits is not None:
+            self._edits[name] = True
+        key = self._key(name)
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return i
+        self._keys.insert(i, key)
+        self._names.insert(i, name)
+        return i
+
+    def discard(self, name: str):
+        """Remove `name` if present."""
+        if self._edits is not None:
+            self._edits[name] = False
+        key = self._key(name)
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+            del self._names[i]
+
+    def update(self, added=(), removed=()) -> int:
+        """
+        Apply a batch of listing changes – `added` as sorted [(key, name), …]
+        (see FolderWatcher), `removed` as names – and return how many names
+        actually went in or out.  A large batch rebuilds both lists by
+        slicing around the changed positions, one O(n + k) pass instead of
+        k inserts / deletes that each shift the whole tail.
+        """
+        if len(added) + len(removed) <= 16:
+            changed = 0
+            for name in removed:
+                changed += name in self
+                self.discard(name)
+            for _, name in added:
+                changed += name not in self
+                self.add(name)
+            return changed
+        if self._edits is not None:
+            self._edits.update((name, False) for name in removed)
+            self._edits.update((name, True) for _, name in added)
+        changed = 0
+        if removed:
+            drop = set()
+            for name in removed:
+                key = self._key(name)
+                i = bisect_left(self._keys, key)
+                if i < len(self._keys) and self._keys[i] == key:
+                    drop.add(i)
+            self._keys, self._names = self._splice(sorted(drop), ())
+            changed += len(drop)
+        if added:
+            cuts, fresh = [], []
+            for key, name in added:
+                i = bisect_left(self._keys, key)
+                if i == len(self._keys) or self._keys[i] != key:
+                    cuts.append(i)
+                    fresh.append((key, name))
+            self._keys, self._names = self._splice(cuts, fresh)
+            changed += len(cuts)
+        return changed
+
+    def _splice(self, cuts, fresh):
+        """New key / name lists: without the rows at `cuts`, or `fresh` put there."""
+        keys, names, start = [], [], 0
+        for n, i in enumerate(cuts):
+            keys += self._keys[start:i]
+            names += self._names[start:i]
+            if fresh:
+                keys.append(fresh[n][0])
+                names.append(fresh[n][1])
+                start = i
+            else:
+                start = i + 1
+        keys += self._keys[start:]
+        names += self._names[start:]
+        return keys, names
+
+    def iter_after(self, name):
+        """
+        Yield the basenames sorted strictly after `name` (all of them when
+        `name` is None).  `name` itself need not be in the index.
+        """
+        i = 0 if name is None else bisect_right(self._keys, self._key(name))
+        return self.iter_from(i)
+
+    def iter_from(self, i: int):
+        """Yield the basenames from position `i` onwards."""
+        while i < len(self._names):
+            yield self._names[i]
+            i += 1
+
+
+class FolderScanner:
+    """
+    Streams the source folder listing in on a background thread.
+
+    `os.scandir` reports the entry type from the directory read itself, so
+    no file is stat'ed.  A sorted snapshot is published as soon as `first`
+    files are known and again each time the count doubles, so the first
+    images show up at once while the rest of a multi‑million‑file folder
+    is still being read; later entries slot in around them.  The final
+    count is remembered per source folder as the estimate for next time.
+    With `keep`, only the names it accepts are listed (and nothing is
+    remembered).
+    """
+
+    def __init__(self, folder: str, first: int = 2000, keep=None):
+        self.folder = folder
+        self.keep = keep
+        self.count = 0        # files seen so far
+        self.done = False
+        self._first = max(1, first)
+        self._ready = threading.Event()
+        self._snapshots = queue.Queue()
+        self._memo = join(state_dir(), "listing.json")
+        try:
+            with open(self._memo, encoding="utf-8") as fh:
+                self.estimate = int(json.load(fh)["count"])
+        except (OSError, ValueError, KeyError, TypeError):
+            self.estimate = 0
+        if keep is not None:  # only a share of the folder is listed
+            self.estimate = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def wait_first(self, timeout=None):
+        """Block until the first snapshot (or the whole listing) is ready."""
+        self._ready.wait(timeout)
+
+    def latest(self):
+        """Newest snapshot not yet taken, or None."""
+        snap = None
+        while True:
+            try:
+                snap = self._snapshots.get_nowait()
+            except queue.Empty:
+                return snap
+
+    @metrics.timed("listing_sort")
+    def _publish(self, pairs):
+        pairs.sort()  # mostly sorted already – the earlier prefix is kept
+        self._snapshots.put(list(pairs))
+        self._ready.set()
+
+    def _names(self):
+        """The folder's file names – or the members of its archive shards."""
+        if archives is not None:
+            yield from archives.names()
+            return
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                # hidden files were never listed (glob "*" skips them)
+                if not entry.name.startswith(".") and entry.is_file():
+                    yield entry.name
+
+    def _run(self):
+        t0 = time.perf_counter()
+        pairs, publish_at = [], self._first
+        try:
+            for name in self._names():
+                if self.keep is not None and not self.keep(name):
+                    continue
+                pairs.append((FolderIndex._key(name), name))
+                self.count = len(pairs)
+                if len(pairs) >= publish_at:
+                    self._publish(pairs)
+                    publish_at *= 2
+        except OSError as exc:
+            print(f"[err] Could not list {self.folder}: {exc}")
+        self._publish(pairs)
+        self.done = True
+        metrics.observe("listing", time.perf_counter() - t0)
+        if self.keep is not None:
+            return
+        try:
+            with open(self._memo, "w", encoding="utf-8") as fh:
+                json.dump({"count": len(pairs)}, fh)
+        except OSError as exc:
+            print(f"[warn] Could not save listing size: {exc}")
+
+
+# ─────────────────────────────── folder watch ────────────────────────────────
+IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_DELETE = 0x8, 0x40, 0x80, 0x200
+IN_DELETE_SELF, IN_MOVE_SELF, IN_Q_OVERFLOW, IN_IGNORED = 0x400, 0x800, 0x4000, 0x8000
+IN_ISDIR = 0x40000000
+
+
+class FolderWatcher:
+    """
+    Reports the masks that appear in / leave the source folder while the
+    app runs, so the index follows a pipeline without rescans ("watch").
+
+    On Linux an inotify watch (through ctypes – no extra package) sees a
+    file once it has been written and closed or renamed into the folder,
+    and its deletion or rename away.  Elsewhere, or with `poll`, the folder
+    is listed again every `interval` seconds when its mtime has changed and
+    diffed against the previous listing; a new file counts once its size
+    held still between two listings.  An inotify queue overflow switches
+    to polling too, after one listing that is diffed against the index
+    itself (`resync`).
+
+    Events are coalesced per name on the watcher thread, which also works
+    out the sort keys.  `drain()` hands over at most `batch` changes once
+    the folder has been quiet for `debounce` seconds, or when the oldest
+    pending change is `latency` seconds old, so a burst of 50k files is
+    merged in a few large steps rather than 50k small ones.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        keep=None,
+        listed=None,
+        poll: bool = False,
+        interval: float = 2.0,
+        debounce: float = 0.25,
+        latency: float = 1.0,
+        batch: int = 5000,
+    ):
+        self.folder = folder
+        self.keep = keep  # name → listed here?  (shared‑folder buckets)
+        self.listed = listed  # callable: the names in the index now (resync)
+        self.interval = interval
+        self.debounce = debounce
+        self.latency = latency
+        self.batch = max(1, batch)
+        self.mode = "poll"  # or "inotify" once the watch is set up
+        self._lock = threading.Lock()
+        self._pending = {}  # name → key if it arrived, None if it left
+        self._first = self._last = 0.0
+        self._resync = False  # pending changes come from a diff with the index
+        self._stop = threading.Event()
+        fd = None if poll else self._inotify()
+        if fd is not None:
+            self.mode = "inotify"
+        threading.Thread(
+            target=self._run, args=(fd,), name="watcher", daemon=True
+        ).start()
+
+    def _inotify(self):
+        """An inotify descriptor watching the folder, or None where there is none."""
+        if not sys.platform.startswith("linux"):
+            return None
+        import ctypes
+
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        mask = (
+            IN_CLOSE_WRITE
+            | IN_MOVED_TO
+            | IN_MOVED_FROM
+            | IN_DELETE
+            | IN_DELETE_SELF
+            | IN_MOVE_SELF
+        )
+        if libc.inotify_add_watch(fd, os.fsencode(self.folder), mask) < 0:
+            reason = os.strerror(ctypes.get_errno())
+            print(f"[warn] Could not watch {self.folder}: {reason} – polling instead")
+            os.close(fd)
+            return None
+        return fd
+
+    def stop(self):
+        self._stop.set()
+
+    def _note(self, name: str, arrived: bool):
+        if name.startswith(".") or (self.keep is not None and not self.keep(name)):
+            return  # hidden files were never listed
+        key = FolderIndex._key(name) if arrived else None
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending:
+                self._first = now
+            self._pending.pop(name, None)  # the latest change goes last
+            self._pending[name] = key
+            self._last = now
+
+    def drain(self):
+        """([(key, name), …] sorted, [name, …], resync?) once the changes settle."""
+        now = time.monotonic()
+        with self._lock:
+            quiet = now - self._last >= self.debounce
+            if not self._pending or not (quiet or now - self._first >= self.latency):
+                return [], [], False
+            items = list(islice(self._pending.items(), self.batch))
+            for name, _ in items:
+                del self._pending[name]
+            resync = self._resync
+            if not self._pending:
+                self._resync = False
+        added = sorted((key, name) for name, key in items if key is not None)
+        return added, [name for name, key in items if key is None], resync
+
+    def _run(self, fd):
+        if fd is not None:
+            try:
+                self._read(fd)
+            finally:
+                os.close(fd)
+            if self._stop.is_set():
+                return
+            self.mode = "poll"
+        self._poll()
+
+    def _read(self, fd):
+        import select
+        import struct
+
+        event = struct.Struct("iIII")  # wd, mask, cookie, name length
+        while not self._stop.is_set():
+            if not select.select([fd], [], [], 1.0)[0]:
+                continue
+            try:
+                data = os.read(fd, 1 << 20)
+            except BlockingIOError:
+                continue
+            off = 0
+            while off < len(data):
+                _, mask, _, n = event.unpack_from(data, off)
+                start = off + event.size
+                name = data[start : start + n].split(b"\0", 1)[0]
+                off = start + n
+                if mask & IN_Q_OVERFLOW:
+                    print("[warn] Too many folder changes at once – polling now")
+                    with self._lock:
+                        self._resync = True
+                    return
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    print(f"[warn] {self.folder} went away – polling for it")
+                    return
+                if name and not mask & IN_ISDIR:
+                    arrived = bool(mask & (IN_CLOSE_WRITE | IN_MOVED_TO))
+                    self._note(os.fsdecode(name), arrived)
+
+    def _list(self):
+        with os.scandir(self.folder) as it:
+            return {e.name for e in it if e.is_file()}
+
+    def _size(self, name: str):
+        try:
+            return os.stat(join(self.folder, name)).st_size
+        except OSError:
+            return None
+
+    def _poll(self):
+        known, fresh, stamp = None, {}, None  # fresh: new name → size last seen
+        settle = True
+        if self._resync and self.listed is not None:
+            known = set(self.listed())  # diff the first listing with the index
+            settle = False  # and take what it finds as it is
+        while True:
+            try:
+                mtime = os.stat(self.folder).st_mtime_ns
+                if known is None or mtime != stamp or fresh:
+                    stamp = mtime
+                    now = self._list()
+                    if known is None:
+                        known = now
+                    else:
+                        for name in known - now:
+                            self._note(name, False)
+                        sizes = {n: self._size(n) for n in now - known}
+                        settled = {
+                            n
+                            for n, size in sizes.items()
+                            if not settle or (size is not None and fresh.get(n) == size)
+                        }
+                        for name in settled:
+                            self._note(name, True)
+                        known = (known & now) | settled
+                        fresh = {n: v for n, v in sizes.items() if n not in settled}
+                        settle = True
+            except OSError as exc:
+                log(f"[warn] Could not list {self.folder}: {exc}")
+            if self._stop.wait(self.interval):
+                return
+
+
+# ─────────────────────────────── archive shards ──────────────────────────────
+ARCHIVE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+
+class ArchiveSource:
+    """
+    Serves the members of the tar / zip shards in the source folder as if
+    they were files in it, so nothing is extracted ("source_archives").
+
+    Each shard is indexed once – member name, data offset, size and
+    compression – into <index_dir>/<shard>.idx, which stays valid while the
+    shard's size and mtime do.  Reads slice a read‑only mmap of the shard
+    (deflated zip members are inflated on the way).  A member is listed
+    under its basename, so its path is join(folder, name) like any file; a
+    basename already taken by an earlier shard gets "<shard stem>~" in
+    front.  Tars must be uncompressed – a .tar.gz has no fixed offsets.
+    """
+
+    def __init__(self, folder: str, index_dir: str, extensions=ARCHIVE_EXTENSIONS):
+        self.folder = os.path.abspath(folder)
+        self.index_dir = index_dir
+        self.extensions = tuple(e.lower() for e in extensions)
+        self._prefix = join(self.folder, "")
+        self._row = {}                # listed name → row in the columns below
+        self._shard = array("H")      # shard number
+        self._offset = array("Q")     # first data byte in the shard
+        self._size = array("Q")       # stored bytes
+        self._deflated = bytearray()  # 1 = zip deflate, 0 = stored
+        self._shards = []             # shard paths
+        self._maps = {}               # shard number → mmap
+        self._lock = threading.Lock()
+        os.makedirs(index_dir, exist_ok=True)
+
+    def shards(self):
+        with os.scandir(self.folder) as it:
+            return sorted(
+                e.path
+                for e in it
+                if e.is_file()
+                and not e.name.startswith(".")
+                and e.name.lower().endswith((".tar", ".zip"))
+            )
+
+    def names(self):
+        """Yield every member's listed name, shard by shard, indexing new shards."""
+        for path in self.shards():
+            try:
+                members = self._load(path) or self._build(path)
+            except Exception as exc:  # noqa: BLE001 – skip the broken shard
+                print(f"[err] Could not index {path}: {exc}")
+                continue
+            shard = len(self._shards)
+            self._shards.append(path)
+            stem = os.path.splitext(basename(path))[0]
+            names = []
+            for name, offset, size, deflated in members:
+                base = ntpath.basename(name)  # members use "/", some zips "\\"
+                if base in self._row:
+                    base = f"{stem}~{base}"
+                self._row[base] = len(self._offset)
+                self._shard.append(shard)
+                self._offset.append(offset)
+                self._size.append(size)
+                self._deflated.append(deflated)
+                names.append(base)
+            yield from names
+
+    def _index_path(self, path: str) -> str:
+        tag = hashlib.blake2b(
+            path.encode("utf-8", "surrogateescape"), digest_size=6
+        ).hexdigest()
+        return join(self.index_dir, f"{basename(path)}-{tag}.idx")
+
+    def _load(self, path: str):
+        """Members from the shard's index, or None when it is missing or stale."""
+        st = os.stat(path)
+        try:
+            with open(self._index_path(path), "rb") as fh:
+                head = json.loads(fh.readline())
+                if (head["size"], head["mtime_ns"]) != (st.st_size, st.st_mtime_ns):
+                    return None
+                n = head["count"]
+                blob = fh.read(head["names"])
+                names = blob.decode("utf-8", "surrogateescape").split("\0")
+                offsets, sizes = array("Q"), array("Q")
+                offsets.frombytes(fh.read(8 * n))
+                sizes.frombytes(fh.read(8 * n))
+                deflated = fh.read(n)
+        except (OSError, ValueError, KeyError):
+            return None
+        if len(deflated) != n or len(names) != n:
+            return None  # torn write
+        return list(zip(names, offsets, sizes, deflated)) if n else []
+
+    def _build(self, path: str):
+        """Read the shard's member table once and save it as its index."""
+        t0 = time.perf_counter()
+        members = []
+        if path.lower().endswith(".zip"):
+            import struct
+            import zipfile
+
+            with zipfile.ZipFile(path) as zf:
+                for info in zf.infolist():
+                    name = info.filename
+                    if info.is_dir() or not name.lower().endswith(self.extensions):
+                        continue
+                    supported = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+                    if info.compress_type not in supported:
+                        print(f"[warn] Skipping {name} in {path}: compressed")
+                        continue
+                    zf.fp.seek(info.header_offset + 26)  # local header: name / extra
+                    n, extra = struct.unpack("<HH", zf.fp.read(4))
+                    deflated = int(info.compress_type == zipfile.ZIP_DEFLATED)
+                    offset = info.header_offset + 30 + n + extra
+                    members.append((name, offset, info.compress_size, deflated))
+        else:
+            import tarfile
+
+            # "r:" – raw bytes only, the offsets must be real
+            with tarfile.open(path, "r:") as tf:
+                for m in iter(tf.next, None):
+                    if m.isfile() and m.name.lower().endswith(self.extensions):
+                        members.append((m.name, m.offset_data, m.size, 0))
+                    tf.members.clear()  # a shard may hold millions of headers
+        self._save(path, members)
+        print(
+            f"[info] Indexed {len(members)} images in {basename(path)} "
+            f"in {time.perf_counter() - t0:.1f} s"
+        )
+        return members
+
+    def _save(self, path: str, members):
+        st = os.stat(path)
+        blob = "\0".join(m[0] for m in members).encode("utf-8", "surrogateescape")
+        head = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "count": len(members),
+            "names": len(blob),
+        }
+        target = self._index_path(path)
+        try:
+            with open(target + ".tmp", "wb") as fh:
+                fh.write(json.dumps(head).encode() + b"\n")
+                fh.write(blob)
+                fh.write(array("Q", [m[1] for m in members]).tobytes())
+                fh.write(array("Q", [m[2] for m in members]).tobytes())
+                fh.write(bytes(m[3] for m in members))
+            os.replace(target + ".tmp", target)
+        except OSError as exc:
+            print(f"[warn] Could not save the index of {path}: {exc}")
+
+    def has(self, path: str) -> bool:
+        return path.startswith(self._prefix) and path[len(self._prefix) :] in self._row
+
+    def read(self, path: str) -> bytes:
+        """The bytes of the member listed as `path`."""
+        i = self._row[path[len(self._prefix) :]]
+        shard = self._shard[i]
+        mm = self._maps.get(shard)
+        if mm is None:
+            import mmap
+
+            with self._lock:
+                mm = self._maps.get(shard)
+                if mm is None:
+                    with open(self._shards[shard], "rb") as fh:
+                        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._maps[shard] = mm
+        data = mm[self._offset[i] : self._offset[i] + self._size[i]]
+        return zlib.decompress(data, -15) if self._deflated[i] else data
+
+    def extract(self, path: str, dst: str):
+        """Write the member listed as `path` to the file `dst`."""
+        os.makedirs(dirname(dst), exist_ok=True)
+        with open(dst, "xb") as fh:  # never overwrite a labelled file
+            fh.write(self.read(path))
+
+    def close(self):
+        for mm in self._maps.values():
+            mm.close()
+        self._maps.clear()
+
+
+def make_archive_source():
+    """ArchiveSource for the source folder when "source_archives" is on, else None."""
+    if not settings.get("source_archives"):
+        return None
+    return ArchiveSource(
+        sourceImageFolder,
+        join(state_dir(), "archives"),
+        settings.get("archive_extensions", ARCHIVE_EXTENSIONS),
+    )
+
+
+archives = None  # ArchiveSource when "source_archives" is on – see configure()
+
+
+def is_member(path: str) -> bool:
+    return archives is not None and archives.has(path)
+
+
+def source_isfile(path: str) -> bool:
+    """`os.path.isfile()` that also sees archive members (see ArchiveSource)."""
+    return is_member(path) or os.path.isfile(path)
+
+
+def source_open(path: str):
+    """What Pillow should open for `path`: the member's bytes, or the path itself."""
+    return BytesIO(archives.read(path)) if is_member(path) else path
+
+
+# ─────────────────────────────── work claims ─────────────────────────────────
+class LeaseBoard:
+    """
+    Splits the source folder into buckets (crc32 of the basename, so a mask
+    keeps its bucket wherever it is listed) that running instances claim
+    through lease files in a folder on the share.
+
+    A lease is <bucket>.lease, created with O_CREAT | O_EXCL so exactly one
+    instance wins it, holding its owner and expiry; the owner renews it
+    every `ttl` / 4 seconds.  The lease of a crashed instance is taken over
+    once it has expired – renamed aside first, which only one taker can do.
+    Buckets left with no unreviewed mask get a <bucket>.done marker, and
+    every instance publishes progress/<worker>.json for --progress.  The
+    workstations' clocks must agree to well within `ttl`.
+    """
+
+    def __init__(
+        self, folder, buckets: int = 256, ttl: float = 120.0, worker=None, low: int = 50
+    ):
+        self.folder = folder
+        self.ttl = ttl
+        self.low = max(1, low)  # claim more once fewer masks than this are left
+        self.worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+        self.held = set()
+        self.order = {}  # bucket → claim number; later claims sort after earlier ones
+        self._arrivals = queue.Queue()
+        self._claiming = False
+        os.makedirs(join(folder, "progress"), exist_ok=True)
+        self.buckets = self._layout(buckets)
+
+    def _layout(self, buckets: int) -> int:
+        """The bucket count – fixed by whichever instance came first."""
+        path = join(self.folder, "layout.json")
+        try:
+            self._write(path, {"buckets": buckets}, exclusive=True)
+            return buckets
+        except FileExistsError:
+            for _ in range(50):  # may still be being written
+                layout = self._read(path)
+                if layout is not None:
+                    return int(layout["buckets"])
+                time.sleep(0.1)
+            raise
+
+    def bucket(self, name: str) -> int:
+        return zlib.crc32(name.encode("utf-8", "surrogateescape")) % self.buckets
+
+    def holds(self, name: str) -> bool:
+        return self.bucket(name) in self.held
+
+    def prefix(self, name: str) -> bytes:
+        """Sort prefix: a bucket's masks follow the ones claimed before it."""
+        return self.order.get(self.bucket(name), 2**32 - 1).to_bytes(4, "big")
+
+    def _lease(self, b: int) -> str:
+        return join(self.folder, f"{b}.lease")
+
+    def _write(self, path, data, exclusive=False):
+        if exclusive:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            with os.fdopen(fd, "w") as fh:
+                json.dump(data, fh)
+            return
+        tmp = f"{path}.{self.worker}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(data, fh)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _stamp(self):
+        return {"worker": self.worker, "expires": time.time() + self.ttl}
+
+    def claim(self):
+        """Claim one more bucket; returns it, or None when all are taken or done."""
+        start = zlib.crc32(self.worker.encode()) % self.buckets  # spread the search
+        for i in range(self.buckets):
+            b = (start + i) % self.buckets
+            if b in self.held or os.path.exists(join(self.folder, f"{b}.done")):
+                continue
+            path = self._lease(b)
+            try:
+                self._write(path, self._stamp(), exclusive=True)
+            except FileExistsError:
+                if not self._take_over(path):
+                    continue
+            except OSError as exc:
+                print(f"[warn] Could not claim bucket {b}: {exc}")
+                continue
+            self.order.setdefault(b, len(self.order))
+            self.held.add(b)
+            return b
+        return None
+
+    def _take_over(self, path) -> bool:
+        lease = self._read(path)
+        if lease is None or lease.get("expires", 0) > time.time():
+            return False  # alive, or being written right now
+        aside = f"{path}.{self.worker}.stale"
+        try:
+            os.rename(path, aside)  # only one instance can move a given file
+        except OSError:
+            return False
+        moved = self._read(aside)
+        try:
+            if moved is not None and moved.get("expires", 0) > time.time():
+                os.rename(aside, path)  # a fresh lease slipped in – hand it back
+                return False
+            os.remove(aside)
+            self._write(path, self._stamp(), exclusive=True)
+        except OSError:
+            return False
+        print(f"[info] Took over bucket {basename(path)} from {lease.get('worker')}")
+        return True
+
+    def renew(self, labelled: int = 0):
+        """Renew every held lease and publish progress; returns the buckets lost."""
+        lost = set()
+        for b in list(self.held):
+            lease = self._read(self._lease(b))
+            if lease is not None and lease.get("worker") != self.worker:
+                lost.add(b)  # expired while we were stalled, and taken over
+                continue
+            try:
+                self._write(self._lease(b), self._stamp())
+            except OSError as exc:
+                print(f"[warn] Could not renew bucket {b}: {exc}")
+        self.held -= lost
+        progress = {
+            "worker": self.worker,
+            "labelled": labelled,
+            "held": sorted(self.held),
+            "ts": time.time(),
+        }
+        try:
+            self._write(join(self.folder, "progress", f"{self.worker}.json"), progress)
+        except OSError as exc:
+            print(f"[warn] Could not publish progress: {exc}")
+        return lost
+
+    def top_up(self, source):
+        """Claim a bucket and list it on a background thread – see `arrivals()`."""
+        if self._claiming:
+            return
+        self._claiming = True
+        threading.Thread(
+            target=self._claim_and_list, args=(source,), daemon=True
+        ).start()
+
+    def _claim_and_list(self, source):
+        try:
+            self._arrivals.put(self.take(source))
+        finally:
+            self._claiming = False
+
+    def take(self, source):
+        """Claim a bucket and list its files: (bucket, names), or (None, [])."""
+        b, names = self.claim(), []
+        if b is not None:
+            with os.scandir(source) as it:
+                names = [
+                    e.name
+                    for e in it
+                    if not e.name.startswith(".")
+                    and self.bucket(e.name) == b
+                    and e.is_file()
+                ]
+        return b, names
+
+    def arrivals(self):
+        """[(bucket, names), …] claimed since the last call; None = nothing left."""
+        out = []
+        while True:
+            try:
+                out.append(self._arrivals.get_nowait())
+            except queue.Empty:
+                return out
+
+    def close(self, source, labelled=()):
+        """Release every lease; held buckets with no unreviewed mask left are done."""
+        left = set()
+        try:
+            with os.scandir(source) as it:
+                left = {
+                    self.bucket(e.name)
+                    for e in it
+                    if not e.name.startswith(".") and e.name not in labelled
+                }
+        except OSError as exc:
+            print(f"[warn] Could not list {source}: {exc}")
+        for b in self.held:
+            try:
+                if b not in left:
+                    open(join(self.folder, f"{b}.done"), "w").close()
+                os.remove(self._lease(b))
+            except OSError:
+                pass
+        self.held.clear()
+
+    def progress(self) -> str:
+        """Done / leased / free buckets and every worker's count, as text."""
+        names = os.listdir(self.folder)
+        done = sum(n.endswith(".done") for n in names)
+        now, leased = time.time(), 0
+        for n in names:
+            if n.endswith(".lease"):
+                lease = self._read(join(self.folder, n))
+                leased += lease is not None and lease.get("expires", 0) > now
+        lines = [
+            f"{done}/{self.buckets} buckets done, {leased} leased, "
+            f"{self.buckets - done - leased} free"
+        ]
+        for n in sorted(os.listdir(join(self.folder, "progress"))):
+            p = self._read(join(self.folder, "progress", n))
+            if p is not None:
+                lines.append(
+                    f"  {p['worker']:<28} {p.get('labelled', 0):>7} reviewed, "
+                    f"{len(p.get('held', ())):>3} buckets, "
+                    f"seen {now - p.get('ts', 0):.0f} s ago"
+                )
+        return "\n".join(lines)
+
+
+def make_lease_board():
+    """LeaseBoard for the source folder when "shard" is on, else None."""
+    if not settings.get("shard"):
+        return None
+    return LeaseBoard(
+        settings.get("lease_dir") or join(sourceImageFolder, ".leases"),
+        int(settings.get("shard_buckets", 256)),
+        float(settings.get("lease_ttl", 120)),
+        settings.get("worker"),
+        int(settings.get("shard_low", 50)),
+    )
+
+
+leases = None  # LeaseBoard when "shard" is on – see configure()
+
+
+# ─────────────────────────────── pre‑flight validation ───────────────────────
+IMAGE_MAGIC = (
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"BM", "BMP"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+)
+
+
+def sniff_format(head: bytes):
+    """Image format from the first bytes of a file, or None."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for magic, fmt in IMAGE_MAGIC:
+        if head.startswith(magic):
+            return fmt
+    return None
+
+
+def check_image(job, full: bool = True):
+    """
+    Validate one file – runs in a worker process.
+
+    `job` is (path, size, mtime_ns); the result is the catalog row
+    (path, size, mtime_ns, ok, format, width, height, error).  Header and
+    trailer are always checked; with Pillow the image is also opened and,
+    when `full`, decoded completely.
+    """
+    path, size, mtime = job
+    try:
+        with open(path, "rb") as fh:
+            head = fh.read(16)
+            fh.seek(max(0, size - 64))
+            tail = fh.read()
+        fmt = sniff_format(head)
+        if fmt is None:
+            raise ValueError("not a recognised image format")
+        if (fmt == "PNG" and b"IEND" not in tail) or (
+            fmt == "JPEG" and b"\xff\xd9" not in tail
+        ):
+            raise ValueError("truncated file")
+        try:
+            from PIL import Image as PILImage
+        except ImportError:  # header / trailer checks only
+            return path, size, mtime, 1, fmt, None, None, None
+        PILImage.MAX_IMAGE_PIXELS = None  # large scans are legitimate here
+        with PILImage.open(path) as im:
+            w, h = im.size
+            if full:
+                im.load()
+        return path, size, mtime, 1, fmt, w, h, None
+    except Exception as exc:  # noqa: BLE001
+        return path, size, mtime, 0, None, None, None, f"{type(exc).__name__}: {exc}"
+
+
+class ImageCatalog:
+    """
+    Per‑file facts in SQLite: validation results (format, dimensions,
+    ok / error) and mask statistics.
+
+    Rows remember (size, mtime) so a later pass re‑checks only new or
+    changed files, and the UI can leave known bad files out of the index.
+    """
+
+    COLUMNS = {  # what store() writes
+        "files": "path, size, mtime_ns, ok, format, width, height, error",
+        "masks": "path, size, mtime_ns, width, height, foreground, components,"
+        " empty, mismatch, original, error",
+    }
+
+    def __init__(self, path):
+        import sqlite3  # only when validating / a catalog exists
+
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, ok INTEGER,"
+            " format TEXT, width INTEGER, height INTEGER, error TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS masks ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+            " width INTEGER, height INTEGER, foreground REAL, components INTEGER,"
+            " empty INTEGER, mismatch INTEGER, original TEXT, error TEXT)"
+        )
+
+    @classmethod
+    def existing(cls):
+        """The catalog of this source folder, or None if never validated."""
+        path = join(state_dir(), "catalog.sqlite")
+        return cls(path) if os.path.exists(path) else None
+
+    def known(self, table: str = "files") -> dict:
+        rows = self._db.execute(f"SELECT path, size, mtime_ns FROM {table}")
+        return {p: (size, mtime) for p, size, mtime in rows}
+
+    def store(self, rows, table: str = "files"):
+        cols = self.COLUMNS[table]
+        marks = ", ".join("?" * len(cols.split(",")))
+        self._db.execute("BEGIN")
+        self._db.executemany(
+            f"INSERT OR REPLACE INTO {table} ({cols}) VALUES ({marks})", rows
+        )
+        self._db.execute("COMMIT")
+
+    def forget(self, paths):
+        self._db.execute("BEGIN")
+        for table in self.COLUMNS:
+            self._db.executemany(
+                f"DELETE FROM {table} WHERE path = ?", [(p,) for p in paths]
+            )
+        self._db.execute("COMMIT")
+
+    def bad(self, folder: str):
+        """(path, error) of every file in `folder` that failed validation."""
+        prefix = join(os.path.abspath(folder), "")
+        rows = self._db.execute(
+            "SELECT path, error FROM files WHERE ok = 0 AND substr(path, 1, ?) = ?",
+            (len(prefix), prefix),
+        )
+        return list(rows)
+
+    def masks(self, folder: str):
+        """Statistics of every mask in `folder`, one dict per mask."""
+        prefix = join(os.path.abspath(folder), "")
+        cols = [c.strip() for c in self.COLUMNS["masks"].split(",")]
+        rows = self._db.execute(
+            f"SELECT {', '.join(cols)} FROM masks"
+            " WHERE error IS NULL AND substr(path, 1, ?) = ?",
+            (len(prefix), prefix),
+        )
+        return [dict(zip(cols, row)) for row in rows]
+
+
+def changed_files(folders, known: dict, seen: set = None):
+    """
+    (jobs, total): a (path, size, mtime_ns) job for every file in `folders`
+    whose size or mtime differs from `known`, and the number of files seen
+    (whose paths go into `seen`, if given).
+    """
+    jobs, total = [], 0
+    for folder in folders:
+        for entry in os.scandir(folder):
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            total += 1
+            st = entry.stat()
+            path = os.path.abspath(entry.path)
+            if seen is not None:
+                seen.add(path)
+            if known.get(path) != (st.st_size, st.st_mtime_ns):
+                jobs.append((path, st.st_size, st.st_mtime_ns))
+    return jobs, total
+
+
+def validate(folders, quarantine=None, full: bool = True, batch: int = 500):
+    """
+    Pre‑flight pass over `folders` on a process pool (every core).
+
+    Checks each new or changed file, records format and dimensions in the
+    catalog and, with `quarantine`, moves the bad ones there.  Safe to
+    interrupt – finished batches are committed and skipped next time.
+    """
+    catalog = ImageCatalog(join(state_dir(), "catalog.sqlite"))
+    jobs, total = changed_files(folders, catalog.known())
+    print(
+        f"[info] Validating {len(jobs)} of {total} files "
+        f"({total - len(jobs)} unchanged since the last pass)"
+    )
+
+    logging.getLogger("PIL").setLevel(logging.INFO)  # Kivy leaves the root at DEBUG
+    t0, rows, failed = time.perf_counter(), [], 0
+    check = functools.partial(check_image, full=full)
+    with ProcessPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        for done, row in enumerate(pool.map(check, jobs, chunksize=64), 1):
+            rows.append(row)
+            failed += not row[3]
+            if len(rows) >= batch:
+                catalog.store(rows)
+                rows.clear()
+                rate = done / (time.perf_counter() - t0)
+                print(
+                    f"[info] {done}/{len(jobs)} checked ({rate:.0f} files/s), "
+                    f"{failed} bad"
+                )
+    catalog.store(rows)
+
+    bad = [b for folder in folders for b in catalog.bad(folder)]
+    for path, error in bad:
+        print(f"[warn] Bad image {path}: {error}")
+    if quarantine and bad:
+        moved = []
+        for path, _ in bad:
+            dst = join(quarantine, basename(dirname(path)), basename(path))
+            try:
+                move_file(path, dst)
+                moved.append(path)
+            except OSError as exc:
+                print(f"[err] Could not quarantine {path}: {exc}")
+        catalog.forget(moved)
+        print(f"[info] Moved {len(moved)} bad files to {quarantine}")
+    print(
+        f"[info] Validation done in {time.perf_counter() - t0:.1f} s – "
+        f"{total - len(bad)} ok, {len(bad)} bad"
+    )
+    flush_log()
+
+
+# ─────────────────────────────── original lookup ─────────────────────────────
+class OriginalIndex:
+    """
+    Stem → path map of `originalImageFolder`, built with one `os.scandir`.
+
+    Pairs a mask with its original without any per‑keystroke stat: the
+    mask's stem is tried as‑is, with a configured suffix stripped (e.g.
+    "_mask") and with prefixes mapped (e.g. "mask_" → "img_"), and any
+    extension in `extensions` matches (same extension as the mask first,
+    then the list order).  A miss re‑scans only if the folder's mtime moved.
+    """
+
+    def __init__(self, folder: str, extensions=None, strip_suffixes=(), prefix_map=None):
+        self.folder = folder
+        self.extensions = [
+            e.lower() if e.startswith(".") else "." + e.lower() for e in extensions or ()
+        ]
+        self.strip_suffixes = tuple(strip_suffixes)
+        self.prefix_map = dict(prefix_map or {})
+        self._by_stem = {}  # normcase(stem) -> {ext: path}
+        self._mtime = None
+        self.refresh()
+
+    def refresh(self):
+        """Re‑scan the folder if it changed since the last scan."""
+        try:
+            mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            self._by_stem, self._mtime = {}, None
+            return
+        if mtime == self._mtime:
+            return
+        by_stem = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                stem, ext = os.path.splitext(entry.name)
+                ext = ext.lower()
+                if self.extensions and ext not in self.extensions:
+                    continue
+                if entry.is_file():  # d_type from the listing, no extra stat
+                    by_stem.setdefault(os.path.normcase(stem), {})[ext] = entry.path
+        self._by_stem, self._mtime = by_stem, mtime
+
+    def _stems(self, stem: str):
+        variants = [stem]
+        for suffix in self.strip_suffixes:
+            if suffix and stem.endswith(suffix):
+                variants.append(stem[: -len(suffix)])
+                break
+        for v in list(variants):
+            for src, dst in self.prefix_map.items():
+                if v.startswith(src):
+                    variants.append(dst + v[len(src) :])
+        return variants
+
+    def lookup(self, mask_name: str, rescan: bool = True) -> str:
+        """Path of the original paired with `mask_name`, or ""."""
+        stem, ext = os.path.splitext(mask_name)
+        for s in self._stems(stem):
+            found = self._by_stem.get(os.path.normcase(s))
+            if found:
+                for e in [ext.lower()] + self.extensions + [".png"]:
+                    if e in found:
+                        return found[e]
+                return found[min(found)]
+        if rescan:
+            self.refresh()
+            return self.lookup(mask_name, rescan=False)
+        return ""
+
+
+def make_original_index():
+    """OriginalIndex of `originalImageFolder` as the "original_match" setting asks."""
+    match = settings.get("original_match", {})
+    return OriginalIndex(
+        originalImageFolder,
+        extensions=match.get("extensions"),
+        strip_suffixes=match.get("strip_suffixes", ()),
+        prefix_map=match.get("prefix_map"),
+    )
+
+
+# ─────────────────────────────── mask statistics ─────────────────────────────
+MASK_STATS = ("width", "height", "foreground", "components", "empty", "mismatch")
+
+MASK_ORDERS = {  # "mask_order" → sort value of a mask's statistics, low first
+    "empty_first": lambda s: 0 if s["empty"] else 1,
+    "mismatch_first": lambda s: 0 if s["mismatch"] else 1,
+    "foreground": lambda s: 1 - s["foreground"],  # largest first
+    "foreground_asc": lambda s: s["foreground"],
+    "components": lambda s: -s["components"],  # most fragmented first
+}
+
+_MASK_RULE = re.compile(r"^\s*(\w+)\s*(?:(<=|>=|==|!=|<|>)\s*([-+.\deE]+))?\s*$")
+
+
+def count_components(fg) -> int:
+    """
+    Number of 8‑connected foreground components in a boolean array.
+
+    Works on runs instead of pixels: each row is reduced to its foreground
+    runs, every run is joined to the runs of the next row it touches
+    (diagonals included), and the joins are resolved by a vectorized
+    union–find with pointer jumping.  No Python loop runs per pixel or run.
+    """
+    import numpy as np
+
+    h, w = fg.shape
+    padded = np.zeros((h, w + 2), dtype=np.int8)
+    padded[:, 1:-1] = fg
+    edges = np.diff(padded, axis=1)
+    row, start = np.nonzero(edges == 1)
+    _, end = np.nonzero(edges == -1)  # exclusive, in the same order
+    n = len(start)
+    if not n:
+        return 0
+    # keyed row‑major, the runs of row r + 1 touching [start, end) of row r
+    # are one contiguous slice found by two binary searches
+    k = w + 2
+    below = (row + 1) * k
+    lo = np.searchsorted(row * k + end, below + start, "left")
+    hi = np.searchsorted(row * k + start, below + end, "right")
+    count = np.maximum(hi - lo, 0)
+    a = np.repeat(np.arange(n), count)
+    first = np.repeat(np.cumsum(count) - count, count)  # each a's first pair
+    b = np.repeat(lo, count) + np.arange(len(a)) - first
+    parent = np.arange(n)
+    while len(a):
+        pa, pb = parent[a], parent[b]
+        low = np.minimum(pa, pb)
+        np.minimum.at(parent, pa, low)
+        np.minimum.at(parent, pb, low)
+        while True:  # point every run straight at its root
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+        if np.array_equal(parent[a], parent[b]):
+            break
+    return int(np.count_nonzero(parent == np.arange(n)))
+
+
+def mask_stats(job):
+    """
+    Statistics of one mask – runs in a worker process.
+
+    `job` is (path, size, mtime_ns, original); the result is the catalog
+    row (path, size, mtime_ns, width, height, foreground, components,
+    empty, mismatch, original, error).  Foreground is every non‑zero pixel
+    (alpha > 0 when the mask has transparency) and `foreground` its share
+    of the mask; `mismatch` compares with the original's header size.
+    """
+    path, size, mtime, original = job
+    try:
+        import numpy as np
+        from PIL import Image as PILImage
+
+        PILImage.MAX_IMAGE_PIXELS = None
+        with PILImage.open(path) as im:
+            bands = im.getbands()
+            if "A" in bands:
+                fg = np.asarray(im.getchannel("A")) > 0
+            elif len(bands) == 1:
+                fg = np.asarray(im) != 0
+            else:
+                fg = np.asarray(im).any(axis=2)
+        h, w = fg.shape
+        mismatch = None
+        if original:
+            with PILImage.open(original) as im:
+                mismatch = int(im.size != (w, h))
+        share = np.count_nonzero(fg) / max(1, fg.size)
+        return (path, size, mtime, w, h, share, count_components(fg),
+                int(share == 0), mismatch, original, None)
+    except Exception as exc:  # noqa: BLE001
+        return (path, size, mtime, None, None, None, None, None, None, original,
+                f"{type(exc).__name__}: {exc}")
+
+
+def mask_rule(text: str):
+    """
+    Predicate over a mask's statistics from a rule such as "empty",
+    "mismatch", "foreground < 0.001" or "components > 50".
+    """
+    m = _MASK_RULE.match(text)
+    if m is None or m.group(1) not in MASK_STATS:
+        raise ValueError(f"bad mask rule {text!r} – use one of {', '.join(MASK_STATS)}")
+    col, op, value = m.groups()
+    if op is None:
+        return lambda stats: bool(stats[col])
+    compare = {
+        "<": operator.lt,
+        "<=": operator.le,
+        ">": operator.gt,
+        ">=": operator.ge,
+        "==": operator.eq,
+        "!=": operator.ne,
+    }[op]
+    return lambda stats: stats[col] is not None and compare(stats[col], float(value))
+
+
+def mask_ranks(stats: dict, order: str) -> dict:
+    """Sort prefix per basename (see `FolderIndex.rank`); `stats` is keyed by name."""
+    value = MASK_ORDERS[order]
+    return {
+        name: (round(value(s) * 1e9) + 2**62).to_bytes(8, "big")
+        for name, s in stats.items()
+    }
+
+
+def mask_pass(folder: str, originals, route=None, batch: int = 500):
+    """
+    Mask statistics for every new or changed file in `folder`, computed on
+    a process pool (every core) and kept in the catalog.
+
+    `route` maps rules (see `mask_rule`) to `key_dict` keys: each mask the
+    first matching rule picks is labelled into that key's folder in bulk,
+    so reviewers only see the masks no rule is sure about.
+    """
+    rules = [(mask_rule(rule), key) for rule, key in (route or {}).items()]
+    for _, key in rules:
+        if key not in key_dict:
+            raise ValueError(f"auto_route key {key!r} is not in key_dict")
+    catalog = ImageCatalog(join(state_dir(), "catalog.sqlite"))
+    seen = set()
+    jobs, total = changed_files([folder], catalog.known("masks"), seen)
+    jobs = [(*job, originals.lookup(basename(job[0]), rescan=False)) for job in jobs]
+    print(
+        f"[info] Measuring {len(jobs)} of {total} masks "
+        f"({total - len(jobs)} unchanged since the last pass)"
+    )
+
+    logging.getLogger("PIL").setLevel(logging.INFO)  # Kivy leaves the root at DEBUG
+    t0, rows = time.perf_counter(), []
+    with ProcessPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        for done, row in enumerate(pool.map(mask_stats, jobs, chunksize=16), 1):
+            if row[-1]:
+                print(f"[warn] Could not measure {row[0]}: {row[-1]}")
+            rows.append(row)
+            if len(rows) >= batch:
+                catalog.store(rows, "masks")
+                rows.clear()
+                rate = done / (time.perf_counter() - t0)
+                print(f"[info] {done}/{len(jobs)} measured ({rate:.0f} masks/s)")
+    catalog.store(rows, "masks")
+
+    stats = catalog.masks(folder)
+    gone = [s["path"] for s in stats if s["path"] not in seen]
+    if gone:  # moved out by a reviewer or deleted since an earlier pass
+        catalog.forget(gone)
+        stats = [s for s in stats if s["path"] in seen]
+    print(
+        f"[info] {len(stats)} masks: {sum(bool(s['empty']) for s in stats)} empty, "
+        f"{sum(bool(s['mismatch']) for s in stats)} sized unlike their original, "
+        f"{sum(not s['original'] for s in stats)} without an original"
+    )
+    if rules:
+        routed = {}
+        # in manifest mode routed masks stay put – leave any decision made
+        # for them (by a reviewer or an earlier run) alone
+        done = {basename(p) for p in manifest.labelled()} if manifest else set()
+        for s in stats:
+            if basename(s["path"]) in done:
+                continue
+            key = next((key for rule, key in rules if rule(s)), None)
+            if key is not None:
+                label_file(s["path"], join(key_dict[key], basename(s["path"])))
+                routed.setdefault(key, []).append(s["path"])
+        move_queue.flush()
+        if manifest is None:  # moved – measured again wherever they are next
+            catalog.forget([p for paths in routed.values() for p in paths])
+        for key, paths in routed.items():
+            print(f"[info] Routed {len(paths)} masks to {key_dict[key]} ({key})")
+    print(f"[info] Mask statistics done in {time.perf_counter() - t0:.1f} s")
+    flush_log()
+
+
+# ─────────────────────────────── prefetch ────────────────────────────────────
+@metrics.timed("decode")
+def decode_image(path: str):
+    """Decode `path` to CPU‑side image data – safe to call off the UI thread."""
+    path = move_engine.where(path)  # moved aside by a name clash
+    if is_member(path):
+        ext = path.rsplit(".", 1)[-1].lower()
+        data = BytesIO(archives.read(path))
+        return CoreImage(
+            data, ext=ext, filename=path, keep_data=True, nocache=True
+        ).image
+    if is_large(path):  # header read here, off the UI thread – shown tiled instead
+        return None
+    return ImageLoader.load(path, keep_data=True, nocache=True)
+
+
+class Prefetcher:
+    """
+    Look‑ahead window of images decoded on a small thread pool.
+
+    `schedule()` names the paths that should be ready (visible cells first,
+    then the next N); anything outside the window is cancelled or dropped.
+    `get()` hands back the decoded data, so showing an upcoming image is a
+    texture upload rather than a decode on the UI thread.
+    """
+
+    def __init__(self, window: int = 3, workers: int = 2):
+        self.window = max(0, window)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers),
+                                        thread_name_prefix="prefetch")
+        self._futures = {}  # path -> Future[image data]
+
+    def schedule(self, visible, ahead):
+        """Keep `visible` and the first `window` of `ahead`; cancel the rest."""
+        wanted = [p for p in visible if p]
+        wanted += [p for p in ahead if p][: self.window]
+        keep = set(wanted)
+        for path in [p for p in self._futures if p not in keep]:
+            self._futures.pop(path).cancel()
+        for path in wanted:
+            if path not in self._futures:
+                self._futures[path] = self._pool.submit(decode_image, path)
+
+    def cancel(self):
+        """Drop the whole window (user undid or redid)."""
+        for fut in self._futures.values():
+            fut.cancel()
+        self._futures.clear()
+
+    def get(self, path: str):
+        """Decoded data for `path`; waits if in flight, decodes inline if absent."""
+        fut = self._futures.get(path)
+        if fut is None or fut.cancelled():
+            fut = self._futures[path] = Future()
+            try:
+                fut.set_result(decode_image(path))
+            except Exception as e:  # noqa: BLE001
+                fut.set_exception(e)
+        return fut.result()
+
+    def ready(self, path: str):
+        """Decoded data for `path` once it has finished, else None – never waits."""
+        fut = self._futures.get(path)
+        if fut is None or not fut.done() or fut.cancelled():
+            return None
+        if fut.exception() is not None:
+            return None
+        return fut.result()
+
+    @property
+    def inflight(self) -> int:
+        return sum(not f.done() for f in list(self._futures.values()))
+
+    def shutdown(self):
+        self.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+prefetcher = None  # see configure()
+metrics.gauge("prefetch_inflight", lambda: prefetcher.inflight)
+
+
+class TextureCache:
+    """
+    Byte‑budgeted LRU of GPU textures, keyed by path and validated by mtime.
+
+    Shared by every pane, so an image that rotates Next → Current → Previous
+    (or comes back through undo / redo) is decoded and uploaded only once.
+    A path whose file has been moved away still hits until it is evicted;
+    `rename()` lets the cache follow a move.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget = budget_bytes
+        self.used = 0
+        self._entries = OrderedDict()  # path -> (mtime_ns, texture, nbytes)
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, path: str, mtime):
+        """Cached texture for `path`, or None (`mtime` None = file not on disk)."""
+        entry = self._entries.get(path)
+        if entry is not None and mtime is not None and entry[0] != mtime:
+            self._drop(path)  # file changed on disk
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(path)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, path: str, mtime, texture):
+        if path in self._entries:
+            self._drop(path)
+        nbytes = texture.width * texture.height * 4
+        if nbytes > self.budget:
+            return
+        self._entries[path] = (mtime, texture, nbytes)
+        self.used += nbytes
+        while self.used > self.budget:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def rename(self, src: str, dst: str):
+        """Re‑key the entry for `src` after the file was moved to `dst`."""
+        entry = self._entries.pop(src, None)
+        if entry is not None:
+            self._entries.pop(dst, None)
+            self._entries[dst] = entry
+
+    def _drop(self, path: str):
+        self.used -= self._entries.pop(path)[2]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return 100.0 * self.hits / total if total else 0.0
+
+    def stats(self) -> str:
+        rate = self.hit_rate
+        return (
+            f"hits={self.hits} misses={self.misses} evictions={self.evictions} "
+            f"hit‑rate={rate:.1f}% used={self.used / 2**20:.0f}/{self.budget / 2**20:.0f} MiB"
+        )
+
+
+texture_cache = None  # see configure()
+metrics.gauge("texture_cache_hit_rate", lambda: texture_cache.hit_rate)
+metrics.gauge("texture_cache_mb", lambda: texture_cache.used / 2**20)
+
+
+# ─────────────────────────────── previews ────────────────────────────────────
+def file_digest(path: str) -> str:
+    """Content hash of `path` (BLAKE2b‑128, streamed)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class PreviewStore:
+    """
+    Optional on‑disk cache of downscaled renditions (a small preview pyramid).
+
+    Each source file is identified by a content hash and gets one rendition
+    per entry of `sides` (longest edge in px), stored as <hash>_<side>.<ext>.
+    The (basename, size, mtime) → hash memo is appended to `index.jsonl` in
+    the same folder, so finding a rendition costs one stat and no read.
+    Missing renditions are made lazily on a background thread, or in bulk
+    with `--build-previews`.  Needs Pillow.
+    """
+
+    INDEX = "index.jsonl"
+
+    def __init__(self, folder: str, sides=(1024, 384), workers: int = 1):
+        self.folder = folder
+        self.sides = sorted(int(s) for s in sides)
+        os.makedirs(folder, exist_ok=True)
+        self._memo = {}   # (basename, size, mtime_ns) -> (hash, w, h, ext)
+        self._last = {}   # path -> memo value, for files moved away since
+        self._files = set(os.listdir(folder))  # rendition names on disk
+        self._busy = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers),
+                                        thread_name_prefix="preview")
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(join(self.folder, self.INDEX), encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        r = json.loads(line)
+                        self._memo[(r["n"], r["s"], r["m"])] = (r["h"], r["w"], r["ht"], r["e"])
+                    except (ValueError, KeyError):
+                        continue  # torn last line after a crash
+        except FileNotFoundError:
+            pass
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memo[key] = value
+            with open(join(self.folder, self.INDEX), "a", encoding="utf-8") as fh:
+                fh.write(json.dumps({"n": key[0], "s": key[1], "m": key[2], "h": value[0],
+                                     "w": value[1], "ht": value[2], "e": value[3]}) + "\n")
+
+    def resolve(self, path: str, st, max_side: int) -> str:
+        """
+        File to decode for `path` shown in a pane `max_side` px across.
+
+        `st` is `os.stat(path)` (None if the file is gone).  Falls back to
+        `path` itself – and queues the rendition – when none is ready yet.
+        """
+        if st is None:
+            value = self._last.get(path)
+        else:
+            value = self._memo.get((basename(path), st.st_size, st.st_mtime_ns))
+        if value is None:
+            if st is not None:
+                self._submit(path)
+            return path
+        self._last[path] = value
+        digest, w, h, ext = value
+        side = next((s for s in self.sides if s >= max_side), None)
+        if side is None or max(w, h) <= side:
+            return path  # pane needs full resolution, or the source is small
+        name = f"{digest}_{side}.{ext}"
+        with self._lock:
+            ready = name in self._files
+        if ready:
+            return join(self.folder, name)
+        if st is not None:
+            self._submit(path)
+        return path
+
+    def _submit(self, path: str):
+        with self._lock:
+            if path in self._busy:
+                return
+            self._busy.add(path)
+        fut = self._pool.submit(self.build, path)
+        fut.add_done_callback(lambda _f, p=path: self._release(p))
+
+    def _release(self, path: str):
+        with self._lock:  # runs on the pool thread
+            self._busy.discard(path)
 
-kivy.require("1.10.1")
+    def build(self, path: str) -> bool:
+        """Hash `path` and write its missing renditions; False on failure."""
+        from PIL import Image as PILImage  # optional dependency
 
+        try:
+            st = os.stat(path)
+            key = (basename(path), st.st_size, st.st_mtime_ns)
+            value = self._memo.get(key)
+            digest = value[0] if value else file_digest(path)
+            with PILImage.open(path) as im:
+                w, h = im.size
+                if im.mode in ("RGB", "L", "CMYK", "YCbCr"):
+                    ext = "jpg"
+                    if im.mode != "L":
+                        im = im.convert("RGB")
+                else:
+                    ext = "png"
+                    if im.mode not in ("1", "LA", "P", "RGBA"):
+                        im = im.convert("RGBA")
+                if value is None:
+                    self._remember(key, (digest, w, h, ext))
+                # largest first: each thumbnail() shrinks the previous level
+                for side in reversed(self.sides):
+                    name = f"{digest}_{side}.{ext}"
+                    with self._lock:
+                        have = name in self._files
+                    if max(w, h) <= side or have:
+                        continue
+                    im.thumbnail((side, side))
+                    tmp = join(self.folder, name + ".tmp")
+                    im.save(tmp, format="JPEG" if ext == "jpg" else "PNG", quality=90)
+                    os.replace(tmp, join(self.folder, name))
+                    with self._lock:
+                        self._files.add(name)
+            return True
+        except Exception as e:  # noqa: BLE001
+            print(f"[warn] Could not build preview for {path}: {e}")
+            return False
 
-# ─────────────────────────────── configuration ──────────────────────────────
-def load_config():
-    """Prompt for a JSON config and return (source, original, key_dict)."""
-    root = Tk()
-    root.withdraw()
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
 
-    # Try to set a window icon – best‑effort
+
+def make_preview_store():
+    """PreviewStore from the "preview_dir" setting, or None when disabled."""
+    folder = settings.get("preview_dir")
+    if not folder:
+        return None
     try:
-        if os.name == "nt":
-            icon_path = "app.ico"
-            root.iconbitmap(icon_path)
-            root.tk.call("wm", "iconbitmap", root._w, "-default", icon_path)
-        elif sys.platform == "darwin":
-            from PIL import Image as PILImage
-            from PIL import ImageTk
+        import PIL  # noqa: F401
+    except ImportError:
+        print("[warn] preview_dir is set but Pillow is not installed – previews disabled")
+        return None
+    return PreviewStore(folder, settings.get("preview_sides", (1024, 384)),
+                        int(settings.get("preview_workers", 1)))
 
-            icon_img = PILImage.open("icon.png")
-            root.iconphoto(True, ImageTk.PhotoImage(icon_img))
-    except Exception as e:  # noqa: BLE001
-        print(f"[warn] Could not set icon: {e}")
 
-    cfg_path = filedialog.askopenfilename(
-        title="Select JSON file",
-        filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
-    )
-    if not cfg_path:
-        print("No config file selected – exiting.")
+previews = None  # PreviewStore when "preview_dir" is set – see configure()
+
+
+def build_previews(folders):
+    """Bulk pre‑build renditions for every file in `folders` (all cores)."""
+    if previews is None:
+        print("[err] set \"preview_dir\" in the config and install Pillow first")
         sys.exit(1)
+    files = []
+    for folder in folders:
+        with os.scandir(folder) as entries:
+            files += [e.path for e in entries if e.is_file()]
+    print(f"[info] building previews for {len(files)} files → {previews.folder}")
+    failed = 0
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        # Pillow and hashlib release the GIL, so threads use every core
+        for done, ok in enumerate(pool.map(previews.build, files), 1):
+            failed += not ok
+            if done % 1000 == 0:
+                print(f"[info] {done}/{len(files)}")
+    print(f"[info] previews done – {len(files) - failed} ok, {failed} failed")
 
+
+def display_path(path: str, max_side: int = 0, probe: bool = True) -> str:
+    """
+    File actually decoded for `path` in a pane `max_side` px across.
+
+    "" when that would be a large original – those are shown tiled.  With
+    `probe=False` (look‑ahead on the UI thread) an image whose header was
+    not read yet counts as small; the prefetch worker reads it instead.
+    """
+    if previews and max_side and path:
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        path = previews.resolve(path, st, max_side)
+    return "" if is_large(path, probe) else path
+
+
+def load_texture(path: str, max_side: int = 0):
+    """
+    GPU texture for `path` shown in a pane `max_side` px across (0 = full
+    size): texture cache first, then the prefetch window.
+    """
+    if not path:
+        return None
     try:
-        with open(cfg_path, "r", encoding="utf‑8") as fh:
-            cfg = json.load(fh)
-        return cfg["sourceImageFolder"], cfg["originalImageFolder"], cfg["key_dict"]
+        st = os.stat(path)
+    except OSError:
+        st = None
+    mtime = st.st_mtime_ns if st else None
+    if previews and max_side:
+        path = previews.resolve(path, st, max_side)
+    if is_large(path):
+        return None  # see TiledView
+    texture = texture_cache.get(path, mtime)
+    if texture is not None:
+        return texture
+    try:
+        data = prefetcher.get(path)
+        with metrics.span("upload"):
+            texture = CoreImage(data).texture
     except Exception as e:  # noqa: BLE001
-        print(f"[err] Failed to load config: {e}")
-        sys.exit(1)
+        log(f"[warn] Could not load {path}: {e}")
+        return None
+    texture_cache.put(path, mtime, texture)
+    return texture
 
 
-sourceImageFolder, originalImageFolder, key_dict = load_config()
+# ─────────────────────────────── tiled rendering ─────────────────────────────
+_headers = OrderedDict()  # path → (width, height, mode, size, mtime_ns), LRU first
+_headers_lock = threading.Lock()
+HEADERS_KEPT = 50_000
 
-# ─────────────────────────────── helpers ─────────────────────────────────────
-def move_file(src: str, dst: str):
-    """Move `src` to `dst`, creating parent dirs if needed."""
-    print("move:", src, "→", dst)
-    os.makedirs(dirname(dst), exist_ok=True)
-    shutil.move(src, dst)
+
+def image_info(path: str, probe: bool = True):
+    """
+    (width, height, mode, size, mtime_ns) of `path` from its header, or None.
+
+    Nothing is decoded.  Results are remembered while the file's size and
+    mtime still match, and for a file moved away since, so it still
+    resolves to its tiles.  `probe=False` never touches the disk: only what
+    is remembered.
+    """
+    if is_member(path):
+        return None  # archive members are never tiled
+    with _headers_lock:
+        info = _headers.get(path)
+        if info is not None:
+            _headers.move_to_end(path)
+    if not probe:
+        return info
+    try:
+        st = os.stat(path)
+    except OSError:
+        return info  # gone – moved into a class folder, most likely
+    if info is not None and info[3:] == (st.st_size, st.st_mtime_ns):
+        return info
+    try:
+        from PIL import Image as PILImage
+
+        with PILImage.open(path) as im:
+            info = (*im.size, im.mode, st.st_size, st.st_mtime_ns)
+    except Exception:  # noqa: BLE001 – no Pillow, not an image
+        return None
+    with _headers_lock:
+        _headers[path] = info
+        if len(_headers) > HEADERS_KEPT:
+            _headers.popitem(last=False)
+    return info
+
+
+def is_large(path: str, probe: bool = True) -> bool:
+    """True if `path` is too large for one texture and is shown tiled instead."""
+    info = image_info(path, probe) if path else None
+    return (
+        info is not None
+        and max(info[:2]) > int(settings.get("tile_above", 8192))
+        and path not in TilePyramid.failed
+    )
+
+
+class TilePyramid:
+    """
+    On‑disk tile pyramid of one large image.
+
+    Level 0 is full resolution and every next level halves it, down to one
+    that fits in a single tile.  Tiles live in <tile_dir>/<key>/<level>/ as
+    <col>_<row>.<ext>; the key comes from (basename, size, mtime), so the
+    pyramid follows a file into its class folder.  The first view queues a
+    build on a background thread: one decode, then the coarsest level is
+    written first so an overview shows up early.  A file whose build fails
+    is shown as a plain image from then on.
+    """
+
+    _queue = None  # pyramids waiting for the builder thread
+    _queued = set()  # their folders
+    failed = set()  # paths whose build raised (corrupt, truncated, disk full)
+
+    def __init__(self, path: str, tile: int = 512):
+        w, h, mode, size, mtime = image_info(path)
+        key = hashlib.blake2b(
+            f"{basename(path)}|{size}|{mtime}".encode(), digest_size=12
+        ).hexdigest()
+        self.path, self.tile = path, tile
+        self.folder = join(settings.get("tile_dir") or join(state_dir(), "tiles"), key)
+        self.ext = "jpg" if mode in ("RGB", "L", "CMYK", "YCbCr") else "png"
+        self.levels = [(w, h)]
+        while max(self.levels[-1]) > tile:
+            w, h = self.levels[-1]
+            self.levels.append(((w + 1) // 2, (h + 1) // 2))
+
+    def tile_path(self, level: int, col: int, row: int) -> str:
+        return join(self.folder, str(level), f"{col}_{row}.{self.ext}")
+
+    def grid(self, level: int):
+        """(columns, rows) of tiles at `level`."""
+        w, h = self.levels[level]
+        return -(-w // self.tile), -(-h // self.tile)
+
+    def ensure(self):
+        """Queue a build unless the pyramid is complete, already queued or failed."""
+        if (
+            self.folder in self._queued
+            or self.path in self.failed
+            or os.path.exists(join(self.folder, "done"))
+        ):
+            return
+        if TilePyramid._queue is None:
+            TilePyramid._queue = queue.Queue()
+            threading.Thread(target=self._builder, name="tiles", daemon=True).start()
+        self._queued.add(self.folder)
+        self._queue.put(self)
+
+    @classmethod
+    def _builder(cls):
+        while True:
+            pyramid = cls._queue.get()
+            try:
+                pyramid.build()
+            finally:
+                cls._queued.discard(pyramid.folder)
+
+    def pending(self) -> bool:
+        """True while tiles may still appear: the build is queued / running or done."""
+        return self.folder in self._queued or os.path.exists(join(self.folder, "done"))
+
+    def build(self):
+        """Decode the image once and write every missing tile, coarse to fine."""
+        from PIL import Image as PILImage
+
+        PILImage.MAX_IMAGE_PIXELS = None  # large is the point here
+        fmt = "JPEG" if self.ext == "jpg" else "PNG"
+        try:
+            with metrics.span("tile_build"), PILImage.open(self.path) as im:
+                if self.ext == "jpg":
+                    mode = "L" if im.mode == "L" else "RGB"
+                else:
+                    mode = "RGBA"
+                levels = [im.convert(mode) if im.mode != mode else im]
+                for size in self.levels[1:]:
+                    levels.append(levels[-1].resize(size, PILImage.BOX))
+                for level in reversed(range(len(levels))):
+                    os.makedirs(join(self.folder, str(level)), exist_ok=True)
+                    cols, rows = self.grid(level)
+                    w, h = self.levels[level]
+                    for row in range(rows):
+                        for col in range(cols):
+                            dst = self.tile_path(level, col, row)
+                            if os.path.exists(dst):  # left by an interrupted build
+                                continue
+                            x, y = col * self.tile, row * self.tile
+                            box = (x, y, min(x + self.tile, w), min(y + self.tile, h))
+                            part = levels[level].crop(box)
+                            part.save(dst + ".tmp", format=fmt, quality=90)
+                            os.replace(dst + ".tmp", dst)
+            with open(join(self.folder, "done"), "w", encoding="utf-8") as fh:
+                fh.write(self.path)
+        except Exception as exc:  # noqa: BLE001
+            print(f"[warn] Could not build tiles for {self.path}: {exc}")
+            self.failed.add(self.path)
+
+
+tile_cache = None  # TextureCache of uploaded tiles – see configure()
+metrics.gauge("tile_cache_mb", lambda: tile_cache.used / 2**20)
+
+
+# ─────────────────────────────── mask overlay ────────────────────────────────
+def blend_mask(mask: str, original: str, side: int = 2048, alpha: float = 0.5,
+               color=(255, 0, 0)):
+    """
+    (width, height, RGB bytes) of `mask` alpha‑blended over `original`.
+
+    Both are reduced to at most `side` px first (JPEG draft decode where
+    possible), so a 4K pair costs a few tens of ms off the UI thread.
+    Labelled pixels of an RGB mask keep their own colour; a single‑channel
+    mask is drawn in `color`.  NumPy does the blend when installed, Pillow's
+    composite otherwise.
+    """
+    from PIL import Image as PILImage
+
+    PILImage.MAX_IMAGE_PIXELS = None
+    alpha = min(max(alpha, 0.0), 1.0)
+    with PILImage.open(original) as im:
+        im.draft("RGB", (side, side))
+        base = im.convert("RGB")
+    base.thumbnail((side, side), PILImage.BOX)
+    with PILImage.open(source_open(mask)) as im:
+        bands = im.getbands()
+        # nearest keeps class colours exact
+        m = im.resize(base.size, PILImage.NEAREST)
+    if "A" in bands:
+        picked = m.getchannel("A")
+    else:
+        picked = m.convert("L")
+    single = len(bands) == 1
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is not None:
+        # 8‑bit fixed point: out = base + (layer - base) · alpha on the mask
+        b = np.asarray(base, dtype=np.int16)
+        if single:
+            layer = np.asarray(color, dtype=np.int16)
+        else:
+            layer = np.asarray(m.convert("RGB"), dtype=np.int16)
+        w = (np.asarray(picked) > 0)[..., None] * np.int16(round(alpha * 128))
+        out = (b + ((layer - b) * w >> 7)).astype(np.uint8)
+        return base.width, base.height, out.tobytes()
+    weight = picked.point(lambda v: int(255 * alpha) if v else 0)
+    if single:
+        layer = PILImage.new("RGB", base.size, tuple(color))
+    else:
+        layer = m.convert("RGB")
+    out = PILImage.composite(layer, base, weight)
+    return base.width, base.height, out.tobytes()
+
+
+class MaskBlender:
+    """
+    Mask‑over‑original blends for the Original cell.
+
+    Blends are made by `blend_mask` on one background thread and kept, as
+    textures, in `texture_cache` under a key made of both paths and both
+    mtimes – so each pair is blended once while it stays cached, and an
+    edited mask or original is blended afresh.
+    """
+
+    def __init__(self, side: int = 2048, alpha: float = 0.5, color=(255, 0, 0)):
+        self.side, self.alpha, self.color = side, alpha, color
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="blend")
+        self._futures = {}  # key → Future of (width, height, bytes)
+
+    def texture(self, mask: str, original: str):
+        """The blended texture if it is ready, else None (and it is queued)."""
+        key = f"{mask}\n{original}"
+        try:
+            mask_ns = 0 if is_member(mask) else os.stat(mask).st_mtime_ns
+            stamp = (mask_ns, os.stat(original).st_mtime_ns)
+        except OSError:
+            return None
+        texture = texture_cache.get(key, stamp)
+        if texture is not None:
+            return texture
+        fut = self._futures.get(key)
+        if fut is None:
+            self._futures[key] = self._pool.submit(self._blend, mask, original)
+            return None
+        if not fut.done():
+            return None
+        del self._futures[key]
+        try:
+            w, h, data = fut.result()
+        except Exception as exc:  # noqa: BLE001
+            print(f"[warn] Could not blend {mask} over {original}: {exc}")
+            return None
+        with metrics.span("upload"):
+            texture = Texture.create(size=(w, h), colorfmt="rgb")
+            texture.blit_buffer(data, colorfmt="rgb", bufferfmt="ubyte")
+            texture.flip_vertical()
+        texture_cache.put(key, stamp, texture)
+        return texture
+
+    def pending(self, mask: str, original: str) -> bool:
+        """True while the blend of this pair is still being made."""
+        return f"{mask}\n{original}" in self._futures
+
+    def _blend(self, mask: str, original: str):
+        with metrics.span("blend"):
+            return blend_mask(mask, original, self.side, self.alpha, self.color)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+blender = None  # MaskBlender for the overlay view – see configure()
 
 
 # ─────────────────────────────── UI widgets ──────────────────────────────────
+class TiledView(StencilView):
+    """
+    Shows one large image from its TilePyramid.
+
+    Only the tiles visible at the current zoom and pan are decoded (on a
+    small pool of the view's own) and uploaded (into `tile_cache`); the
+    coarsest level is always drawn underneath, so nothing shows holes while
+    finer tiles arrive.  Wheel zooms around the pointer, drag pans,
+    double‑click fits the image again; each of these fires `on_view`.  If
+    the pyramid cannot be built it fires `on_failed` instead of retrying.
+    """
+
+    def __init__(self, **kwargs):
+        self.register_event_type("on_view")
+        self.register_event_type("on_failed")
+        super().__init__(**kwargs)
+        self.source = ""
+        self.pyramid = None
+        self.scale = 1.0  # screen px per image px
+        self.cx = self.cy = 0.0  # image point at the centre of the view
+        workers = int(settings.get("tile_workers", 2))
+        self._loader = Prefetcher(window=0, workers=workers)
+        self._retry = Clock.create_trigger(self.redraw, 0.05)
+        self.bind(pos=self.redraw, size=self.fit)
+
+    def set_source(self, src: str):
+        if src == self.source:
+            return
+        self.source = src
+        self._loader.cancel()
+        self.pyramid = TilePyramid(src) if is_large(src) else None
+        if self.pyramid is not None:
+            self.pyramid.ensure()
+        self.fit()
+
+    def fit(self, *_):
+        if self.pyramid is not None:
+            w, h = self.pyramid.levels[0]
+            self.scale = min(self.width / w, self.height / h) or 1.0
+            self.cx, self.cy = w / 2, h / 2
+        self.redraw()
+
+    def zoom_at(self, pos, factor: float):
+        """Zoom by `factor`, keeping the image point under `pos` in place."""
+        dx, dy = pos[0] - self.center_x, pos[1] - self.center_y
+        ix, iy = self.cx + dx / self.scale, self.cy - dy / self.scale
+        w, h = self.pyramid.levels[0]
+        fit = min(self.width / w, self.height / h)
+        self.scale = min(max(self.scale * factor, fit / 2), 4.0)
+        self.cx, self.cy = ix - dx / self.scale, iy + dy / self.scale
+        self.redraw()
+
+    def view(self):
+        """(zoom over fit, u, v): the image point at the centre, as fractions."""
+        w, h = self.pyramid.levels[0]
+        fit = min(self.width / w, self.height / h) or 1.0
+        return self.scale / fit, self.cx / w, self.cy / h
+
+    def set_view(self, zoom: float, u: float, v: float):
+        w, h = self.pyramid.levels[0]
+        fit = min(self.width / w, self.height / h) or 1.0
+        self.scale, self.cx, self.cy = fit * zoom, u * w, v * h
+        self.redraw()
+
+    def on_view(self, *view):
+        pass
+
+    def on_failed(self):
+        pass
+
+    @metrics.timed("tiles_draw")
+    def redraw(self, *_):
+        self.canvas.clear()
+        p = self.pyramid
+        if p is None:
+            return
+        top, level = len(p.levels) - 1, 0
+        while level < top and 2 ** (level + 1) * self.scale <= 1:
+            level += 1  # coarsest level that still has a texel per screen px
+        half_w, half_h = self.width / 2 / self.scale, self.height / 2 / self.scale
+        wanted, missing = [], False
+        with self.canvas:
+            Color(1, 1, 1, 1)
+            for lv in sorted({top, level}, reverse=True):
+                f = 2**lv  # image px per texel at this level
+                span = p.tile * f
+                cols, rows = p.grid(lv)
+                row0 = max(0, int((self.cy - half_h) // span))
+                row1 = min(rows, int((self.cy + half_h) // span) + 1)
+                col0 = max(0, int((self.cx - half_w) // span))
+                col1 = min(cols, int((self.cx + half_w) // span) + 1)
+                for row in range(row0, row1):
+                    for col in range(col0, col1):
+                        tex = self._texture(p.tile_path(lv, col, row), wanted)
+                        if tex is None:
+                            missing = True
+                            continue
+                        w, h = tex.width * f * self.scale, tex.height * f * self.scale
+                        x = self.center_x + (col * span - self.cx) * self.scale
+                        y = self.center_y - (row * span - self.cy) * self.scale - h
+                        Rectangle(texture=tex, pos=(x, y), size=(w, h))
+        self._loader.schedule([t for t in wanted if os.path.exists(t)], [])
+        if missing and p.pending():
+            self._retry()
+        elif missing and p.path in p.failed:
+            self.dispatch("on_failed")
+
+    def _texture(self, path: str, wanted: list):
+        texture = tile_cache.get(path, None)
+        if texture is None:
+            data = self._loader.ready(path)
+            if data is None:
+                wanted.append(path)
+                return None
+            with metrics.span("upload"):
+                texture = CoreImage(data).texture
+            tile_cache.put(path, None, texture)
+        return texture
+
+    def on_touch_down(self, touch):
+        if self.pyramid is None or not self.collide_point(*touch.pos):
+            return super().on_touch_down(touch)
+        if touch.is_mouse_scrolling:
+            self.zoom_at(touch.pos, 1.25 if touch.button == "scrolldown" else 0.8)
+        elif touch.is_double_tap:
+            self.fit()
+        else:
+            touch.grab(self)
+            return True
+        self.dispatch("on_view", *self.view())
+        return True
+
+    def on_touch_move(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_move(touch)
+        self.cx -= touch.dx / self.scale
+        self.cy += touch.dy / self.scale
+        self.redraw()
+        self.dispatch("on_view", *self.view())
+        return True
+
+    def on_touch_up(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_up(touch)
+        touch.ungrab(self)
+        return True
+
+
 class ImageCell(FloatLayout):
-    """One quadrant: image + lower caption + (opt.) counter label."""
+    """
+    One quadrant: image + lower caption + (opt.) counter label.
+
+    The image can be zoomed (wheel, around the pointer) and panned (drag);
+    double‑click fits it again.  The view is (zoom over fit, u, v) with u, v
+    the image point at the centre as fractions of its width and height – the
+    same for a preview, the full image or its tiles, so two cells showing
+    different files of one scene can follow each other via `on_view`.
+    """
 
     def __init__(self, **kwargs):
+        self.register_event_type("on_view")
         super().__init__(**kwargs)
-        # main image
-        self.image = Image(
-            allow_stretch=True,
-            keep_ratio=True,
+        self.zoom, self.u, self.v = 1.0, 0.5, 0.5
+
+        # main image, clipped to its viewport while zoomed
+        self.viewport = StencilView(
             size_hint=(0.85, 0.85),
             pos_hint={"center_x": 0.5, "center_y": 0.5},
         )
+        self.image = Image(allow_stretch=True, keep_ratio=True, size_hint=(None, None))
         self.image.color = (0.961, 0.961, 0.961, 1)
-        self.add_widget(self.image)
+        self.source = ""
+        self.viewport.add_widget(self.image)
+        self.viewport.bind(pos=self._place, size=self._place)
+        self.image.bind(texture=self._place)
+        self.add_widget(self.viewport)
+
+        # very large images are drawn tile by tile here instead
+        self.tiles = TiledView(
+            size_hint=(0.85, 0.85),
+            pos_hint={"center_x": 0.5, "center_y": 0.5},
+        )
+        self.tiles.bind(on_view=lambda _view, *view: self.dispatch("on_view", *view))
+        # a file whose tiles cannot be built is shown as a plain image after all
+        self.tiles.bind(on_failed=lambda _view: self.set_image(self.source))
+        self.add_widget(self.tiles)
 
         # caption
         self.label = Label(
@@ -152,11 +3233,121 @@ class ImageCell(FloatLayout):
             bold=True,
             font_size="12sp",
         )
+        self.counter_label.bind(
+            texture_size=lambda lbl, ts: setattr(lbl, "width", max(60, ts[0] + 10))
+        )
         self.add_widget(self.counter_label)
 
     # Convenience setters
-    def set_image(self, src: str):
-        self.image.source = src
+    def set_image(self, src: str, texture=None):
+        """
+        Show `src` – or `texture` in its place, e.g. a blend made from it.
+
+        A new `src` starts fitted; the same one with another texture keeps
+        the current view.
+        """
+        # texture is assigned directly so decoding can happen ahead of time
+        if src != self.source:
+            self.zoom, self.u, self.v = 1.0, 0.5, 0.5
+        self.source = src
+        side = self.preview_side()
+        tiled = texture is None and bool(src) and not display_path(src, side)
+        self.tiles.set_source(src if tiled else "")
+        self.image.opacity = 0 if tiled else 1
+        if tiled:
+            self.image.texture = None
+        else:
+            self.image.texture = texture or load_texture(src, side)
+
+    # ---------------------------- zoom / pan ----------------------------
+    def view(self):
+        if self.tiles.pyramid is not None:
+            return self.tiles.view()
+        return self.zoom, self.u, self.v
+
+    def set_view(self, zoom: float, u: float, v: float):
+        """Show the image point (u, v) at the centre, at `zoom` × fit."""
+        self.zoom, self.u, self.v = zoom, u, v
+        if self.tiles.pyramid is not None:
+            self.tiles.set_view(zoom, u, v)
+        else:
+            self._place()
+
+    def _fitted(self):
+        """Size of the image fitted into the viewport, or None."""
+        tex = self.image.texture
+        if tex is None or not tex.width or not tex.height:
+            return None
+        vp = self.viewport
+        fit = min(vp.width / tex.width, vp.height / tex.height)
+        return tex.width * fit, tex.height * fit
+
+    def _place(self, *_):
+        fitted = self._fitted()
+        if fitted is None:
+            return
+        w, h = fitted[0] * self.zoom, fitted[1] * self.zoom
+        self.image.size = (w, h)
+        self.image.pos = (
+            self.viewport.center_x - self.u * w,
+            self.viewport.center_y + self.v * h - h,
+        )
+
+    def zoom_at(self, pos, factor: float):
+        """Zoom by `factor`, keeping the image point under `pos` in place."""
+        fw, fh = self._fitted()
+        dx = pos[0] - self.viewport.center_x
+        dy = pos[1] - self.viewport.center_y
+        u = self.u + dx / (fw * self.zoom)
+        v = self.v - dy / (fh * self.zoom)
+        self.zoom = min(max(self.zoom * factor, 0.5), 32.0)
+        self.u, self.v = u - dx / (fw * self.zoom), v + dy / (fh * self.zoom)
+        self._place()
+
+    def on_touch_down(self, touch):
+        if (
+            self.tiles.pyramid is not None
+            or self._fitted() is None
+            or not self.viewport.collide_point(*touch.pos)
+        ):
+            return super().on_touch_down(touch)
+        if touch.is_mouse_scrolling:
+            self.zoom_at(touch.pos, 1.25 if touch.button == "scrolldown" else 0.8)
+        elif touch.is_double_tap:
+            self.set_view(1.0, 0.5, 0.5)
+        else:
+            touch.grab(self)
+            return True
+        self.dispatch("on_view", *self.view())
+        return True
+
+    def on_touch_move(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_move(touch)
+        if self._fitted() is None:  # image replaced mid‑drag
+            return True
+        fw, fh = self._fitted()
+        self.u -= touch.dx / (fw * self.zoom)
+        self.v += touch.dy / (fh * self.zoom)
+        self._place()
+        self.dispatch("on_view", *self.view())
+        return True
+
+    def on_touch_up(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_up(touch)
+        touch.ungrab(self)
+        return True
+
+    def on_view(self, *view):
+        pass
+
+    @staticmethod
+    def preview_side() -> int:
+        """Approximate on‑screen size of one quadrant, for preview selection."""
+        from kivy.core.window import Window
+
+        return int(max(Window.size) / 2)
 
     def set_label(self, txt: str):
         self.label.text = txt
@@ -169,55 +3360,84 @@ class PicturesFrame(GridLayout):
     imageList = ListProperty()  # kept for compatibility
 
     # --------------- iterator helpers ----------------------------------
-    def _lex_files(self):
-        """Natural‑sort the files (…1, …2, …10) – case‑insensitive."""
-        files = [p for p in glob(join(sourceImageFolder, "*")) if os.path.isfile(p)]
-
-        def natkey(path):
-            name = os.path.basename(path)
-            # split into digit and non‑digit chunks, turn digits into ints
-            return [int(t) if t.isdigit() else t.lower() for t in re.split(r"(\d+)", name)]
-
-        files.sort(key=natkey)
-        return files
-
+    @metrics.timed("iter_after")
     def _build_iter_after(self, basename_or_none):
         """
         Rebuild the iterator `self.nextNameIter` so that it yields filenames
         **after** `basename_or_none` in lexicographic order.
-        """
-        files = self._lex_files()
-
-        basenames = [os.path.basename(f) for f in files]
-        if basename_or_none in basenames:
-            start_idx = basenames.index(basename_or_none) + 1
-        else:
-            start_idx = 0
 
-        self.nextNameIter = iter(basenames[start_idx:])
-        self._basenames_lex = basenames
+        Positions against the in‑memory `FolderIndex`; the folder itself is
+        only listed once, at startup.
+        """
+        self.nextNameIter = self._index.iter_after(basename_or_none)
 
+    @metrics.timed("sync_original")
     def _sync_original(self):
         """Refresh the Original cell so it mirrors the Annotated one."""
-        src = self.annotated_cell.image.source
+        src = self.annotated_cell.source
         if not src:
             self.original_cell.set_image("")
             self.original_cell.set_label("Original image")
             return
 
         bn = basename(src)
-        candidate = self.source_image_name_to_path(bn, originalImageFolder)
-        if not os.path.isfile(candidate):
-            png = self.source_image_name_to_path(os.path.splitext(bn)[0] + ".png",
-                                                originalImageFolder)
-            candidate = png if os.path.isfile(png) else ""
-
-        self.original_cell.set_image(candidate)
-        if candidate:
+        candidate = self._originals.lookup(bn)
+
+        blend = None
+        if candidate and self.blend:
+            blend = blender.texture(src, candidate)
+            if blend is None and blender.pending(src, candidate):
+                self._blend_poll()  # show the plain original until it lands
+        self.original_cell.set_image(candidate, blend)
+        if blend is not None:
+            self.original_cell.set_label(f"Overlay - {bn}")
+        elif candidate:
             self.original_cell.set_label(f"Original - {bn}")
         else:
             self.original_cell.set_label("Original image (not found)")
-            
+        if self.link_views:
+            self.original_cell.set_view(*self.annotated_cell.view())
+
+    def _link_view(self, cell, *view):
+        """Zoom / pan of one of Annotated and Original, applied to the other."""
+        if not self.link_views:
+            return
+        other = self.original_cell
+        if cell is self.original_cell:
+            other = self.annotated_cell
+        other.set_view(*view)
+
+    def toggle_blend(self):
+        """Show the mask blended over the original in the Original cell."""
+        self.blend = not self.blend
+        self._sync_original()
+
+    def _prefetch(self):
+        """Keep the four cells decoded and warm the images after Next."""
+        next_src = self.next_cell.source
+        ahead = []
+        if next_src:
+            for name in islice(self._index.iter_after(basename(next_src)),
+                               prefetcher.window):
+                ahead.append(self.source_image_name_to_path(name, sourceImageFolder))
+        # originals of the upcoming masks
+        originals = [self._originals.lookup(basename(p), rescan=False)
+                     for p in [next_src] + ahead if p]
+        ahead += [p for p in originals if p]
+        side = ImageCell.preview_side()
+        prefetcher.schedule(
+            [
+                display_path(cell.source, side, probe=False)
+                for cell in (
+                    self.annotated_cell,
+                    self.original_cell,
+                    self.next_cell,
+                    self.previous_cell,
+                )
+            ],
+            [display_path(p, side, probe=False) for p in ahead],
+        )
+
     # --------------------------------------------------------------------
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -240,23 +3460,142 @@ class PicturesFrame(GridLayout):
         ):
             self.add_widget(cell)
 
-        # Total images
-        self.total_images_fixed = len(self._lex_files())
-        
-        # keyboard
+        # Annotated and Original zoom and pan together; the blend key turns
+        # Original into the mask drawn over it
+        self.link_views = bool(settings.get("link_views", True))
+        self.annotated_cell.bind(on_view=self._link_view)
+        self.original_cell.bind(on_view=self._link_view)
+        self.blend_key = str(settings.get("blend_key", "tab")).lower()
+        self.blend = False
+        self._blend_poll = Clock.create_trigger(lambda _dt: self._sync_original(), 0.05)
+
+        # performance overlay next to the counter (hidden until its hotkey)
+        self.overlay_key = str(settings.get("overlay_key", "f12")).lower()
+        self.overlay_label = Label(
+            text="",
+            size_hint=(None, None),
+            height=30,
+            pos_hint={"y": 0},
+            color=(0.1, 0.45, 0.1, 1),
+            font_size="12sp",
+            opacity=0,
+        )
+        self.overlay_label.bind(
+            texture_size=lambda lbl, ts: setattr(lbl, "width", ts[0] + 10)
+        )
+        counter = self.original_cell.counter_label
+        counter.bind(
+            right=lambda lbl, right: setattr(self.overlay_label, "x", right + 10)
+        )
+        self.original_cell.add_widget(self.overlay_label)
+
+        # stem → path map of the originals (no stat per displayed image)
+        self._originals = make_original_index()
+
+        # statistics from --mask-stats can order and filter the queue
+        catalog = ImageCatalog.existing()
+        self._mask_stats = {}
+        if catalog is not None:
+            for stats in catalog.masks(sourceImageFolder):
+                self._mask_stats[basename(stats["path"])] = stats
+        ranks = []  # FolderIndex.rank parts, most significant first
+        keep = None
+        if leases is not None:  # shared folder: list only the buckets claimed here
+            for _ in range(int(settings.get("shard_claim", 2))):
+                leases.claim()
+            keep = leases.holds
+            ranks.append(leases.prefix)
+            print(
+                f"[info] {leases.worker} claimed buckets {sorted(leases.held)} "
+                f"of {leases.buckets}"
+            )
+        order = settings.get("mask_order")
+        if order and order != "name" and self._mask_stats:
+            by_stats = mask_ranks(self._mask_stats, order)
+            # masks without statistics go last
+            ranks.append(lambda name: by_stats.get(name, b"\xff" * 8))
+        if ranks:
+            FolderIndex.rank = lambda name: b"".join(rank(name) for rank in ranks)
+
+        # sorted index of the source folder, patched in place; the listing
+        # streams in – start on the first batch, merge the rest as it lands
+        self._index = FolderIndex()
+        self._index.track_edits()
+        # masks dropped in / taken out while the app runs – watched from before
+        # the listing starts, so nothing slips in between the two
+        self.watcher = None
+        if settings.get("watch", True) and archives is None:
+            self.watcher = FolderWatcher(
+                sourceImageFolder,
+                keep,
+                self._index.names,
+                poll=settings.get("watch") == "poll",
+                interval=float(settings.get("watch_interval", 2)),
+                batch=int(settings.get("watch_batch", 5000)),
+            )
+        self.scanner = FolderScanner(
+            sourceImageFolder, int(settings.get("listing_first", 2000)), keep
+        )
+        self.scanner.wait_first()
+        self._index.install(self.scanner.latest())
+        if manifest is not None:  # already labelled in an earlier session
+            for src in manifest.labelled():
+                self._index.discard(basename(src))
+        if catalog is not None:  # failed the last --validate pass
+            for path, _ in catalog.bad(sourceImageFolder):
+                self._index.discard(basename(path))
+        if settings.get("mask_filter") and self._mask_stats:
+            passes = mask_rule(settings["mask_filter"])
+            for name, stats in self._mask_stats.items():
+                if not passes(stats):
+                    self._index.discard(name)
+        while leases is not None and not self._index:  # claimed buckets are finished
+            bucket, names = leases.take(sourceImageFolder)
+            if bucket is None:
+                break
+            skip = self._unlisted()
+            for name in names:
+                if name not in skip:
+                    self._index.add(name)
+
+        # Total images (estimated until the listing is complete)
+        self.total_images_fixed = max(len(self._index), self.scanner.estimate)
+        self._resumed_total = 0   # total recorded by an earlier session
+        self._session_moves = 0   # net moves since startup
+
+        # keyboard (the window opens only once the UI starts)
+        from kivy.core.window import Window
+
         self._keyboard = Window.request_keyboard(self._keyboard_closed, self)
         self._keyboard.bind(on_key_down=self._on_keyboard_down)
 
-        # history: (src, dst, index_before_move, prev_img, annotated_img, next_img)
-        self.history = []
-        self.history_index = -1
+        # history: the move plus (index_before_move, prev_img, next_img); the
+        # annotated image is the move's source
+        self.history = MoveHistory("ipp")
+        self._unapplied = set()  # (src, dst) queued from history that failed on disk
+        self._moot = set()  # moves back whose forward move had already failed
+        self.failed_moves = 0
 
-        # initialise
-        self.restart()
+        # initialise (resuming where the journal of an earlier session left off)
+        resume_at, restore_index = self._resume()
+        self.restart(restore_index, resume_at)
+
+        # pending‑move count follows the background mover
+        self._shown_pending = 0
+        Clock.schedule_interval(self._poll_pending, 0.25)
+        Clock.schedule_interval(self._poll_listing, 0.1)
+        if self.watcher is not None:
+            Clock.schedule_interval(self._poll_watch, 0.25)
+        if leases is not None:
+            self._renewed = self._claim_after = time.monotonic()
+            Clock.schedule_interval(self._poll_leases, 1.0)
 
     # --------------------- lifecycle helpers ---------------------------
-    def restart(self, restore_index=None):
-        """Reset the UI, optionally restoring to a specific counter value."""
+    def restart(self, restore_index=None, resume_at=None):
+        """
+        Reset the UI, optionally restoring to a specific counter value and
+        making `resume_at` (a basename) the Annotated image.
+        """
         print("Restarting…")
         for cell, cap in [
             (self.annotated_cell, "Annotated image"),
@@ -270,6 +3609,21 @@ class PicturesFrame(GridLayout):
         self.src = self.dst = ""
         self.current_index = 1 if restore_index is None else restore_index
 
+        if (
+            resume_at
+            and source_isfile(join(sourceImageFolder, resume_at))
+            and (leases is None or leases.holds(resume_at))
+        ):
+            self._index.add(resume_at)  # may not be in the first batch yet
+        start = self._index.position(resume_at) if resume_at else len(self._index)
+        if start < len(self._index):
+            # Next ← resume image, then shift it into Annotated
+            self.next_cell.set_image(
+                self.source_image_name_to_path(self._index[start], sourceImageFolder)
+            )
+            self.display_next_image(skip_increment=True)
+            return
+
         # fresh iterator
         self._build_iter_after(None)
 
@@ -280,12 +3634,90 @@ class PicturesFrame(GridLayout):
         except StopIteration:
             print("[info] No images found in source folder.")
 
+    # --------------------- journal -----------------------------------
+    def _resume(self):
+        """
+        Replay the journal: rebuild history, finish moves that never landed,
+        and return (annotated basename, counter) to resume at.
+        """
+        records = Journal.read(journal.path)
+        if not records:
+            return None, None
+
+        moves, hi = [], -1  # move records; hi = last one in effect
+        cur = pos = total = None
+        landed = {}  # destination -> the free name a collision moved it to
+        for rec in records:
+            if rec["op"] == "landed":
+                landed[rec["dst"]] = rec
+            elif rec["op"] == "move":
+                del moves[hi + 1 :]
+                moves.append(rec)
+                hi += 1
+            elif rec["op"] == "undo" and hi >= 0:
+                hi -= 1
+            elif rec["op"] == "redo" and hi < len(moves) - 1:
+                hi += 1
+            cur = rec.get("cur", cur)
+            pos = rec.get("pos", pos)
+            total = rec.get("total", total)
+
+        landed = [landed[r["dst"]] for r in moves if r["dst"] in landed]
+        for rec in landed:  # undoing these must find the renamed file
+            move_engine.alias(rec["dst"], rec["path"])
+
+        # reconcile moves that were queued but never landed before the crash
+        # (in manifest mode the manifest itself is the record of truth)
+        for i, rec in enumerate(moves if manifest is None else ()):
+            src, dst = rec["src"], move_engine.where(rec["dst"])
+            if i <= hi and os.path.isfile(src) and not os.path.isfile(dst):
+                move_queue.submit(src, rec["dst"])
+                self._index.discard(basename(src))
+            elif i > hi and os.path.isfile(dst) and not os.path.isfile(src):
+                move_queue.submit(rec["dst"], src)
+                self._index.add(basename(src))
+
+        for r in moves:
+            self.history.push([(r["src"], r["dst"])], r["index"], r["prev"], r["next"])
+        self.history.top = hi + 1
+        if total:
+            self._resumed_total = total
+            self.total_images_fixed = max(total, self.total_images_fixed)
+        print(f"[info] Resuming at {cur} with {hi + 1} undoable moves.")
+
+        # drop undo / redo / skip noise once it dominates the file
+        undone = len(moves) - 1 - hi
+        if len(records) - len(moves) > int(settings.get("journal_compact_at", 10000)):
+            now = time.time()
+            journal.compact(
+                moves
+                + landed
+                + [{"op": "undo", "ts": now}] * undone
+                + [{"op": "nav", "ts": now, "cur": cur, "pos": pos, "total": total}]
+            )
+        return cur, pos
+
+    def _journal(self, op: str, **fields):
+        annot = self.annotated_cell.source
+        journal.append(
+            op,
+            cur=basename(annot) if annot else None,
+            pos=self.current_index,
+            total=self.total_images_fixed,
+            **fields,
+        )
+
     # --------------------- keyboard handling ---------------------------
     def _keyboard_closed(self):
         self._keyboard.unbind(on_key_down=self._on_keyboard_down)
         self._keyboard = None
 
+    @metrics.timed("key")
     def _on_keyboard_down(self, keyboard, keycode, text, modifiers):
+        if keycode[1] == self.overlay_key:
+            self.toggle_overlay()
+            return
+
         # ctrl/cmd + Z / Y
         if ("ctrl" in modifiers or "cmd" in modifiers) and keycode[1] == "z":
             self.undo()
@@ -304,11 +3736,201 @@ class PicturesFrame(GridLayout):
             self.key_pressed("z")
         elif key_name == "enter":
             self.key_pressed("enter")
+        elif key_name == self.blend_key:
+            self.toggle_blend()
+
+    # -------------------- listing ------------------------------------
+    def _poll_listing(self, _dt):
+        """Merge the newest listing snapshot and re‑derive the Next image."""
+        done = self.scanner.done  # read first: the final snapshot precedes it
+        snap = self.scanner.latest()
+        if snap is not None:
+            self._index.install(snap)
+            self._refresh_next()
+        if done:
+            self._index.track_edits(False)
+            self.total_images_fixed = max(
+                self._resumed_total, len(self._index) + self._session_moves
+            )
+        else:
+            self.total_images_fixed = max(
+                self.total_images_fixed, len(self._index) + self._session_moves
+            )
+        self._update_counter()
+        return not done
+
+    def _refresh_next(self):
+        """Re‑derive the Next image after the index changed around Annotated."""
+        annot = self.annotated_cell.source
+        if not annot:
+            return
+        name = next(self._index.iter_after(basename(annot)), None)
+        nxt = join(sourceImageFolder, name) if name else ""
+        if nxt != self.next_cell.source:
+            self.next_cell.set_image(nxt)
+            self.next_cell.set_label(f"Next - {name}" if name else "Next image - end")
+            self._build_iter_after(basename(annot))
+            self._prefetch()
+
+    def _unlisted(self) -> set:
+        """Basenames kept out of the index: labelled, failed validation, filtered."""
+        skip = set()
+        if manifest is not None:
+            skip.update(basename(src) for src in manifest.labelled())
+        catalog = ImageCatalog.existing()
+        if catalog is not None:
+            skip.update(basename(path) for path, _ in catalog.bad(sourceImageFolder))
+        if settings.get("mask_filter") and self._mask_stats:
+            passes = mask_rule(settings["mask_filter"])
+            skip.update(n for n, stats in self._mask_stats.items() if not passes(stats))
+        return skip
+
+    # -------------------- work claims ---------------------------------
+    def _poll_leases(self, _dt):
+        """Renew the claimed buckets, merge newly claimed ones, claim more when low."""
+        now = time.monotonic()
+        annot = self.annotated_cell.source
+        at = self._index.position(basename(annot)) + 1 if annot else len(self._index)
+        changed = False
+        if now - self._renewed >= leases.ttl / 4:
+            self._renewed = now
+            lost = leases.renew(self.history.top)
+            if lost:  # stalled past the ttl and taken over – leave them to the new owner
+                log(f"[warn] Buckets {sorted(lost)} were taken over elsewhere")
+                ahead = list(self._index.iter_from(at))
+                for name in [n for n in ahead if leases.bucket(n) in lost]:
+                    self._index.discard(name)
+                changed = True
+        for bucket, names in leases.arrivals():
+            if bucket is None:  # all taken – look again once leases may have expired
+                self._claim_after = now + leases.ttl
+                continue
+            log(f"[info] Claimed bucket {bucket}: {len(names)} masks")
+            skip = self._unlisted()
+            for name in names:
+                if name not in skip:
+                    self._index.add(name)
+            changed = True
+        if changed:
+            self._reindexed()
+        at = self._index.position(basename(annot)) + 1 if annot else len(self._index)
+        if len(self._index) - at < leases.low and now >= self._claim_after:
+            leases.top_up(sourceImageFolder)
+
+    def _poll_watch(self, _dt):
+        """Merge the masks that appeared in / left the source folder."""
+        added, removed, resync = self.watcher.drain()
+        if not added and not removed:
+            return
+        if resync:  # a fresh listing also finds labelled, broken and filtered masks
+            skip = self._unlisted()
+            added = [(key, name) for key, name in added if name not in skip]
+        with metrics.span("watch_merge"):
+            changed = self._index.update(added, removed)
+        if changed:  # most removals are this app's own moves
+            self._reindexed()
+
+    def _reindexed(self):
+        """Re‑derive Next and the total after masks were merged in / dropped."""
+        self.total_images_fixed = max(
+            self._resumed_total, len(self._index) + self._session_moves
+        )
+        annot = self.annotated_cell.source
+        prev = self.previous_cell.source
+        after = None if annot or not prev else basename(prev)
+        name = next(self._index.iter_after(after), None)
+        if annot:
+            self._refresh_next()
+        elif name:  # was at the end – go on with the new masks
+            self.next_cell.set_image(join(sourceImageFolder, name))
+            self.current_index += 1
+            self.display_next_image(skip_increment=True, skip_previous_update=True)
+        self._update_counter()
+
+    # -------------------- counter -------------------------------------
+    def _update_counter(self):
+        total = self.total_images_fixed
+        if not self.scanner.done:  # still listing – estimate the total
+            total = f"~{total}" if self.scanner.estimate else f"{total}+"
+        text = f"{self.current_index}/{total}"
+        annot = self.annotated_cell.source
+        stats = self._mask_stats.get(basename(annot)) if annot else None
+        if stats is not None:
+            text += (
+                f" · fg {100 * stats['foreground']:.2f}%"
+                f" · {stats['components']} parts"
+            )
+            if stats["mismatch"]:
+                text += " · size ≠ original"
+        if move_queue.pending:
+            text += f" ({move_queue.pending} moves pending)"
+        if self.failed_moves:
+            text += f" ({self.failed_moves} moves failed – see the log)"
+        self.original_cell.counter_label.text = text
+
+    def _poll_pending(self, _dt):
+        failures = move_queue.take_failures()
+        if failures:
+            self._moves_failed(failures)
+        if failures or move_queue.pending != self._shown_pending:
+            self._shown_pending = move_queue.pending
+            self._update_counter()
+
+    def _moves_failed(self, failures):
+        """
+        Take back what the UI assumed about moves that failed on disk: a
+        labelled mask is listed again, and undo / redo skip the move.
+        """
+        failed = {(src, dst) for src, dst, _ in failures}
+        source = os.path.normpath(sourceImageFolder)
+        for src, dst, _ in failures:
+            if (src, dst) in self._moot:  # moved back in vain – it never left
+                self._moot.discard((src, dst))
+                continue
+            if (dst, src) in failed or move_queue.incoming(src):
+                self._moot.add((dst, src))  # already undone; the move back fails too
+                continue
+            self.failed_moves += 1
+            self._unapplied.add((src, dst))
+            if os.path.normpath(dirname(src)) != source:
+                continue  # an undo: the mask stays where it was labelled
+            self._index.add(basename(src))
+            self._session_moves -= 1
+            texture_cache.rename(dst, src)
+            if self.previous_cell.source == dst:
+                self.previous_cell.set_image(src)
+                self.previous_cell.set_label(
+                    f"Previous - {basename(src)} (move failed)"
+                )
+        self._reindexed()
+
+    # -------------------- performance overlay --------------------------
+    def toggle_overlay(self):
+        if self.overlay_label.opacity:
+            self.overlay_label.opacity = 0  # _refresh_overlay unschedules itself
+            return
+        self.overlay_label.opacity = 1
+        self._refresh_overlay(0)
+        Clock.schedule_interval(self._refresh_overlay, 0.5)
+
+    def _refresh_overlay(self, _dt):
+        if not self.overlay_label.opacity:
+            return False
+        g = metrics.snapshot()["gauges"]
+        self.overlay_label.text = (
+            f"frame {g.get('frame_ms', 0):.1f} ms · "
+            f"decode {1e3 * metrics.last('decode'):.1f} ms · "
+            f"upload {1e3 * metrics.last('upload'):.1f} ms · "
+            f"moves {g.get('moves_pending', 0)} · "
+            f"prefetch {g.get('prefetch_inflight', 0)} · "
+            f"cache hit {g.get('texture_cache_hit_rate', 0):.0f}%"
+        )
 
     # -------------------- display pipeline -----------------------------
     def source_image_name_to_path(self, image_name, folder_name):
         return join(folder_name, image_name)
 
+    @metrics.timed("next_image")
     def display_next_image(
         self,
         dstFolderName: str = "",
@@ -325,32 +3947,32 @@ class PicturesFrame(GridLayout):
             # advance the counter (but never beyond the fixed total)
             if (
                 not skip_increment
-                and self.annotated_cell.image.source
+                and self.annotated_cell.source
                 and self.current_index < self.total_images_fixed
             ):
                 self.current_index += 1
 
             # move pipeline: Previous ← Annotated
             if not skip_previous_update:
-                self.previous_cell.set_image(self.annotated_cell.image.source)
+                self.previous_cell.set_image(self.annotated_cell.source)
                 self.previous_cell.set_label(
-                    f"Previous - {basename(self.previous_cell.image.source)}"
-                    if self.previous_cell.image.source
+                    f"Previous - {basename(self.previous_cell.source)}"
+                    if self.previous_cell.source
                     else "Previous image"
                 )
 
             # Annotated ← Next
-            self.annotated_cell.set_image(self.next_cell.image.source)
+            self.annotated_cell.set_image(self.next_cell.source)
             self.annotated_cell.set_label(
-                f"Annotated - {basename(self.annotated_cell.image.source)}"
-                if self.annotated_cell.image.source
+                f"Annotated - {basename(self.annotated_cell.source)}"
+                if self.annotated_cell.source
                 else "Annotated image"
             )
 
             # rebuild iterator starting *after* the new Annotated image
             annot_bn = (
-                basename(self.annotated_cell.image.source)
-                if self.annotated_cell.image.source
+                basename(self.annotated_cell.source)
+                if self.annotated_cell.source
                 else None
             )
             self._build_iter_after(annot_bn)
@@ -366,24 +3988,24 @@ class PicturesFrame(GridLayout):
             self._sync_original()
 
             # update counter display
-            self.original_cell.counter_label.text = (
-                f"{self.current_index}/{self.total_images_fixed}"
-            )
+            self._update_counter()
+
+            self._prefetch()
 
         except StopIteration:
             # no more images: tidy up the view
             if not skip_previous_update:
-                self.previous_cell.set_image(self.annotated_cell.image.source)
+                self.previous_cell.set_image(self.annotated_cell.source)
                 self.previous_cell.set_label(
-                    f"Previous - {basename(self.previous_cell.image.source)}"
-                    if self.previous_cell.image.source
+                    f"Previous - {basename(self.previous_cell.source)}"
+                    if self.previous_cell.source
                     else "Previous image"
                 )
 
-            self.annotated_cell.set_image(self.next_cell.image.source)
+            self.annotated_cell.set_image(self.next_cell.source)
             self.annotated_cell.set_label(
-                f"Annotated - {basename(self.annotated_cell.image.source)}"
-                if self.annotated_cell.image.source
+                f"Annotated - {basename(self.annotated_cell.source)}"
+                if self.annotated_cell.source
                 else "Annotated image - end"
             )
 
@@ -394,11 +4016,10 @@ class PicturesFrame(GridLayout):
             self._sync_original()
 
             # counter stays at the last value reached
-            self.original_cell.counter_label.text = (
-                f"{self.current_index}/{self.total_images_fixed}"
-            )
+            self._update_counter()
 
-            print("[info] No more images.")
+            self._prefetch()
+            log("[info] No more images.")
             
     # ------------------------ main command handler ---------------------
     def key_pressed(self, key):
@@ -407,70 +4028,77 @@ class PicturesFrame(GridLayout):
             return
         if key == "enter":
             self.display_next_image()
+            self._journal("nav")
             return
         if key not in key_dict:
             return
 
         dst_dir = key_dict[key]
         if not dst_dir:
-            print(f"[warn] No destination folder mapped to key '{key}'.")
+            log(f"[warn] No destination folder mapped to key '{key}'.")
             return
 
-        src_path = self.annotated_cell.image.source
-        if not src_path or not os.path.isfile(src_path):
-            print("[warn] No valid annotated image to move.")
+        src_path = self.annotated_cell.source
+        if not src_path or not (
+            source_isfile(src_path) or move_queue.incoming(src_path)
+        ):
+            log("[warn] No valid annotated image to move.")
             return
 
         dst_path = join(dst_dir, basename(src_path))
 
         # push current state into history BEFORE the move
-        self.history = self.history[: self.history_index + 1]
-        self.history.append(
-            (
-                src_path,
-                dst_path,
-                self.current_index,
-                self.previous_cell.image.source,
-                self.annotated_cell.image.source,
-                self.next_cell.image.source,
-            )
+        entry = (
+            src_path,
+            dst_path,
+            self.current_index,
+            self.previous_cell.source,
+            self.annotated_cell.source,
+            self.next_cell.source,
+        )
+        self.history.push(
+            [(src_path, dst_path)],
+            self.current_index,
+            self.previous_cell.source,
+            self.next_cell.source,
         )
-        self.history_index += 1
 
-        move_file(src_path, dst_path)
+        shown = label_file(src_path, dst_path)
+        self._index.discard(basename(src_path))
+        self._session_moves += 1
+        texture_cache.rename(src_path, shown)
 
         # previous quadrant shows moved file
-        self.previous_cell.set_image(dst_path)
+        self.previous_cell.set_image(shown)
         self.previous_cell.set_label(f"Previous - {basename(dst_path)} (moved)")
 
-        # ── REBUILD iterator because source folder content changed ──
-        annot_bn = (
-            basename(self.annotated_cell.image.source)
-            if self.annotated_cell.image.source
-            else None
-        )
-        self._build_iter_after(annot_bn)
-
-        # advance
+        # advance (display_next_image re‑positions the iterator)
         self.display_next_image(skip_previous_update=True)
+        self._journal(
+            "move",
+            key=key,
+            **dict(zip(("src", "dst", "index", "prev", "annot", "next"), entry)),
+        )
 
     # --------------------- undo / redo ---------------------------------
     def undo(self):
         """Undo the last move, restoring quadrants and iterator."""
-        if self.history_index < 0:
-            print("[info] Nothing to undo.")
+        entry = self.history.undo()
+        if entry is None:
+            log("[info] Nothing to undo.")
             return
 
-        (
-            src,
-            dst,
-            idx_before,
-            prev_img,
-            annot_img,
-            next_img,
-        ) = self.history[self.history_index]
-        print(f"Undo: moving {basename(dst)} → {dirname(src)}")
-        move_file(dst, src)
+        [(src, dst)], (idx_before, prev_img, next_img) = entry
+        annot_img = src
+        prefetcher.cancel()
+        log(f"Undo: moving {basename(dst)} → {dirname(src)}")
+        if (src, dst) in self._unapplied:  # never left – nothing to move back
+            self._unapplied.discard((src, dst))
+        else:
+            unlabel_file(src, dst)
+            self._session_moves -= 1
+            texture_cache.rename(dst, src)
+        self._index.add(basename(src))
 
         # restore quadrant images exactly as they were
         self.previous_cell.set_image(prev_img or "")
@@ -488,9 +4116,8 @@ class PicturesFrame(GridLayout):
             f"Next - {basename(next_img)}" if next_img else "Next image"
         )
 
-        # restore counter and history pointer
+        # restore counter
         self.current_index = idx_before
-        self.history_index -= 1
 
         # rebuild iterator so Next resumes correctly
         annot_bn = basename(annot_img) if annot_img else None
@@ -500,30 +4127,32 @@ class PicturesFrame(GridLayout):
         self._sync_original()
 
         # refresh counter display
-        self.original_cell.counter_label.text = (
-            f"{self.current_index}/{self.total_images_fixed}"
-        )
+        self._update_counter()
+        self._prefetch()
+        self._journal("undo")
         
     def redo(self):
-        if self.history_index >= len(self.history) - 1:
-            print("[info] Nothing to redo.")
+        entry = self.history.redo()
+        if entry is None:
+            log("[info] Nothing to redo.")
             return
 
-        self.history_index += 1
-        src, dst, idx_at_move, prev_img, annot_img, next_img = self.history[
-            self.history_index
-        ]
-        print(f"Redo: moving {basename(src)} → {dirname(dst)}")
-        move_file(src, dst)
+        [(src, dst)], (idx_at_move, _prev_img, _next_img) = entry
+        prefetcher.cancel()
+        log(f"Redo: moving {basename(src)} → {dirname(dst)}")
+        if (dst, src) in self._unapplied:  # the undo never moved it back
+            self._unapplied.discard((dst, src))
+            shown = dst
+        else:
+            shown = label_file(src, dst)
+        self._index.discard(basename(src))
+        self._session_moves += 1
+        texture_cache.rename(src, shown)
 
         # show moved file in previous
-        self.previous_cell.set_image(dst)
+        self.previous_cell.set_image(shown)
         self.previous_cell.set_label(f"Previous - {basename(dst)} (moved)")
 
-        # iterator must skip over everything up to the new annotated
-        annot_bn = basename(annot_img) if annot_img else None
-        self._build_iter_after(annot_bn)
-
         self.current_index = (idx_at_move + 1 if idx_at_move < self.total_images_fixed else idx_at_move)
         try:
             self.display_next_image(skip_increment=True, skip_previous_update=True)
@@ -535,16 +4164,162 @@ class PicturesFrame(GridLayout):
             self.original_cell.set_image("")
             self.original_cell.set_label("Original image")
 
-        self.original_cell.counter_label.text = f"{self.current_index}/{self.total_images_fixed}"
+        self._update_counter()
+        self._journal("redo")
 
 
 # ─────────────────────────────── Kivy app ───────────────────────────────────
+# ─────────────────────────────── startup ─────────────────────────────────────
+def configure(cfg_path=None):
+    """
+    Load the config and open this session's state.  Nothing of the kind
+    happens at import time, so --config / IMAGE_ANNOTATOR_CONFIG skip Tk
+    altogether and tools can import this module cheaply.
+    """
+    global sourceImageFolder, originalImageFolder, key_dict, settings
+    global journal, manifest, prefetcher, texture_cache, tile_cache, previews
+    global blender, leases, archives
+
+    sourceImageFolder, originalImageFolder, key_dict, settings = load_config(cfg_path)
+    _startup.append(("config", time.perf_counter()))
+
+    journal = Journal(settings.get("journal") or join(state_dir(), "journal.jsonl"))
+    move_engine.landed = lambda dst, path: journal.append("landed", dst=dst, path=path)
+    move_queue.workers = int(settings.get("move_workers", 4))
+    archives = make_archive_source()
+    if settings.get("label_mode") == "manifest" or archives is not None:  # shards stay
+        manifest = LabelManifest(
+            settings.get("manifest") or join(state_dir(), "labels.sqlite")
+        )
+    prefetcher = Prefetcher(
+        window=int(settings.get("prefetch_window", 3)),
+        workers=int(settings.get("prefetch_workers", 2)),
+    )
+    texture_cache = TextureCache(int(settings.get("texture_cache_mb", 512)) * 2**20)
+    tile_cache = TextureCache(int(settings.get("tile_cache_mb", 256)) * 2**20)
+    blender = MaskBlender(
+        int(settings.get("blend_side", 2048)),
+        float(settings.get("blend_alpha", 0.5)),
+        tuple(settings.get("blend_color", (255, 0, 0))),
+    )
+    previews = make_preview_store()
+    leases = make_lease_board()
+    _startup.append(("session state", time.perf_counter()))
+
+
+def startup_report() -> str:
+    """Startup time per phase (also kept as "startup_*" metrics spans)."""
+    parts = []
+    for (_, t0), (phase, t1) in zip(_startup, _startup[1:]):
+        metrics.observe("startup_" + phase.replace(" ", "_"), t1 - t0)
+        parts.append(f"{phase} {t1 - t0:.2f} s")
+    return ", ".join(parts) + f" – total {_startup[-1][1] - _startup[0][1]:.2f} s"
+
+
 class PicturesApp(App):
     def build(self):
+        from kivy.core.window import Window
+
+        _startup.append(("window + kv", time.perf_counter()))
         Window.size = (1200, 800)
         Window.clearcolor = (0.961, 0.961, 0.961, 1)
+        start_metrics_export()
         return PicturesFrame()
 
+    def on_start(self):
+        _startup.append(("first frame", time.perf_counter()))
+        print(f"[info] Startup: {startup_report()}")
+
+    def on_stop(self):
+        if move_queue.pending:
+            print(f"[info] Waiting for {move_queue.pending} pending moves…")
+        move_queue.flush()
+        if leases is not None:
+            leases.close(
+                sourceImageFolder,
+                {basename(s) for s in manifest.labelled()} if manifest else (),
+            )
+        watcher = getattr(self.root, "watcher", None)  # the frame's, if it is the root
+        if watcher is not None:
+            watcher.stop()
+        journal.close()
+        prefetcher.shutdown()
+        blender.shutdown()
+        if previews:
+            previews.shutdown()
+        if archives is not None:
+            archives.close()
+        print(f"[info] texture cache: {texture_cache.stats()}")
+        print(f"[info] moves: {move_engine.stats()}")
+        write_metrics_log()
+        flush_log()
+
 
 if __name__ == "__main__":
-    PicturesApp().run()
+    parser = argparse.ArgumentParser(description="Semantic annotations reviewer")
+    parser.add_argument(
+        "--config",
+        metavar="JSON",
+        help="config file (default: $IMAGE_ANNOTATOR_CONFIG, else a file dialog)",
+    )
+    parser.add_argument(
+        "--build-previews",
+        action="store_true",
+        help="pre-build preview renditions for the source and original folders and exit",
+    )
+    parser.add_argument(
+        "--materialize",
+        nargs="?",
+        const="move",
+        choices=("move", "hardlink", "symlink"),
+        help="apply the label manifest to the class folders and exit",
+    )
+    parser.add_argument(
+        "--validate",
+        nargs="?",
+        const="full",
+        choices=("full", "quick"),
+        help="check every source and original image (quick: skip the full decode) and exit",
+    )
+    parser.add_argument(
+        "--mask-stats",
+        nargs="?",
+        const="measure",
+        choices=("measure", "route"),
+        help='measure every mask (route: also apply the "auto_route" rules) and exit',
+    )
+    parser.add_argument(
+        "--quarantine",
+        metavar="DIR",
+        help='with --validate: move bad files here (default: the "quarantine_dir" setting)',
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help='show the shared progress of every reviewer ("shard" on) and exit',
+    )
+    args = parser.parse_args()
+    configure(args.config)
+    if args.progress:
+        if leases is None:
+            print('[err] set "shard": true in the config settings first')
+            sys.exit(1)
+        print(leases.progress())
+    elif args.build_previews:
+        build_previews([sourceImageFolder, originalImageFolder])
+    elif args.validate:
+        validate(
+            [sourceImageFolder, originalImageFolder],
+            args.quarantine or settings.get("quarantine_dir"),
+            full=args.validate == "full",
+        )
+    elif args.mask_stats:
+        mask_pass(
+            sourceImageFolder,
+            make_original_index(),
+            settings.get("auto_route") if args.mask_stats == "route" else None,
+        )
+    elif args.materialize:
+        materialize(args.materialize)
+    else:
+        PicturesApp().run()
@@ -0,0 +1,62 @@
+"""
+Pieces of each app's main.py, loaded for the tests without Kivy / Tk.
+
+Like Benchmarks/move_bench.py this reads the shipped file with `ast` and
+runs only what a test asks for – its standard‑library imports, then the
+named top‑level classes, functions and assignments – so nothing here can
+drift from the code the installers bundle.
+"""
+
+import ast
+import copy
+from os.path import abspath, dirname, join
+
+ROOT = dirname(dirname(abspath(__file__)))
+APPS = {
+    "categorizer": join(ROOT, "Categorizer", "Python", "main.py"),
+    "reviewer": join(ROOT, "Semantic Annotations Reviewer", "Python", "main.py"),
+}
+
+
+def _name(node):
+    if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name):
+        return node.targets[0].id
+    return getattr(node, "name", None)
+
+
+def load(app, *names, **env):
+    """
+    Namespace of `app`'s main.py holding `names` – "Journal", "natkey",
+    "metrics", … – in file order.  "Class.method" takes just those methods
+    of a class, as a bare class of the same name, e.g. the journal replay
+    of the Kivy widget `PicturesFrame`.  `env` supplies the module globals
+    the loaded code refers to and isn't loaded itself.
+    """
+    path = APPS[app]
+    with open(path, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read(), path)
+    wanted, methods = set(), {}
+    for name in names:
+        cls, _, method = name.partition(".")
+        if method:
+            methods.setdefault(cls, set()).add(method)
+        else:
+            wanted.add(name)
+
+    body = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            modules = [a.name for a in node.names] if isinstance(node, ast.Import) else [node.module]
+            if not any(m.split(".")[0] == "kivy" for m in modules):
+                body.append(node)
+        elif _name(node) in wanted:
+            body.append(node)
+        elif _name(node) in methods and isinstance(node, ast.ClassDef):
+            cls = copy.copy(node)
+            cls.bases, cls.keywords, cls.decorator_list = [], [], []
+            cls.body = [n for n in node.body if getattr(n, "name", None) in methods[node.name]]
+            body.append(cls)
+    ns = {"__name__": "shipped_" + app}
+    ns.update(env)
+    exec(compile(ast.Module(body=body, type_ignores=[]), path, "exec"), ns)
+    return ns
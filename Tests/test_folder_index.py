@@ -0,0 +1,66 @@
+"""
+`FolderIndex` in both apps: batched listing changes (`update`) and a
+listing swapped in mid‑session (`install`) with the edits made meanwhile.
+"""
+
+import pytest
+
+import shipped
+
+
+@pytest.fixture(params=sorted(shipped.APPS))
+def ns(request):
+    return shipped.load(request.param, "_DIGIT_RUNS", "natkey", "FolderIndex")
+
+
+def names(n, step=1, start=0):
+    return [f"img_{i}.png" for i in range(start, n, step)]
+
+
+def listing(ns, paths):
+    """Sorted [(key, name), …], as FolderScanner / FolderWatcher hand them over."""
+    key = ns["FolderIndex"]._key
+    return sorted((key(p), p) for p in paths)
+
+
+def expected(ns, paths):
+    return [name for _, name in listing(ns, set(paths))]
+
+
+@pytest.mark.parametrize("n", [3, 40])  # one by one, and spliced in one pass
+def test_update(ns, n):
+    before = set(names(100, 2))
+    index = ns["FolderIndex"](before)
+    added = names(100 + 7 * n, 7, 1)[:n]  # some already listed, some removed below
+    removed = names(100, 4)[:n] + ["missing.png"]
+    changed = index.update(listing(ns, added), removed)
+    kept = before - set(removed)
+    assert index.names() == expected(ns, kept | set(added))
+    assert changed == len(before & set(removed)) + len(set(added) - kept)
+    assert all(name in index for name in added)
+    assert index.update(listing(ns, added), ()) == 0  # already there
+
+
+@pytest.mark.parametrize("n", [3, 40])
+def test_install_reapplies_tracked_edits(ns, n):
+    index = ns["FolderIndex"]()
+    index.track_edits()
+    gone, new = names(200, 5)[:n], names(300, 1, 250)[:n]
+    index.update(listing(ns, new), gone)  # watcher events while the scan runs
+    index.discard("img_1.png")            # a move
+    index.add("img_3.png")                # an undo
+    index.discard("img_3.png")            # … redone
+    index.add("img_7.png")
+
+    scanned = names(200)                  # the listing predates all of it
+    index.install(listing(ns, scanned))
+    want = (set(scanned) - set(gone) - {"img_1.png", "img_3.png"}) | set(new) | {"img_7.png"}
+    assert index.names() == expected(ns, want)
+
+    index.discard("img_9.png")            # still tracking for the next install
+    index.install(listing(ns, scanned))
+    assert index.names() == expected(ns, want - {"img_9.png"})
+
+    index.track_edits(False)
+    index.install(listing(ns, scanned))
+    assert index.names() == expected(ns, scanned)
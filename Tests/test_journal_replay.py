@@ -0,0 +1,184 @@
+"""
+Journal replay at startup (`PicturesFrame._resume`) in both apps: moves a
+crash left queued, undo / redo state, and compaction.
+
+    python -m pytest Tests
+"""
+
+import os
+from os.path import exists, join
+
+import pytest
+
+import shipped
+
+LOADED = ("Metrics", "metrics", "MoveEngine", "Journal", "MoveHistory", "_DIGIT_RUNS", "natkey",
+          "FolderIndex", "PicturesFrame._resume", "PicturesFrame._action")
+
+
+class Submitted(list):
+    """Stands in for the move queue: records what replay hands it."""
+
+    def submit(self, src, dst):
+        self.append((src, dst))
+
+
+class Session:
+    """A source folder, a class folder and a journal, replayed like at startup."""
+
+    def __init__(self, app, root, names=("a.png", "b.png", "c.png", "d.png")):
+        self.app = app
+        self.src, self.cls = join(root, "src"), join(root, "cls")
+        self.path = join(root, "journal.jsonl")
+        os.makedirs(self.src)
+        os.makedirs(self.cls)
+        for name in names:
+            with open(join(self.src, name), "wb") as fh:
+                fh.write(b"img")
+        self.ns = self._load(compact_at=10_000)
+        self._journal = self.ns["Journal"](self.path)
+
+    def _load(self, compact_at):
+        ns = shipped.load(self.app, *LOADED, settings={"journal_compact_at": compact_at},
+                          move_queue=Submitted(), manifest=None, leases=None,
+                          sourceImageFolder=self.src, source_exists=exists,
+                          log=lambda *parts: None, print=lambda *args, **kwargs: None)
+        ns["journal"] = ns["Journal"](self.path)
+        ns["move_engine"] = ns["MoveEngine"]()
+        return ns
+
+    def move(self, name, on_disk=True, cur="d.png"):
+        """Journal moving `name` to the class folder; `on_disk` if it landed."""
+        src, dst = join(self.src, name), join(self.cls, name)
+        if on_disk:
+            os.rename(src, dst)
+        if self.app == "categorizer":
+            self._journal.append("move", src=src, dst=dst, key="1", cur=cur, idx=0)
+        else:
+            self._journal.append("move", src=src, dst=dst, key="1", index=0, prev="",
+                                 annot="", next="", cur=cur, pos=0, total=4)
+        return src, dst
+
+    def undo(self):
+        self._journal.append("undo")
+
+    def redo(self):
+        self._journal.append("redo")
+
+    def nav(self, name):
+        self._journal.append("nav", cur=name, idx=0, pos=0, total=4)
+
+    def resume(self, compact_at=10_000):
+        """A fresh frame after a restart: (frame, what it put on the move queue)."""
+        self._journal.close()
+        self.ns = self._load(compact_at)
+        frame = self.ns["PicturesFrame"]()
+        index = self.ns["FolderIndex"](os.listdir(self.src))
+        if self.app == "categorizer":
+            frame.image_list, frame.history = index, self.ns["MoveHistory"]()
+            frame.idx, frame.total_images, frame.processed_images = 0, len(index), 1
+        else:
+            frame._index, frame.history = index, self.ns["MoveHistory"]("ipp")
+            frame.total_images_fixed, frame._resumed_total = len(index), 0
+        frame.resumed_at = frame._resume()  # the reviewer's (cur, pos)
+        frame.names = index.names
+        return frame, self.ns["move_queue"]
+
+
+def history(frame):
+    """([(src, dst), …] of every entry, top)."""
+    h = frame.history
+    return [h.entry(i)[0] for i in range(len(h))], h.top
+
+
+@pytest.fixture(params=sorted(shipped.APPS))
+def session(request, tmp_path):
+    return Session(request.param, str(tmp_path))
+
+
+def test_replay_resubmits_moves_queued_at_a_crash(session):
+    a = session.move("a.png")
+    b = session.move("b.png", on_disk=False)  # still in the queue when it crashed
+    c = session.move("c.png", on_disk=False)
+    frame, queued = session.resume()
+    assert queued == [b, c]
+    assert history(frame) == ([[a], [b], [c]], 3)
+    assert frame.names() == ["d.png"]
+
+
+def test_replay_moves_back_an_undo_that_never_landed(session):
+    a = session.move("a.png")
+    session.undo()  # the move back was still queued
+    frame, queued = session.resume()
+    assert queued == [(a[1], a[0])]
+    assert "a.png" in frame.names()
+    assert history(frame) == ([[a]], 0)
+
+
+def test_replay_leaves_finished_moves_alone(session):
+    a = session.move("a.png")
+    b = session.move("b.png")
+    session.undo()
+    os.rename(b[1], b[0])
+    frame, queued = session.resume()
+    assert queued == []
+    assert history(frame) == ([[a], [b]], 1)
+    assert frame.history.redo()[0] == [b]
+
+
+def test_new_move_after_undo_drops_the_redo_tail(session):
+    a = session.move("a.png")
+    b = session.move("b.png")
+    session.undo()
+    os.rename(b[1], b[0])
+    c = session.move("c.png")
+    frame, queued = session.resume()
+    assert queued == []
+    assert history(frame) == ([[a], [c]], 2)
+    assert frame.history.redo() is None
+    assert frame.history.undo()[0] == [c]
+
+
+def test_replay_of_undo_redo_sequence(session):
+    a = session.move("a.png")
+    b = session.move("b.png")
+    session.undo()
+    session.undo()
+    session.redo()
+    os.rename(b[1], b[0])
+    frame, queued = session.resume()
+    assert queued == []
+    assert history(frame) == ([[a], [b]], 1)
+
+
+def test_compaction_round_trip(session):
+    a = session.move("a.png")
+    b = session.move("b.png")
+    c = session.move("c.png")
+    session.undo()
+    session.undo()
+    session.redo()
+    os.rename(c[1], c[0])
+    for _ in range(20):
+        session.nav("c.png")
+    session._journal.append("landed", dst=a[1], path=a[1] + "~1")
+    before, queued = session.resume()
+    assert queued == []
+
+    read = session.ns["Journal"].read
+    size = len(read(session.path))
+    compacted, queued = session.resume(compact_at=0)
+    assert queued == []
+    assert len(read(session.path)) < size
+    assert history(compacted) == history(before) == ([[a], [b], [c]], 2)
+
+    again, queued = session.resume()  # the compacted journal replays the same
+    assert queued == []
+    assert history(again) == history(before)
+    assert again.history.redo()[0] == [c]
+    assert session.ns["move_engine"].where(a[1]) == a[1] + "~1"
+    if session.app == "categorizer":
+        assert again.idx == before.idx and again.processed_images == before.processed_images
+    else:
+        assert again.resumed_at == before.resumed_at == ("c.png", 0)
+        assert again._resumed_total == 4
@@ -0,0 +1,65 @@
+"""
+`MoveHistory` in both apps against a plain list of entries: push, undo,
+redo and the truncation of the redo tail by a push after undos.
+"""
+
+import pytest
+
+import shipped
+
+
+@pytest.fixture(params=sorted(shipped.APPS))
+def MoveHistory(request):
+    return shipped.load(request.param, "MoveHistory")["MoveHistory"]
+
+
+def entry(i, size=1):
+    """A batch of `size` moves; names repeat so some share interned ids."""
+    return [(f"/src/img_{(i + k) % 23}.png", f"/cls/{i % 3}/img_{(i + k) % 23}.png")
+            for k in range(size)]
+
+
+def check(history, model, top):
+    assert len(history) == len(model) and history.top == top
+    assert [history.entry(i) for i in range(len(model))] == model
+
+
+def test_undo_then_push_drops_the_redo_tail(MoveHistory):
+    history, model = MoveHistory(), []
+    for i in range(5):
+        history.push(entry(i))
+        model.append((entry(i), ()))
+    assert history.undo() == model[4]
+    assert history.undo() == model[3]
+    history.push(entry(50))
+    model[3:] = [(entry(50), ())]
+    check(history, model, 4)
+    assert history.redo() is None
+    assert history.undo() == (entry(50), ())
+    assert history.redo() == (entry(50), ())
+
+
+def test_truncation_keeps_the_name_columns_in_step(MoveHistory):
+    """Many pushes / undos (past the 16 recent names) still decode every entry."""
+    history, model = MoveHistory("ipi"), []
+    for i in range(200):
+        if i % 7 == 6:
+            for _ in range(min(3, history.top)):
+                history.undo()
+            del model[history.top:]
+        values = (i, f"/src/prev_{i % 29}.png", -i)
+        history.push(entry(i, 1 + i % 4), *values)
+        model.append((entry(i, 1 + i % 4), values))
+        check(history, model, len(model))
+
+
+def test_truncating_everything(MoveHistory):
+    history = MoveHistory("p")
+    history.push(entry(0), "")
+    history.push(entry(1), "/src/x.png")
+    history.undo()
+    history.undo()
+    assert history.undo() is None
+    history.push(entry(2), "/src/y.png")
+    check(history, [(entry(2), ("/src/y.png",))], 1)
+    assert history.nbytes() > 0